@@ -2,10 +2,10 @@ import logging
 
 __version__ = "1.2.4"
 
-from pybinsim.application import BinSim
+from pybinsim.asynclog import start_queue_logging
 
 
-def init_logging(loglevel):
+def init_logging(loglevel, rate_limit_interval=1.0):
     console_handler = logging.StreamHandler()
     console_handler.setLevel(loglevel)
 
@@ -13,12 +13,37 @@ def init_logging(loglevel):
         '%(asctime)s - %(filename)s:%(lineno)d - %(levelname)s - %(message)s')
     console_handler.setFormatter(formatter)
 
+    # Console output is written by a background thread, repeated messages are rate limited
     logger = logging.getLogger("pybinsim")
-    logger.addHandler(console_handler)
+    start_queue_logging(logger, console_handler, rate_limit_interval)
     logger.setLevel(loglevel)
 
     return logger
 
 
-logger = init_logging(logging.INFO)
-logger.info("Starting pybinsim v{}".format(__version__))
+# The level can be set before the first use, the console handler is added lazily
+logger = logging.getLogger("pybinsim")
+
+
+def _start_logging():
+    # Console logging is set up when the real-time application is used
+    if not logger.handlers:
+        init_logging(logger.level or logging.INFO)
+        logger.info("Starting pybinsim v{}".format(__version__))
+
+
+# BinSim and BinSimServer are imported on first use, so that e.g. pybinsim.pose
+# can be used without loading PortAudio, FFTW and OSC
+
+def BinSim(*args, **kwargs):
+    """ Create a pybinsim.application.BinSim, see there for the parameters """
+    _start_logging()
+    from pybinsim.application import BinSim
+    return BinSim(*args, **kwargs)
+
+
+def BinSimServer(*args, **kwargs):
+    """ Create a pybinsim.server.BinSimServer, see there for the parameters """
+    _start_logging()
+    from pybinsim.server import BinSimServer
+    return BinSimServer(*args, **kwargs)
@@ -21,16 +21,29 @@
 # SOFTWARE.
 
 """ Module contains main loop and configuration of pyBinSim """
+import contextlib
+import itertools
 import logging
+import threading
 import time
+from timeit import default_timer
+
 import numpy as np
-import pyaudio
 
-from pybinsim.convolver import ConvolverFFTW
+from pybinsim import tracing
+from pybinsim.asynclog import RATE_LIMITED
+from pybinsim.blockadapter import BlockAdapter
+from pybinsim.convolver import ConvolverFFTW, FFTPlans
 from pybinsim.filterstorage import FilterStorage
 from pybinsim.osc_receiver import OscReceiver
-from pybinsim.pose import Pose
-from pybinsim.soundhandler import SoundHandler
+from pybinsim.panning import VirtualSpeakerPanner
+from pybinsim.pose import Pose, Orientation, Position
+from pybinsim.realtime import configure_current_thread, lock_arrays, parse_cpu_list
+from pybinsim.recorder import Recorder
+from pybinsim.renderthread import RenderThread
+from pybinsim.resampler import SampleRateConverter
+from pybinsim.soundhandler import SoundHandler, LiveInputHandler
+from pybinsim.utility import add_memory_usage, array_bytes, format_memory_usage
 
 
 def parse_boolean(any_value):
@@ -47,6 +60,36 @@ def parse_boolean(any_value):
     return None
 
 
+def get_trim_threshold(config):
+    """ Returns threshold for trimming filter tails in dB or None if trimming is disabled """
+    if config.get('trimFilters'):
+        return config.get('trimThreshold')
+
+    return None
+
+
+def get_virtual_speakers(config):
+    """ Returns azimuths of the virtual speakers in degree or None if sources are rendered directly """
+    speakers = config.get('virtualSpeakers')
+    if not speakers:
+        return None
+
+    return [int(azimuth) for azimuth in speakers.split(',')]
+
+
+def get_silence_threshold(config):
+    """ Returns linear peak level below which sources are silent or None if silent sources are processed """
+    if config.get('skipSilentSources'):
+        return 10 ** (config.get('silenceThreshold') / 20)
+
+    return None
+
+
+def get_device_buffer_size(config):
+    """ Returns frames per buffer of the audio device, which default to the blockSize """
+    return config.get('deviceBufferSize') or config.get('blockSize')
+
+
 class BinSimConfig(object):
     def __init__(self):
 
@@ -55,20 +98,58 @@ class BinSimConfig(object):
         # Default Configuration
         self.configurationDict = {'soundfile': '',
                                   'blockSize': 256,
+                                  'deviceBufferSize': 0,
                                   'filterSize': 16384,
                                   'filterList': 'brirs/filter_list_kemar5.txt',
+                                  'filterPrecision': 'float32',
+                                  'trimFilters': False,
+                                  'trimThreshold': -100.0,
+                                  'deduplicateFilters': False,
                                   'enableCrossfading': False,
+                                  'skipSilentSources': False,
+                                  'silenceThreshold': -120.0,
+                                  'crossfadeTolerance': 0.0,
+                                  'fftThreads': 0,
+                                  'fftPlannerEffort': 'FFTW_MEASURE',
+                                  'configProfile': '',
                                   'useHeadphoneFilter': False,
                                   'loudnessFactor': float(1),
                                   'maxChannels': 8,
+                                  'listeners': 1,
                                   'samplingRate': 44100,
-                                  'loopSound': True}
+                                  'loopSound': True,
+                                  'resampleCacheDir': 'resample_cache',
+                                  'liveInput': False,
+                                  'liveInputSource': '',
+                                  'liveInputChannels': 2,
+                                  'renderLookahead': 0,
+                                  'renderCpus': '',
+                                  'workerCpus': '',
+                                  'realtimePriority': 0,
+                                  'lockMemory': False,
+                                  'recordFile': '',
+                                  'recordInputs': False,
+                                  'recordQueueBlocks': 64,
+                                  'oscPort': 10000,
+                                  'virtualSpeakers': '',
+                                  'headTracker': '',
+                                  'headTrackerBaudrate': 57600,
+                                  'headTrackerSourceAzimuths': '0',
+                                  'headTrackerResolution': 1,
+                                  'traceEvents': 0,
+                                  'traceFile': 'pybinsim_trace.json',
+                                  'audioDevice': -1}
 
     def read_from_file(self, filepath):
         config = open(filepath, 'r')
 
         for line in config:
             line_content = str.split(line)
+
+            # skip empty lines and comments
+            if not line_content or line_content[0].startswith('#'):
+                continue
+
             key = line_content[0]
             value = line_content[1]
 
@@ -91,6 +172,13 @@ class BinSimConfig(object):
             else:
                 self.log.warning('Entry ' + key + ' is unknown')
 
+        # A profile, e.g. written by pybinsim-autotune, overrides the settings of this file
+        profile = self.configurationDict['configProfile']
+        if profile:
+            self.configurationDict['configProfile'] = ''
+            self.log.info('Reading config profile {}'.format(profile))
+            self.read_from_file(profile)
+
     def get(self, setting):
         return self.configurationDict[setting]
 
@@ -100,27 +188,119 @@ class BinSim(object):
     Main pyBinSim program logic
     """
 
-    def __init__(self, config_file):
+    def __init__(self, config_file, filter_storage=None):
+        """
+        :param config_file: path of the configuration file
+        :param filter_storage: FilterStorage shared with other BinSim instances.
+                               If None, a FilterStorage is created from the configuration.
+        """
 
         self.log = logging.getLogger("pybinsim.BinSim")
         self.log.info("BinSim: init")
 
+        # Duration of each startup phase in seconds
+        self.startupTimes = {}
+
         # Read Configuration File
-        self.config = BinSimConfig()
-        self.config.read_from_file(config_file)
+        with self.timed_phase('config'):
+            self.config = BinSimConfig()
+            self.config.read_from_file(config_file)
 
         self.nChannels = self.config.get('maxChannels')
         self.sampleRate = self.config.get('samplingRate')
         self.blockSize = self.config.get('blockSize')
+        self.liveInput = self.config.get('liveInput')
+        self.nListeners = self.config.get('listeners')
+
+        if self.nListeners > 1 and get_virtual_speakers(self.config) is not None:
+            raise RuntimeError("Several listeners are not supported with virtualSpeakers")
+
+        # Threads started from here on (OSC server, sound file reader, ...) inherit the affinity
+        self.renderCpus = parse_cpu_list(self.config.get('renderCpus'))
+        self.workerCpus = parse_cpu_list(self.config.get('workerCpus'))
+        if self.workerCpus:
+            configure_current_thread('BinSim worker threads', self.workerCpus)
+
+        # Filter spectra and buffers are locked into RAM, if configured
+        self.lockMemory = self.config.get('lockMemory')
+        self.lockedBytes = 0
 
         self.result = None
         self.block = None
         self.stream = None
+        self.renderThread = None
+        self.blockAdapter = None
+
+        # Channels of the audio stream and the output buffer of the device, see stream_open()
+        self.streamChannels = 2 * self.nListeners
+        self.deviceOutput = None
+
+        # PortAudio is initialized when the stream is opened
+        self.p = None
+
+        self.sharedFilterStorage = filter_storage
+
+        # Tracing of the processing stages, disabled if traceEvents is 0
+        self.tracer = tracing.Tracer(self.config.get('traceEvents'))
 
         self.convolverWorkers = []
         self.convolverHP, self.convolvers, self.filterStorage, self.oscReceiver, self.soundHandler = self.initialize_pybinsim()
 
-        self.p = pyaudio.PyAudio()
+        # Convolvers of further listeners share the input spectra of self.convolvers
+        self.listenerConvolvers = [[] for _ in range(self.nListeners - 1)]
+        self.listenerConvolversHP = []
+        if self.config.get('useHeadphoneFilter'):
+            self.listenerConvolversHP = [self.create_headphone_convolver(self.filterStorage)
+                                         for _ in range(self.nListeners - 1)]
+        self.headphoneConvolvers = [self.convolverHP] + self.listenerConvolversHP
+
+        # Reload generation of the filter storage the headphone convolvers are up to date with
+        self.filterGeneration = self.filterStorage.reload_generation
+
+        # Sources are panned onto virtual speakers with fixed BRIRs, if configured
+        self.panner = None
+        speaker_azimuths = get_virtual_speakers(self.config)
+        if speaker_azimuths is not None:
+            self.panner = VirtualSpeakerPanner(speaker_azimuths, self.nChannels, self.blockSize)
+
+        # Head tracker updates the filters without OSC messages
+        self.headTracker = None
+        if self.config.get('headTracker'):
+            # pyserial is only needed with a head tracker
+            from pybinsim.headtracker import HeadTracker
+
+            source_azimuths = [float(azimuth) for azimuth in
+                               self.config.get('headTrackerSourceAzimuths').split(',')]
+            self.headTracker = HeadTracker(self.config.get('headTracker'),
+                                           self.config.get('headTrackerBaudrate'),
+                                           self.oscReceiver, source_azimuths,
+                                           self.config.get('headTrackerResolution'))
+
+        # Output, inputs and poses are recorded to files, if configured
+        self.recorder = None
+        if self.config.get('recordFile'):
+            n_sources = self.nChannels if self.config.get('recordInputs') else 0
+            self.recorder = Recorder(self.config.get('recordFile'), self.blockSize, self.sampleRate,
+                                     n_sources, self.config.get('recordQueueBlocks'),
+                                     output_channels=2 * self.nListeners)
+            self.recorder.start()
+
+        # Convolvers for the sources are created outside of the audio callback: by the reader
+        # thread of the SoundHandler before it serves a file with more channels
+        self.convolverLock = threading.Lock()
+        if self.liveInput:
+            self.create_source_convolvers(self.soundHandler.get_sound_channels())
+        else:
+            self.soundHandler.channels_callback = self.create_source_convolvers
+            self.soundHandler.request_new_sound_file(self.config.get('soundfile'))
+
+        self.lock_memory(self.block, self.result, *itertools.chain.from_iterable(self.fftPlans.arrays().values()))
+        if self.config.get('lockMemory'):
+            self.log.info("Locked memory: {:.2f} MiB{}".format(
+                self.lockedBytes / 1024. / 1024., '' if self.lockMemory else ' (failed)'))
+
+        self.log_memory_usage()
+        self.log_startup_times()
 
     def __enter__(self):
         return self
@@ -128,131 +308,575 @@ class BinSim(object):
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.__cleanup()
 
+    @contextlib.contextmanager
+    def timed_phase(self, phase):
+        """
+        Measure the duration of a startup phase
+
+        :param phase: name of the phase, durations of the same phase are summed up
+        """
+        start = default_timer()
+        try:
+            yield
+        finally:
+            self.startupTimes[phase] = self.startupTimes.get(phase, 0) + default_timer() - start
+
+    def log_startup_times(self):
+        phases = ', '.join("{} {:.2f}s".format(phase, duration)
+                           for phase, duration in self.startupTimes.items())
+        self.log.info("Startup: {} (total {:.2f}s)".format(phases, sum(self.startupTimes.values())))
+
     def stream_start(self):
-        self.log.info("BinSim: stream_start")
-        self.stream = self.p.open(format=pyaudio.paFloat32, channels=2,
-                                  rate=self.sampleRate, output=True,
-                                  frames_per_buffer=self.blockSize,
-                                  stream_callback=audio_callback(self))
-        self.stream.start_stream()
+        self.stream_open()
 
         while self.stream.is_active():
             time.sleep(1)
 
+    def stream_open(self):
+        """
+        Open and start the audio stream without waiting for it to finish
+
+        :return: None
+        """
+        self.log.info("BinSim: stream_start")
+
+        import pyaudio
+
+        audio_device = self.config.get('audioDevice')
+        if audio_device < 0:
+            audio_device = None
+
+        # Blocks are rendered ahead in a separate thread, the callback only copies them
+        lookahead = self.config.get('renderLookahead')
+        if lookahead > 0:
+            self.renderThread = RenderThread(self.process_block, self.blockSize, lookahead,
+                                             channels=2 * self.nListeners,
+                                             setup_thread=self.configure_render_thread)
+            self.lock_memory(self.renderThread.ring, self.renderThread.output)
+            self.renderThread.start()
+            self.renderThread.wait_filled()
+
+        # Blocks are split or combined, if the device buffer differs from the blockSize
+        device_buffer_size = get_device_buffer_size(self.config)
+        if device_buffer_size != self.blockSize:
+            render_block = self.process_block
+            if self.renderThread is not None:
+                render_block = self.renderThread.read_block
+            self.blockAdapter = BlockAdapter(render_block, self.blockSize, device_buffer_size,
+                                             channels=2 * self.nListeners)
+
+        # Capture from the audio device, when live input is not read from a pipe or socket
+        capture = self.liveInput and not self.config.get('liveInputSource')
+
+        # A full-duplex stream has the same number of input and output channels.
+        # Output channels beyond those of the listeners stay silent.
+        self.streamChannels = 2 * self.nListeners
+        self.deviceOutput = None
+        if capture:
+            self.streamChannels = max(self.streamChannels, self.config.get('liveInputChannels'))
+        if self.streamChannels > 2 * self.nListeners:
+            self.deviceOutput = np.zeros([device_buffer_size, self.streamChannels], dtype=np.float32)
+
+        with self.timed_phase('audio open'):
+            if self.p is None:
+                self.p = pyaudio.PyAudio()
+            self.stream = self.p.open(format=pyaudio.paFloat32, channels=self.streamChannels,
+                                      rate=self.sampleRate, output=True,
+                                      output_device_index=audio_device,
+                                      input=capture,
+                                      frames_per_buffer=device_buffer_size,
+                                      stream_callback=audio_callback(self))
+            self.stream.start_stream()
+
+        self.log_startup_times()
+
     def initialize_pybinsim(self):
-        self.result = np.empty([self.blockSize, 2], dtype=np.float32)
+        # Two output channels per listener
+        self.result = np.empty([self.blockSize, 2 * self.nListeners], dtype=np.float32)
         self.block = np.empty(
             [self.nChannels, self.blockSize], dtype=np.float32)
 
-        # Create FilterStorage
-        filterStorage = FilterStorage(self.config.get('filterSize'),
-                                      self.blockSize,
-                                      self.config.get('filterList'))
+        # Files with a different sampling rate are converted and cached on disk
+        converter = SampleRateConverter(self.sampleRate,
+                                        self.config.get('resampleCacheDir'))
 
-        # Start an oscReceiver
-        oscReceiver = OscReceiver()
-        oscReceiver.start_listening()
-        time.sleep(1)
+        # Create FilterStorage
+        with self.timed_phase('filters'):
+            if self.sharedFilterStorage is not None:
+                filterStorage = self.sharedFilterStorage
+            else:
+                filterStorage = FilterStorage(self.config.get('filterSize'),
+                                              self.blockSize,
+                                              self.config.get('filterList'),
+                                              converter,
+                                              self.config.get('filterPrecision'),
+                                              get_trim_threshold(self.config),
+                                              self.config.get('deduplicateFilters'))
+
+        # Start an oscReceiver. The socket is bound at once, so no message gets lost while starting.
+        with self.timed_phase('osc'):
+            oscReceiver = OscReceiver(self.config.get('oscPort'), self.nListeners)
+            oscReceiver.add_command("/pyBinSimTrace", self.export_trace)
+            oscReceiver.add_command("/pyBinSimReloadFilters", self.reload_filters)
+            oscReceiver.add_command("/pyBinSimMemory", self.log_memory_usage)
+            oscReceiver.start_listening()
 
         # Create SoundHandler
-        soundHandler = SoundHandler(self.blockSize, self.nChannels,
-                                    self.sampleRate, self.config.get('loopSound'))
+        with self.timed_phase('sound'):
+            if self.liveInput:
+                live_channels = self.config.get('liveInputChannels')
+                if live_channels > self.nChannels:
+                    raise RuntimeError("liveInputChannels ({}) exceeds maxChannels ({})".format(
+                        live_channels, self.nChannels))
+                # Captured device buffers are collected until a block is complete
+                fifo_size = self.blockSize
+                device_buffer_size = get_device_buffer_size(self.config)
+                if device_buffer_size != self.blockSize:
+                    fifo_size += device_buffer_size
+                soundHandler = LiveInputHandler(self.blockSize, live_channels,
+                                                self.config.get('liveInputSource'), fifo_size)
+            else:
+                soundHandler = SoundHandler(self.blockSize, self.nChannels,
+                                            self.sampleRate, self.config.get('loopSound'),
+                                            converter)
+
+        with self.timed_phase('planning'):
+            # FFTW plans are created once and shared by all convolvers
+            self.fftThreads = self.get_fft_threads()
+            self.fftPlans = FFTPlans(self.blockSize, self.fftThreads,
+                                     self.config.get('fftPlannerEffort'))
+
+            # Convolvers for the sources are created when the number of sound channels grows, see
+            # create_source_convolvers(). Virtual speakers are fixed, the BRIR of each speaker never changes.
+            self.log.info('Number of Channels: ' + str(self.nChannels))
+            convolvers = []
+            speaker_azimuths = get_virtual_speakers(self.config)
+            if speaker_azimuths is not None:
+                self.log.info('Virtual speakers: {}'.format(speaker_azimuths))
+                for n, azimuth in enumerate(speaker_azimuths):
+                    convolvers.append(self.create_convolver(n))
+                    pose = Pose(Orientation(azimuth, 0, 0), Position(0, 0, 0))
+                    convolvers[n].setIR(filterStorage.get_filter(pose), False)
+
+            # HP Equalization convolver
+            convolverHP = None
+            if self.config.get('useHeadphoneFilter'):
+                convolverHP = self.create_headphone_convolver(filterStorage)
 
-        soundfile_list = self.config.get('soundfile')
-        soundHandler.request_new_sound_file(soundfile_list)
+        return convolverHP, convolvers, filterStorage, oscReceiver, soundHandler
 
-        # Create N convolvers depending on the number of wav channels
-        self.log.info('Number of Channels: ' + str(self.nChannels))
-        convolvers = [None] * self.nChannels
-        for n in range(self.nChannels):
-            convolvers[n] = ConvolverFFTW(self.config.get(
-                'filterSize'), self.blockSize, False)
+    def create_convolver(self, source):
+        """
+        Create the convolver for a source or virtual speaker
+
+        :param source: index of the source, used for tracing
+        :return: ConvolverFFTW using the shared FFTW plans
+        """
+        convolver = ConvolverFFTW(self.config.get(
+            'filterSize'), self.blockSize, False, self.config.get('crossfadeTolerance'),
+            self.fftThreads, self.config.get('fftPlannerEffort'),
+            get_silence_threshold(self.config), self.fftPlans)
+        convolver.tracer = self.tracer
+        convolver.trace_source = source
+        self.lock_memory(*itertools.chain.from_iterable(convolver.arrays().values()))
+
+        return convolver
+
+    def create_headphone_convolver(self, filterStorage):
+        """
+        Create a stereo convolver with the headphone filter
+
+        :param filterStorage:
+        :return: ConvolverFFTW using the shared FFTW plans
+        """
+        convolverHP = ConvolverFFTW(self.config.get(
+            'filterSize'), self.blockSize, True,
+            fft_threads=self.fftThreads,
+            planner_effort=self.config.get('fftPlannerEffort'),
+            fft_plans=self.fftPlans)
+        convolverHP.tracer = self.tracer
+        hpfilter = filterStorage.get_headphone_filter()
+        convolverHP.setIR(hpfilter, False)
+        self.lock_memory(*itertools.chain.from_iterable(convolverHP.arrays().values()))
+
+        return convolverHP
+
+    def process_block(self):
+        """
+        Render the next block of the binaural output
+
+        All processing works in place on preallocated buffers, so that no memory is
+        allocated per block.
+
+        :return: self.result, array of shape [blockSize, 2 * listeners]
+        """
+        block_trace_slot = self.tracer.begin(tracing.BLOCK)
+
+        if self.filterStorage.reload_generation != self.filterGeneration:
+            self.update_reloaded_filters()
+
+        current_soundfile_list = self.oscReceiver.get_sound_file_list()
+        if current_soundfile_list:
+            self.soundHandler.request_new_sound_file(current_soundfile_list)
 
-        # HP Equalization convolver
-        convolverHP = None
+        # Get sound block. At least one convolver should exist
+        trace_slot = self.tracer.begin(tracing.BUFFER_READ)
+        n_sound_channels = self.soundHandler.get_sound_channels()
+        self.block[:n_sound_channels, :] = self.soundHandler.buffer_read()
+        self.tracer.end(trace_slot)
+
+        if n_sound_channels == 0:
+            self.result.fill(0)
+        elif self.panner is not None:
+            self.process_virtual_speakers(n_sound_channels)
+        else:
+            self.process_sources(n_sound_channels)
+
+        # Finally apply Headphone Filter
         if self.config.get('useHeadphoneFilter'):
-            convolverHP = ConvolverFFTW(self.config.get(
-                'filterSize'), self.blockSize, True)
-            hpfilter = filterStorage.get_headphone_filter()
-            convolverHP.setIR(hpfilter, False)
+            trace_slot = self.tracer.begin(tracing.HEADPHONE)
+            for listener, convolverHP in enumerate(self.headphoneConvolvers):
+                left, right = convolverHP.process(self.result[:, 2 * listener:2 * listener + 2])
+                self.result[:, 2 * listener] = left
+                self.result[:, 2 * listener + 1] = right
+            self.tracer.end(trace_slot)
 
-        return convolverHP, convolvers, filterStorage, oscReceiver, soundHandler
+        # Scale data
+        if n_sound_channels > 0:
+            np.multiply(self.result, self.config.get('loudnessFactor') / float(n_sound_channels * 2),
+                        out=self.result)
+
+        if self.result.max() > 1 or self.result.min() < -1:
+            self.log.warning('Clipping occurred: Adjust loudnessFactor!', extra=RATE_LIMITED)
+
+        if self.recorder is not None:
+            self.recorder.record(self.result, self.block[:n_sound_channels])
+
+        self.tracer.end(block_trace_slot)
+
+        return self.result
+
+    def update_reloaded_filters(self):
+        """
+        Switch the headphone convolvers to a changed headphone filter after the filter storage was reloaded
+
+        The storage may be shared with other sessions, so the reload is detected by its generation.
+
+        :return: None
+        """
+        self.filterGeneration = self.filterStorage.reload_generation
+
+        if self.config.get('useHeadphoneFilter'):
+            hpfilter = self.filterStorage.get_headphone_filter()
+            for convolverHP in self.headphoneConvolvers:
+                if convolverHP.current_filter is not hpfilter:
+                    convolverHP.setIR(hpfilter, self.config.get('enableCrossfading'))
+
+    def process_sources(self, n_sound_channels):
+        """
+        Render each sound channel with the filter of its current pose to self.result
+
+        :param n_sound_channels:
+        :return: None
+        """
+        # Update Filters and run each convolver with the current block
+        for n in range(n_sound_channels):
+
+            # Get new Filter
+            if self.oscReceiver.is_filter_update_necessary(n):
+                filterValueList = self.oscReceiver.get_current_values(n)
+                if self.recorder is not None:
+                    self.recorder.record_pose(n, filterValueList)
+                trace_slot = self.tracer.begin(tracing.GET_FILTER, n)
+                filter = self.filterStorage.get_filter(
+                    Pose.from_filterValueList(filterValueList))
+                self.tracer.end(trace_slot)
+                self.convolvers[n].setIR(
+                    filter, self.config.get('enableCrossfading'))
+
+            left, right = self.convolvers[n].process(self.block[n, :])
+
+            # Sum results from all convolvers
+            if n == 0:
+                self.result[:, 0] = left
+                self.result[:, 1] = right
+            else:
+                np.add(self.result[:, 0], left, out=self.result[:, 0])
+                np.add(self.result[:, 1], right, out=self.result[:, 1])
+
+        # Further listeners only need multiply and add and the inverse transform
+        for listener, convolvers in enumerate(self.listenerConvolvers, 1):
+            for n in range(n_sound_channels):
+                channel = self.oscReceiver.get_channel_index(listener, n)
+                if self.oscReceiver.is_filter_update_necessary(channel):
+                    filterValueList = self.oscReceiver.get_current_values(channel)
+                    if self.recorder is not None:
+                        self.recorder.record_pose(channel, filterValueList)
+                    trace_slot = self.tracer.begin(tracing.GET_FILTER, channel)
+                    filter = self.filterStorage.get_filter(
+                        Pose.from_filterValueList(filterValueList))
+                    self.tracer.end(trace_slot)
+                    convolvers[n].setIR(filter, self.config.get('enableCrossfading'))
+
+                left, right = convolvers[n].process_shared()
+
+                if n == 0:
+                    self.result[:, 2 * listener] = left
+                    self.result[:, 2 * listener + 1] = right
+                else:
+                    np.add(self.result[:, 2 * listener], left, out=self.result[:, 2 * listener])
+                    np.add(self.result[:, 2 * listener + 1], right, out=self.result[:, 2 * listener + 1])
+
+    def create_source_convolvers(self, n_sound_channels):
+        """
+        Make sure that convolvers for n_sound_channels sources exist
+
+        Called before more channels are served, never from the audio callback. The grown
+        lists replace the old ones at once, so the callback only ever reads complete lists.
+
+        :param n_sound_channels:
+        :return: None
+        """
+        if self.panner is not None:
+            return
+
+        with self.convolverLock:
+            convolvers = list(self.convolvers)
+            listenerConvolvers = [list(listener_convolvers) for listener_convolvers in self.listenerConvolvers]
+
+            while len(convolvers) < n_sound_channels:
+                n = len(convolvers)
+                self.log.info('Creating convolver for channel {}'.format(n))
+                convolvers.append(self.create_convolver(n))
+                for listener, listener_convolvers in enumerate(listenerConvolvers, 1):
+                    convolver = self.create_convolver(self.oscReceiver.get_channel_index(listener, n))
+                    convolver.share_input(convolvers[n])
+                    listener_convolvers.append(convolver)
+
+            self.listenerConvolvers = listenerConvolvers
+            self.convolvers = convolvers
+
+    def process_virtual_speakers(self, n_sound_channels):
+        """
+        Pan the sound channels onto the virtual speakers and render the speakers to self.result
+
+        The first filter value (yaw) of each channel is the azimuth of the source
+        relative to the head.
+
+        :param n_sound_channels:
+        :return: None
+        """
+        for n in range(n_sound_channels):
+            if self.oscReceiver.is_filter_update_necessary(n):
+                filterValueList = self.oscReceiver.get_current_values(n)
+                if self.recorder is not None:
+                    self.recorder.record_pose(n, filterValueList)
+                self.panner.set_source_azimuth(n, filterValueList[0])
+
+        # Gain changes are always faded, a gain step would click on every head movement
+        speaker_signals = self.panner.process(self.block[:n_sound_channels, :])
+
+        for n, convolver in enumerate(self.convolvers):
+            left, right = convolver.process(speaker_signals[n, :])
+
+            if n == 0:
+                self.result[:, 0] = left
+                self.result[:, 1] = right
+            else:
+                np.add(self.result[:, 0], left, out=self.result[:, 0])
+                np.add(self.result[:, 1], right, out=self.result[:, 1])
+
+    def export_trace(self, filepath=None):
+        """
+        Export traced processing stages in the Chrome trace format
+
+        :param filepath: defaults to traceFile setting
+        :return: None
+        """
+        if filepath is None:
+            filepath = self.config.get('traceFile')
+
+        self.tracer.export_chrome_trace(filepath)
+
+    def memory_usage(self):
+        """
+        Returns the bytes used by each subsystem. Convolvers are summed up.
+
+        :return: nested dict of byte counts
+        """
+        convolvers = {}
+        listener_convolvers = [convolver for convolvers in self.listenerConvolvers for convolver in convolvers]
+        for convolver in self.convolvers + listener_convolvers + [self.convolverHP] + self.listenerConvolversHP:
+            if convolver is not None:
+                add_memory_usage(convolvers, convolver.memory_usage())
+
+        usage = {'filterStorage': self.filterStorage.memory_usage(),
+                 'convolvers': convolvers,
+                 'fftPlans': self.fftPlans.memory_usage(),
+                 'soundHandler': self.soundHandler.memory_usage(),
+                 'binsim': {'buffers': array_bytes(self.block, self.result)}}
+
+        if self.panner is not None:
+            usage['panner'] = self.panner.memory_usage()
+        if self.renderThread is not None:
+            usage['renderThread'] = self.renderThread.memory_usage()
+        if self.recorder is not None:
+            usage['recorder'] = self.recorder.memory_usage()
+
+        return usage
+
+    def lock_memory(self, *arrays):
+        """
+        Lock the pages of arrays into RAM, if lockMemory is set. After a failure, no further locking is tried.
+
+        :param arrays: numpy arrays
+        :return: None
+        """
+        if not self.lockMemory:
+            return
+
+        try:
+            self.lockedBytes += lock_arrays(arrays)
+        except OSError as e:
+            self.log.warning("Cannot lock memory: {} (see ulimit -l)".format(e))
+            self.lockMemory = False
+
+    def get_fft_threads(self):
+        """
+        Returns the number of FFTW threads
+
+        FFTW starts its threads while planning, outside of the render thread, so they can neither
+        be pinned to renderCpus nor get the realtimePriority. A real-time render thread waiting for
+        them would suffer from priority inversion, so transforms are single-threaded in that case.
+
+        :return: fftThreads or 1
+        """
+        fft_threads = self.config.get('fftThreads')
+        if (self.renderCpus or self.config.get('realtimePriority') > 0) and fft_threads != 1:
+            self.log.info("FFTW threads cannot be pinned or prioritized: using fftThreads 1 "
+                          "with renderCpus or realtimePriority")
+            return 1
+
+        return fft_threads
+
+    def configure_render_thread(self):
+        """
+        Apply renderCpus and realtimePriority to the calling thread, which renders the blocks
+
+        Transforms are single-threaded then, see get_fft_threads().
+
+        :return: None
+        """
+        configure_current_thread('BinSim render thread', self.renderCpus,
+                                 self.config.get('realtimePriority'))
+
+    def log_memory_usage(self):
+        self.log.info("Memory usage: {}".format(format_memory_usage(self.memory_usage())))
+
+    def reload_filters(self):
+        """
+        Reload new or changed filters of the filter list in a background thread
+
+        A changed headphone filter is used from the next block on, also by other sessions
+        sharing the filter storage. The memory usage of all subsystems is logged afterwards.
+
+        :return: the started thread
+        """
+        def reload():
+            try:
+                self.filterStorage.reload_filters()
+                self.log_memory_usage()
+            except Exception:
+                self.log.exception("Reload of filters failed")
+
+        reload_thread = threading.Thread(target=reload)
+        reload_thread.daemon = True
+        reload_thread.start()
+
+        return reload_thread
 
     def close(self):
         self.log.info("BinSim: close")
         self.stream_close()
-        self.p.terminate()
+        if self.p is not None:
+            self.p.terminate()
+            self.p = None
 
     def stream_close(self):
         self.log.info("BinSim: stream_close")
+        if self.stream is None:
+            return
         self.stream.stop_stream()
         self.stream.close()
 
+        if self.renderThread is not None:
+            self.renderThread.stop()
+            self.renderThread = None
+        self.blockAdapter = None
+
     def __cleanup(self):
-        # Close everything when BinSim is finished
-        self.filterStorage.close()
+        # Close everything when BinSim is finished. A shared FilterStorage is closed by its owner.
+        if self.sharedFilterStorage is None:
+            self.filterStorage.close()
         self.close()
 
+        self.soundHandler.close()
+
+        if self.tracer.enabled:
+            self.export_trace()
+
         self.oscReceiver.close()
 
-        for n in range(self.nChannels):
-            self.convolvers[n].close()
+        if self.headTracker is not None:
+            self.headTracker.close()
+
+        if self.recorder is not None:
+            self.recorder.close()
+
+        for convolver in self.convolvers:
+            convolver.close()
+
+        for convolvers in self.listenerConvolvers:
+            for convolver in convolvers:
+                convolver.close()
 
         if self.config.get('useHeadphoneFilter'):
             if self.convolverHP:
                 self.convolverHP.close()
+            for convolverHP in self.listenerConvolversHP:
+                convolverHP.close()
 
 
 def audio_callback(binsim):
     """ Wrapper for callback to hand over custom data """
     assert isinstance(binsim, BinSim)
 
+    import pyaudio
+
     # The pyAudio Callback
     def callback(in_data, frame_count, time_info, status):
         # print("pyAudio callback")
 
-        current_soundfile_list = binsim.oscReceiver.get_sound_file_list()
-        if current_soundfile_list:
-            binsim.soundHandler.request_new_sound_file(current_soundfile_list)
-
-        # Get sound block. At least one convolver should exist
-        binsim.block[:binsim.soundHandler.get_sound_channels(
-        ), :] = binsim.soundHandler.buffer_read()
-
-        # Update Filters and run each convolver with the current block
-        for n in range(binsim.soundHandler.get_sound_channels()):
-
-            # Get new Filter
-            if binsim.oscReceiver.is_filter_update_necessary(n):
-                filterValueList = binsim.oscReceiver.get_current_values(n)
-                filter = binsim.filterStorage.get_filter(
-                    Pose.from_filterValueList(filterValueList))
-                binsim.convolvers[n].setIR(
-                    filter, callback.config.get('enableCrossfading'))
+        # Without render thread, blocks are rendered in the callback thread of PortAudio
+        if not callback.thread_configured:
+            callback.thread_configured = True
+            if binsim.renderThread is None:
+                binsim.configure_render_thread()
 
-            left, right = binsim.convolvers[n].process(binsim.block[n, :])
+        # Captured input of a full-duplex stream is fed to the convolvers directly
+        if in_data is not None and binsim.liveInput:
+            binsim.soundHandler.push_input(in_data, binsim.streamChannels)
 
-            # Sum results from all convolvers
-            if n == 0:
-                binsim.result[:, 0] = left
-                binsim.result[:, 1] = right
-            else:
-                binsim.result[:, 0] = np.add(binsim.result[:, 0], left)
-                binsim.result[:, 1] = np.add(binsim.result[:, 1], right)
-
-        # Finally apply Headphone Filter
-        if callback.config.get('useHeadphoneFilter'):
-            binsim.result[:, 0], binsim.result[:,
-                                               1] = binsim.convolverHP.process(binsim.result)
-
-        # Scale data
-        binsim.result = np.divide(binsim.result, float(
-            (binsim.soundHandler.get_sound_channels()) * 2))
-        binsim.result = np.multiply(
-            binsim.result, callback.config.get('loudnessFactor'))
+        if binsim.blockAdapter is not None:
+            result = binsim.blockAdapter.read_block()
+        elif binsim.renderThread is not None:
+            result = binsim.renderThread.read_block()
+        else:
+            result = binsim.process_block()
 
-        if np.max(np.abs(binsim.result)) > 1:
-            binsim.log.warn('Clipping occurred: Adjust loudnessFactor!')
+        if binsim.deviceOutput is not None:
+            binsim.deviceOutput[:, :result.shape[1]] = result
+            result = binsim.deviceOutput
 
         # When the last block is small than the blockSize, this is probably the end of the file.
         # Call pyaudio to stop after this frame
@@ -260,8 +884,9 @@ def audio_callback(binsim):
         if binsim.block.size < callback.config.get('blockSize'):
             pyaudio.paContinue = 1
 
-        return (binsim.result[:frame_count].tostring(), pyaudio.paContinue)
+        return (result[:frame_count].tobytes(), pyaudio.paContinue)
 
     callback.config = binsim.config
+    callback.thread_configured = False
 
     return callback
@@ -0,0 +1,102 @@
+# This file is part of the pyBinSim project.
+#
+# Copyright (c) 2017 A. Neidhardt, F. Klein, N. Knoop, T. Köllmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+""" Module moves log output of pybinsim out of the audio thread """
+import atexit
+import logging
+import logging.handlers
+import queue
+
+# Passed as extra by call sites in the render path, e.g. log.info("...", extra=RATE_LIMITED)
+RATE_LIMITED = {'rate_limited': True}
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Passes at most one record per interval for each rate limited logging call site.
+
+    Only records logged with extra=RATE_LIMITED are limited, all others always pass.
+    Records of the same call site within the interval are counted, and the count is
+    appended to the next record that passes, e.g.
+    "Clipping occurred: Adjust loudnessFactor! (repeated 312 times in the last 1.0s)".
+    """
+
+    def __init__(self, interval=1.0):
+        """
+        :param interval: in seconds
+        """
+        super(RateLimitFilter, self).__init__()
+
+        self.interval = interval
+
+        # (path, line) -> [time of the last passed record, number of suppressed records]
+        self.call_sites = {}
+
+    def filter(self, record):
+        if not getattr(record, 'rate_limited', False):
+            return True
+
+        call_site = (record.pathname, record.lineno)
+        state = self.call_sites.get(call_site)
+
+        if state is not None and record.created - state[0] < self.interval:
+            state[1] += 1
+            return False
+
+        if state is not None and state[1] > 0:
+            record.msg = "{} (repeated {} times in the last {:.1f}s)".format(
+                record.getMessage(), state[1], record.created - state[0])
+            record.args = None
+
+        self.call_sites[call_site] = [record.created, 0]
+
+        return True
+
+
+def start_queue_logging(logger, handler, rate_limit_interval=1.0):
+    """
+    Route the records of logger through a queue to handler
+
+    Logging calls only put the record into the queue. A background listener formats
+    and writes the records, so slow console or file output never blocks the caller.
+
+    :param logger: e.g. the 'pybinsim' logger
+    :param handler: handler doing the actual output
+    :param rate_limit_interval: minimal interval between records of one rate limited call site
+                                in seconds, 0 disables rate limiting
+    :return: the started QueueListener
+    """
+    log_queue = queue.Queue()
+
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    if rate_limit_interval > 0:
+        queue_handler.addFilter(RateLimitFilter(rate_limit_interval))
+    logger.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+
+    # Write the remaining records on exit
+    atexit.register(listener.stop)
+
+    return listener
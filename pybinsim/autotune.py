@@ -0,0 +1,191 @@
+# This file is part of the pyBinSim project.
+#
+# Copyright (c) 2017 A. Neidhardt, F. Klein, N. Knoop, T. Köllmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+""" Module benchmarks convolver settings on the host and writes the fastest ones to a config profile """
+import argparse
+import logging
+import multiprocessing
+from timeit import default_timer
+
+import numpy as np
+
+from pybinsim import init_logging
+from pybinsim.application import BinSimConfig
+from pybinsim.convolver import ConvolverFFTW, FFTPlans
+from pybinsim.filterstorage import Filter
+
+PLANNER_EFFORTS = ('FFTW_ESTIMATE', 'FFTW_MEASURE', 'FFTW_PATIENT')
+
+logger = logging.getLogger("pybinsim.autotune")
+
+
+def benchmark(filter_size, block_size, channels, fft_threads, planner_effort, n_blocks=100):
+    """
+    Measure processing times of channels convolvers, switching filters with cross fade
+    in every block (worst case of the audio callback)
+
+    :param filter_size:
+    :param block_size:
+    :param channels: number of convolvers
+    :param fft_threads:
+    :param planner_effort:
+    :param n_blocks: number of measured blocks
+    :return: array with the processing time of each block in seconds
+    """
+    ir_blocks = filter_size // block_size
+    decay = np.exp(-np.arange(ir_blocks * block_size) / (ir_blocks * block_size / 8.))
+    filters = [Filter((np.random.randn(ir_blocks * block_size, 2) * decay[:, np.newaxis]).astype(np.float32),
+                      ir_blocks, block_size) for _ in range(2)]
+
+    fft_plans = FFTPlans(block_size, fft_threads, planner_effort)
+    convolvers = [ConvolverFFTW(ir_blocks * block_size, block_size, False,
+                                fft_threads=fft_threads, planner_effort=planner_effort,
+                                fft_plans=fft_plans)
+                  for _ in range(channels)]
+
+    block = np.random.randn(block_size).astype(np.float32)
+    times = np.zeros(n_blocks)
+
+    # first blocks are not measured
+    for n in range(-5, n_blocks):
+        start = default_timer()
+        for convolver in convolvers:
+            convolver.setIR(filters[n % 2], True)
+            convolver.process(block)
+        if n >= 0:
+            times[n] = default_timer() - start
+
+    for convolver in convolvers:
+        convolver.close()
+
+    return times
+
+
+def autotune(filter_size, sampling_rate, channels, block_sizes, thread_counts, planner_efforts,
+             headroom=0.7, n_blocks=100):
+    """
+    Benchmark all combinations of settings and return the one with the lowest latency
+    which meets the deadline
+
+    The deadline is met, if the 99th percentile of the processing times is below
+    headroom * block_size / sampling_rate. The smallest block size meeting the deadline
+    is chosen, and for it the fftThreads and fftPlannerEffort with the lowest load.
+    Larger blocks almost always have a lower load, but add latency.
+
+    :return: (best settings as dict or None, list of all results)
+    """
+    results = []
+
+    for block_size in block_sizes:
+        if filter_size % block_size != 0:
+            logger.info("Skipping blockSize {}: filterSize {} is no multiple".format(block_size, filter_size))
+            continue
+
+        deadline = block_size / float(sampling_rate)
+
+        for fft_threads in thread_counts:
+            for planner_effort in planner_efforts:
+                times = benchmark(filter_size, block_size, channels, fft_threads, planner_effort, n_blocks)
+                result = {'blockSize': block_size,
+                          'fftThreads': fft_threads,
+                          'fftPlannerEffort': planner_effort,
+                          'load': np.mean(times) / deadline,
+                          'p99': np.percentile(times, 99),
+                          'deadline': deadline}
+                result['meetsDeadline'] = result['p99'] <= headroom * deadline
+                results.append(result)
+
+                logger.info("blockSize {blockSize}, fftThreads {fftThreads}, {fftPlannerEffort}: "
+                            "load {load:.2f}, p99 {p99:.5f}s, deadline {deadline:.5f}s".format(**result))
+
+    candidates = [result for result in results if result['meetsDeadline']]
+    if not candidates:
+        return None, results
+
+    block_size = min(result['blockSize'] for result in candidates)
+    best = min((result for result in candidates if result['blockSize'] == block_size),
+               key=lambda result: result['load'])
+    logger.info("Smallest blockSize meeting the deadline: {blockSize}, fftThreads {fftThreads}, "
+                "{fftPlannerEffort} with load {load:.2f}".format(**best))
+
+    return best, results
+
+
+def write_profile(filepath, settings):
+    """
+    Write settings to a config profile which can be loaded with the configProfile setting
+
+    :param filepath:
+    :param settings: dict with blockSize, fftThreads and fftPlannerEffort
+    :return: None
+    """
+    with open(filepath, 'w') as profile:
+        profile.write("# written by pybinsim-autotune\n")
+        for key in ('blockSize', 'fftThreads', 'fftPlannerEffort'):
+            profile.write("{} {}\n".format(key, settings[key]))
+
+
+def parse_list(value, value_type=int):
+    return [value_type(x) for x in value.split(',')]
+
+
+def main(argv=None):
+    init_logging(logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark convolver settings for a pyBinSim configuration and write the smallest '
+                    'blockSize which meets the deadline, with its fastest settings, to a config profile.')
+    parser.add_argument('config', help='pyBinSim configuration file')
+    parser.add_argument('--output', default='autotune_profile.cfg', help='config profile to write')
+    parser.add_argument('--channels', type=int, help='number of sources, defaults to maxChannels')
+    parser.add_argument('--block-sizes', type=parse_list, default=[128, 256, 512, 1024])
+    parser.add_argument('--threads', type=parse_list,
+                        default=sorted({1, 2, multiprocessing.cpu_count()}))
+    parser.add_argument('--efforts', type=lambda value: parse_list(value, str),
+                        default=list(PLANNER_EFFORTS[:2]))
+    parser.add_argument('--headroom', type=float, default=0.7,
+                        help='fraction of the block duration available for processing')
+    parser.add_argument('--blocks', type=int, default=100, help='number of measured blocks per setting')
+    args = parser.parse_args(argv)
+
+    config = BinSimConfig()
+    config.read_from_file(args.config)
+    channels = args.channels if args.channels else config.get('maxChannels')
+
+    best, _ = autotune(config.get('filterSize'), config.get('samplingRate'), channels,
+                       args.block_sizes, args.threads, args.efforts, args.headroom, args.blocks)
+
+    if best is None:
+        logger.error("No setting meets the deadline")
+        return 1
+
+    write_profile(args.output, best)
+    logger.info("Wrote {}: blockSize {blockSize}, fftThreads {fftThreads}, {fftPlannerEffort}".format(
+        args.output, **best))
+    logger.info("Add 'configProfile {}' to your configuration file".format(args.output))
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,309 @@
+# This file is part of the pyBinSim project.
+#
+# Copyright (c) 2017 A. Neidhardt, F. Klein, N. Knoop, T. Köllmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+""" Module renders stimulus sets offline in a pool of worker processes """
+import argparse
+import logging
+import multiprocessing
+import os
+from collections import namedtuple
+from timeit import default_timer
+
+import numpy as np
+import soundfile as sf
+
+from pybinsim import init_logging
+from pybinsim.application import BinSimConfig, get_silence_threshold, get_trim_threshold
+from pybinsim.convolver import ConvolverFFTW, FFTPlans
+from pybinsim.filterstorage import FilterStorage
+from pybinsim.pose import Pose
+from pybinsim.resampler import SampleRateConverter
+
+logger = logging.getLogger("pybinsim.batch")
+
+# Pose of all channels until the trajectory sets another one, like the OscReceiver default
+DEFAULT_FILTER_VALUES = (0, 0, 0, 0, 0, 0, 0, 0, 0)
+
+# State of a worker process. Filter storages are loaded before the workers are forked, so all
+# workers share the filter data of the parent. Without fork, each worker loads them on first use.
+_config = None
+_filter_storages = {}
+_fft_plans = None
+
+
+class BatchJob(namedtuple('BatchJob', ['output', 'sound_file', 'trajectory', 'filter_list'])):
+    pass
+
+
+def read_manifest(manifest_path, default_filter_list):
+    """
+    Read the render jobs of a manifest
+
+    Each line holds the output file, the sound file, the trajectory file ('-' for the
+    default pose) and optionally the filter list or SOFA file. Lines can be commented
+    with a '#' as first character.
+
+    :param manifest_path:
+    :param default_filter_list: used for lines without filter list, e.g. filterList of the config
+    :return: list of BatchJob
+    """
+    jobs = []
+    with open(manifest_path, 'r') as manifest:
+        for line in manifest:
+            line_content = line.split()
+            if not line_content or line_content[0].startswith('#'):
+                continue
+
+            if len(line_content) not in (3, 4):
+                raise RuntimeError("Unable to parse manifest line: {}".format(line.strip()))
+
+            filter_list = line_content[3] if len(line_content) == 4 else default_filter_list
+            jobs.append(BatchJob(line_content[0], line_content[1], line_content[2], filter_list))
+
+    return jobs
+
+
+def read_trajectory(trajectory_path):
+    """
+    Read the pose changes of a trajectory file
+
+    The format is the one of the poses file written by the Recorder: each line holds the
+    block index, the channel and the filter values, so recorded sessions can be rendered again.
+
+    :param trajectory_path: path or '-' for no pose changes
+    :return: dict of block index -> list of (channel, filter values)
+    """
+    updates = {}
+    if trajectory_path == '-':
+        return updates
+
+    with open(trajectory_path, 'r') as trajectory:
+        for line in trajectory:
+            line_content = line.split()
+            if not line_content or line_content[0].startswith('#'):
+                continue
+
+            updates.setdefault(int(line_content[0]), []).append(
+                (int(line_content[1]), tuple(line_content[2:])))
+
+    return updates
+
+
+def load_filter_storage(config, filter_list):
+    """ Returns the FilterStorage of filter_list, which is loaded once per process """
+    if filter_list not in _filter_storages:
+        converter = SampleRateConverter(config.get('samplingRate'), config.get('resampleCacheDir'))
+        _filter_storages[filter_list] = FilterStorage(config.get('filterSize'),
+                                                      config.get('blockSize'),
+                                                      filter_list,
+                                                      converter,
+                                                      config.get('filterPrecision'),
+                                                      get_trim_threshold(config),
+                                                      config.get('deduplicateFilters'))
+
+    return _filter_storages[filter_list]
+
+
+def render(config, filter_storage, sound, trajectory, fft_plans):
+    """
+    Render sound binaurally with the poses of trajectory, block by block like BinSim.process_block
+
+    :param config: BinSimConfig
+    :param filter_storage:
+    :param sound: float32 array [frames, channels]
+    :param trajectory: pose changes as returned by read_trajectory()
+    :param fft_plans: FFTPlans for the blockSize
+    :return: float32 array [frames + filterSize, 2], rounded up to full blocks
+    """
+    block_size = config.get('blockSize')
+    filter_size = config.get('filterSize')
+    n_channels = sound.shape[1]
+
+    # The output includes the decay of the filters
+    n_blocks = -(-(sound.shape[0] + filter_size) // block_size)
+    output = np.zeros((n_blocks * block_size, 2), dtype=np.float32)
+    block = np.zeros(block_size, dtype=np.float32)
+
+    default_filter = filter_storage.get_filter(Pose.from_filterValueList(DEFAULT_FILTER_VALUES))
+    convolvers = []
+    for _ in range(n_channels):
+        convolver = ConvolverFFTW(filter_size, block_size, False, config.get('crossfadeTolerance'),
+                                  silence_threshold=get_silence_threshold(config), fft_plans=fft_plans)
+        convolver.setIR(default_filter, False)
+        convolvers.append(convolver)
+
+    convolverHP = None
+    if config.get('useHeadphoneFilter'):
+        convolverHP = ConvolverFFTW(filter_size, block_size, True, fft_plans=fft_plans)
+        convolverHP.setIR(filter_storage.get_headphone_filter(), False)
+
+    for n in range(n_blocks):
+        for channel, filter_values in trajectory.get(n, ()):
+            if channel < n_channels:
+                convolvers[channel].setIR(filter_storage.get_filter(Pose.from_filterValueList(filter_values)),
+                                          config.get('enableCrossfading'))
+
+        result = output[n * block_size:(n + 1) * block_size]
+        for channel, convolver in enumerate(convolvers):
+            frames = sound[n * block_size:(n + 1) * block_size, channel]
+            block[:frames.shape[0]] = frames
+            block[frames.shape[0]:] = 0
+
+            left, right = convolver.process(block)
+            result[:, 0] += left
+            result[:, 1] += right
+
+        if convolverHP is not None:
+            left, right = convolverHP.process(result)
+            result[:, 0] = left
+            result[:, 1] = right
+
+    output *= config.get('loudnessFactor') / float(n_channels * 2)
+
+    return output
+
+
+def init_worker(config, loglevel):
+    """ Set up a worker process of the pool """
+    global _config
+    _config = config
+
+    # The queue listener of the parent does not exist in the worker
+    logging.getLogger("pybinsim").handlers = []
+    init_logging(loglevel)
+
+
+def render_job(job):
+    """
+    Render one job in a worker process
+
+    The output is written to a temporary file and renamed when it is complete, so an
+    interrupted batch never leaves partial outputs and resumes by skipping existing ones.
+
+    :param job: BatchJob
+    :return: (job, rendered seconds, processing seconds, error message or None)
+    """
+    global _fft_plans
+    start = default_timer()
+    fs = _config.get('samplingRate')
+
+    try:
+        # Parallelism comes from the processes, so each worker transforms with one thread
+        if _fft_plans is None:
+            _fft_plans = FFTPlans(_config.get('blockSize'), 1, _config.get('fftPlannerEffort'))
+
+        filter_storage = load_filter_storage(_config, job.filter_list)
+        sound = SampleRateConverter(fs, _config.get('resampleCacheDir')).read(job.sound_file)
+        if sound.ndim == 1:
+            sound = sound[:, np.newaxis]
+
+        output = render(_config, filter_storage, sound, read_trajectory(job.trajectory), _fft_plans)
+
+        output_dir = os.path.dirname(job.output)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        root, extension = os.path.splitext(job.output)
+        tmp_file = "{}.part{}".format(root, extension)
+        # FLAC does not support float samples
+        subtype = 'PCM_24' if extension.lower() == '.flac' else 'FLOAT'
+        sf.write(tmp_file, output, fs, subtype=subtype)
+        os.replace(tmp_file, job.output)
+    except Exception as e:
+        return job, 0., default_timer() - start, "{}: {}".format(type(e).__name__, e)
+
+    return job, output.shape[0] / float(fs), default_timer() - start, None
+
+
+def run_batch(config, jobs, processes=None, worker_loglevel=logging.WARNING):
+    """
+    Render all jobs whose output does not exist yet in a pool of processes
+
+    :param config: BinSimConfig
+    :param jobs: list of BatchJob
+    :param processes: number of worker processes, defaults to the number of CPUs
+    :param worker_loglevel: log level of the workers
+    :return: (number of rendered jobs, list of failed jobs, rendered seconds, wall time in seconds)
+    """
+    pending = [job for job in jobs if not os.path.exists(job.output)]
+    logger.info("{} of {} jobs already rendered, {} to render".format(
+        len(jobs) - len(pending), len(jobs), len(pending)))
+
+    # With fork, the filters are loaded once here and shared copy-on-write by all workers
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+        for filter_list in sorted({job.filter_list for job in pending}):
+            load_filter_storage(config, filter_list)
+    else:
+        context = multiprocessing.get_context()
+
+    start = default_timer()
+    rendered_seconds = 0.
+    rendered_jobs = 0
+    failed = []
+
+    if pending:
+        with context.Pool(processes, initializer=init_worker, initargs=(config, worker_loglevel)) as pool:
+            for job, seconds, duration, error in pool.imap_unordered(render_job, pending):
+                if error is not None:
+                    logger.error("{}: {}".format(job.output, error))
+                    failed.append(job)
+                    continue
+
+                rendered_jobs += 1
+                rendered_seconds += seconds
+                logger.info("[{}/{}] {}: {:.1f}s in {:.1f}s, {:.1f} realtime-seconds per second in total".format(
+                    rendered_jobs + len(failed), len(pending), job.output, seconds, duration,
+                    rendered_seconds / (default_timer() - start)))
+
+    return rendered_jobs, failed, rendered_seconds, default_timer() - start
+
+
+def main(argv=None):
+    init_logging(logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description='Render sound files along head trajectories with several filter sets offline. '
+                    'Jobs whose output exists are skipped, so an interrupted batch can be resumed.')
+    parser.add_argument('config', help='pyBinSim configuration file')
+    parser.add_argument('manifest', help='file with one job per line: output, sound file, trajectory '
+                                         "(or '-') and optionally a filter list")
+    parser.add_argument('--processes', type=int, help='number of worker processes, defaults to the number of CPUs')
+    args = parser.parse_args(argv)
+
+    config = BinSimConfig()
+    config.read_from_file(args.config)
+    jobs = read_manifest(args.manifest, config.get('filterList'))
+
+    rendered_jobs, failed, rendered_seconds, duration = run_batch(config, jobs, args.processes)
+
+    logger.info("Rendered {} jobs, {:.1f}s of audio in {:.1f}s: {:.1f} realtime-seconds per second".format(
+        rendered_jobs, rendered_seconds, duration, rendered_seconds / duration if duration > 0 else 0.))
+    if failed:
+        logger.error("{} jobs failed, run again to retry them".format(len(failed)))
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,80 @@
+# This file is part of the pyBinSim project.
+#
+# Copyright (c) 2017 A. Neidhardt, F. Klein, N. Knoop, T. Köllmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+""" Module adapts the block size of the audio device to the block size of the convolution """
+import logging
+
+import numpy as np
+
+
+class BlockAdapter(object):
+    """
+    Serves output blocks of the device buffer size from blocks rendered with the
+    partition size of the convolvers.
+
+    With a smaller device buffer, one rendered block is handed out over several
+    device buffers. With a larger device buffer, several blocks are rendered for one
+    device buffer. Rendered frames, which do not fit into the current device buffer,
+    are kept for the next one.
+    """
+
+    def __init__(self, render_block, block_size, device_buffer_size, channels=2):
+        """
+        :param render_block: function returning the next block, shape [block_size, channels]
+        :param block_size: partition size of the convolvers
+        :param device_buffer_size: frames per buffer of the audio device
+        :param channels: number of output channels
+        """
+        self.log = logging.getLogger("pybinsim.BlockAdapter")
+        self.log.info("BlockAdapter: {} frames per device buffer, {} frames per block".format(
+            device_buffer_size, block_size))
+
+        self.render_block = render_block
+        self.block_size = block_size
+
+        self.block = np.zeros((block_size, channels), dtype=np.float32)
+        self.output = np.zeros((device_buffer_size, channels), dtype=np.float32)
+
+        # Frames of self.block which have already been handed out
+        self.position = block_size
+
+    def read_block(self):
+        """
+        Return the next device buffer
+
+        :return: array of shape [device_buffer_size, channels], valid until the next call
+        """
+        filled = 0
+        device_buffer_size = self.output.shape[0]
+
+        while filled < device_buffer_size:
+            if self.position == self.block_size:
+                self.block[:] = self.render_block()
+                self.position = 0
+
+            count = min(device_buffer_size - filled, self.block_size - self.position)
+            self.output[filled:filled + count] = self.block[self.position:self.position + count]
+            filled += count
+            self.position += count
+
+        return self.output
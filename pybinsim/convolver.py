@@ -23,33 +23,109 @@
 import logging
 import multiprocessing
 import pickle
+import weakref
 from pathlib import Path
 from timeit import default_timer
 
 import numpy as np
 import pyfftw
 
+from pybinsim import tracing
+from pybinsim.utility import array_bytes
+
 
 nThreads = multiprocessing.cpu_count()
 
 
+class FFTPlans(object):
+    """
+    FFTW plans for one block size, shared by all convolvers of a pyBinSim session
+
+    The plans transform their own aligned arrays. Convolvers copy their data in and
+    the results out, so all convolvers sharing the plans must be processed from one thread.
+    """
+
+    def __init__(self, block_size, fft_threads=None, planner_effort='FFTW_MEASURE'):
+        """
+        :param block_size: transforms have a length of 2 * block_size
+        :param fft_threads: defaults to the number of CPUs
+        :param planner_effort: 'FFTW_ESTIMATE', 'FFTW_MEASURE', 'FFTW_PATIENT' or 'FFTW_EXHAUSTIVE'
+        """
+        self.log = logging.getLogger("pybinsim.FFTPlans")
+        self.log.info("FFTPlans: Start planning")
+        start = default_timer()
+
+        self.block_size = block_size
+        threads = fft_threads if fft_threads else nThreads
+
+        self.rfft_input = pyfftw.zeros_aligned(block_size * 2, dtype='float32')
+        self.rfft_output = pyfftw.zeros_aligned(block_size + 1, dtype='complex64')
+        self.rfft = pyfftw.FFTW(self.rfft_input, self.rfft_output,
+                                flags=(planner_effort,), threads=threads)
+
+        self.irfft_input = pyfftw.zeros_aligned(block_size + 1, dtype='complex64')
+        self.irfft_output = pyfftw.zeros_aligned(block_size * 2, dtype='float32')
+        self.irfft = pyfftw.FFTW(self.irfft_input, self.irfft_output, direction='FFTW_BACKWARD',
+                                 flags=(planner_effort, 'FFTW_DESTROY_INPUT'), threads=threads)
+
+        # The inverse transform is not normalized, filters are scaled by this factor instead
+        self.irfft_scale = 1 / float(block_size * 2)
+
+        self.log.info("FFTPlans: Finished planning (took {}s)".format(default_timer() - start))
+
+    def arrays(self):
+        """ Returns the arrays of the plans, grouped like memory_usage() """
+        return {'fft_buffers': (self.rfft_input, self.rfft_output, self.irfft_input, self.irfft_output)}
+
+    def memory_usage(self):
+        """ Returns the bytes used by the arrays of the plans as dict """
+        return {group: array_bytes(*arrays) for group, arrays in self.arrays().items()}
+
+    def forward(self, data):
+        """
+        Transform data, zero padded to 2 * block_size, to freq domain
+
+        :param data: up to 2 * block_size samples
+        :return: spectrum, valid until the next call
+        """
+        frames = data.shape[0]
+        self.rfft_input[:frames] = data
+        self.rfft_input[frames:] = 0
+        self.rfft.execute()
+
+        return self.rfft_output
+
+    def inverse(self, spectrum):
+        """
+        Transform spectrum back to time domain without normalization
+
+        :param spectrum: block_size + 1 bins
+        :return: 2 * block_size samples, valid until the next call
+        """
+        self.irfft_input[:] = spectrum
+        self.irfft.execute()
+
+        return self.irfft_output
+
+
 class ConvolverFFTW(object):
     """
     Class for convolving mono (usually for virtual sources) or stereo input (usually for HP compensation)
     with a BRIRsor HRTF
     """
 
-    def __init__(self, ir_size, block_size, process_stereo):
+    def __init__(self, ir_size, block_size, process_stereo, crossfade_tolerance=0.0,
+                 fft_threads=None, planner_effort='FFTW_MEASURE', silence_threshold=None,
+                 fft_plans=None):
         start = default_timer()
 
         self.log = logging.getLogger("pybinsim.ConvolverFFTW")
         self.log.info("Convolver: Start Init")
 
         # pyFFTW Options
-        pyfftw.interfaces.cache.enable()
-        self.fftw_planning_effort = 'FFTW_MEASURE'
-        # self.fftw_planning_effort = 'FFTW_PATIENT'
-        # self.fftw_planning_effort ='FFTW_EXHAUSTIVE' # takes 5..10 minutes
+        # 'FFTW_ESTIMATE', 'FFTW_MEASURE', 'FFTW_PATIENT' or 'FFTW_EXHAUSTIVE' (takes 5..10 minutes)
+        self.fftw_planning_effort = planner_effort
+        self.fftw_threads = fft_threads if fft_threads else nThreads
 
         # Get Basic infos
         self.IR_size = ir_size
@@ -66,8 +142,8 @@ class ConvolverFFTW(object):
         # Calculate COSINE-Square crossfade windows
         self.crossFadeOut = np.array(range(0, self.block_size), dtype='float32')
         self.crossFadeOut = np.square(
-            np.cos(self.crossFadeOut/(self.block_size-1)*(np.pi/2)))
-        self.crossFadeIn = np.flipud(self.crossFadeOut)
+            np.cos(self.crossFadeOut/(self.block_size-1)*(np.pi/2))).astype('float32')
+        self.crossFadeIn = np.ascontiguousarray(np.flipud(self.crossFadeOut))
 
         # Filter format: [nBlocks,blockSize*2]
 
@@ -77,20 +153,18 @@ class ConvolverFFTW(object):
         #     loaded_wisdom = pickle.load(open(fn_wisdom, 'rb'))
         #     pyfftw.import_wisdom(loaded_wisdom)
 
-        # Create Input Buffers and create fftw plans. These need to be memory aligned, because they are ransformed to
-        # freq domain regularly
-        self.log.info("Convolver: Start Init buffer fft plans")
-        self.buffer = pyfftw.zeros_aligned(self.block_size * 2, dtype='float32')
-        self.bufferFftPlan = pyfftw.builders.rfft(self.buffer, overwrite_input=True, threads=nThreads,
-                                                  planner_effort=self.fftw_planning_effort, avoid_copy=True)
+        # FFTW plans are shared by all convolvers with the same block size, if given
+        if fft_plans is None:
+            fft_plans = FFTPlans(self.block_size, self.fftw_threads, self.fftw_planning_effort)
+        self.fft_plans = fft_plans
 
+        # Create Input Buffers
+        self.log.info("Convolver: Start Init buffers")
+        self.buffer = pyfftw.zeros_aligned(self.block_size * 2, dtype='float32')
         self.buffer2 = pyfftw.zeros_aligned(
             self.block_size * 2, dtype='float32')
-        self.buffer2FftPlan = pyfftw.builders.rfft(self.buffer2, overwrite_input=True, threads=nThreads,
-                                                   planner_effort=self.fftw_planning_effort, avoid_copy=True)
 
         # Create arrays for the filters and the FDLs.
-        self.log.info("Convolver: Start Init filter fft plans")
         self.TF_left_blocked = np.zeros(
             (self.IR_blocks, self.block_size + 1), dtype='complex64')
         self.TF_right_blocked = np.zeros(
@@ -100,16 +174,38 @@ class ConvolverFFTW(object):
         self.TF_right_blocked_previous = np.zeros(
             (self.IR_blocks, self.block_size + 1), dtype='complex64')
 
-        self.filter_fftw_plan = pyfftw.builders.rfft(np.zeros(self.block_size, dtype=np.float32), n=self.block_size * 2, overwrite_input=True,
-                                                     threads=nThreads, planner_effort=self.fftw_planning_effort,
-                                                     avoid_copy=False)
-
+        # FDLs are ring buffers of input spectra; FDL_position points to the newest spectrum,
+        # older spectra follow at increasing (wrapped) indices
         self.FDL_size = self.IR_blocks * (self.block_size + 1)
-        self.FDL_left = np.zeros(self.FDL_size, dtype='complex64')
-        self.FDL_right = np.zeros(self.FDL_size, dtype='complex64')
+        self.FDL_left = np.zeros(
+            (self.IR_blocks, self.block_size + 1), dtype='complex64')
+        self.FDL_right = np.zeros(
+            (self.IR_blocks, self.block_size + 1), dtype='complex64')
+        self.FDL_position = 0
+
+        # Filters belonging to TF_*_blocked and TF_*_blocked_previous. Partitions from
+        # differing_blocks on are equal (within crossfade_tolerance) for both filters and
+        # are only accumulated once during cross fades. Results are cached per filter pair,
+        # keyed by weak references, so filters replaced by a reload are not kept alive.
+        self.crossfade_tolerance = crossfade_tolerance
+        self.current_filter = None
+        self.previous_filter = None
+        self.differing_blocks = self.IR_blocks
+        self.differing_blocks_cache = {}
+
+        # Number of partitions used by the current and the previous filter
+        self.active_blocks = 0
+        self.active_blocks_previous = 0
+        self.differing_blocks_cache_size = 10000
+        self.resultLeftFreqShared = np.zeros(self.block_size + 1, dtype='complex64')
+        self.resultRightFreqShared = np.zeros(self.block_size + 1, dtype='complex64')
+
+        # Scratch buffers, so that processing does not allocate memory
+        self.MAC_products = np.zeros(
+            (self.IR_blocks, self.block_size + 1), dtype='complex64')
+        self.crossFadeScratch = np.zeros(self.block_size, dtype='float32')
 
         # Arrays for the result of the complex multiply and add
-        # These should be memory aligned because ifft is performed with these data
         self.resultLeftFreq = pyfftw.zeros_aligned(
             self.block_size + 1, dtype='complex64')
         self.resultRightFreq = pyfftw.zeros_aligned(
@@ -119,22 +215,6 @@ class ConvolverFFTW(object):
         self.resultRightFreqPrevious = pyfftw.zeros_aligned(
             self.block_size + 1, dtype='complex64')
 
-        self.log.info("Convolver: Start Init result ifft plans")
-        self.resultLeftIFFTPlan = pyfftw.builders.irfft(self.resultLeftFreq,
-                                                        overwrite_input=True, threads=nThreads,
-                                                        planner_effort=self.fftw_planning_effort, avoid_copy=True)
-        self.resultRightIFFTPlan = pyfftw.builders.irfft(self.resultRightFreq,
-                                                         overwrite_input=True, threads=nThreads,
-                                                         planner_effort=self.fftw_planning_effort, avoid_copy=True)
-
-        self.log.info("Convolver: Start Init result prvieous fft plans")
-        self.resultLeftPreviousIFFTPlan = pyfftw.builders.irfft(self.resultLeftFreqPrevious,
-                                                                overwrite_input=True, threads=nThreads,
-                                                                planner_effort=self.fftw_planning_effort, avoid_copy=True)
-        self.resultRightPreviousIFFTPlan = pyfftw.builders.irfft(self.resultRightFreqPrevious,
-                                                                 overwrite_input=True, threads=nThreads,
-                                                                 planner_effort=self.fftw_planning_effort, avoid_copy=True)
-
         # save FFTW plans to recover for next pyBinSim session
         # collected_wisdom = pyfftw.export_wisdom()
         # if not pn_temporary.exists():
@@ -148,12 +228,26 @@ class ConvolverFFTW(object):
         # Counts how often process() is called
         self.processCounter = 0
 
+        # Input with a peak below silence_threshold is silent. After IR_blocks + 1 silent
+        # blocks the output has decayed and processing is skipped until the input returns.
+        self.silence_threshold = silence_threshold
+        self.silent_blocks = 0
+        self.skipped_blocks = 0
+        self.skipping = False
+
+        # Convolver whose input spectra are used instead of an own FDL, see share_input()
+        self.input_source = None
+
         # Flag for interpolation of output blocks (result of process())
         self.interpolate = False
 
         # Select mono or stereo processing
         self.processStereo = process_stereo
 
+        # Stages of process() and setIR() are traced for this source
+        self.tracer = tracing.disabled_tracer
+        self.trace_source = tracing.NO_SOURCE
+
         end = default_timer()
         delta = end - start
         self.log.info("Convolver: Finished Init (took {}s)".format(delta))
@@ -165,6 +259,32 @@ class ConvolverFFTW(object):
         """
         return self.processCounter
 
+    def arrays(self):
+        """
+        Returns the FDLs, filter spectra and time domain buffers used while processing
+
+        :return: dict of tuples of arrays
+        """
+        # Shared FDLs belong to the convolver which owns them
+        fdl = (self.FDL_left, self.FDL_right) if self.input_source is None else ()
+
+        return {'fdl': fdl,
+                'spectra': (self.TF_left_blocked, self.TF_right_blocked,
+                            self.TF_left_blocked_previous, self.TF_right_blocked_previous,
+                            self.MAC_products, self.resultLeftFreq, self.resultRightFreq,
+                            self.resultLeftFreqPrevious, self.resultRightFreqPrevious,
+                            self.resultLeftFreqShared, self.resultRightFreqShared),
+                'buffers': (self.buffer, self.buffer2, self.outputLeft, self.outputRight,
+                            self.crossFadeIn, self.crossFadeOut, self.crossFadeScratch)}
+
+    def memory_usage(self):
+        """
+        Returns the bytes used by FDLs, filter spectra and time domain buffers
+
+        :return: dict of byte counts
+        """
+        return {group: array_bytes(*arrays) for group, arrays in self.arrays().items()}
+
     def transform_filter(self, filter):
         """
         Transform filter to freq domain
@@ -176,16 +296,18 @@ class ConvolverFFTW(object):
         # Get blocked IRs
         IR_left_blocked, IR_right_blocked = filter.getFilter()
 
-        self.TF_left_blocked = np.zeros(
-            [self.IR_blocks, self.block_size + 1], dtype='complex64')
-        self.TF_right_blocked = np.zeros(
-            [self.IR_blocks, self.block_size + 1], dtype='complex64')
+        # Only partitions up to active_blocks are transformed, the remaining ones are silent
+        self.active_blocks = min(filter.active_blocks, self.IR_blocks)
 
-        for ir_block_count in range(0, self.IR_blocks):
-            self.TF_left_blocked[ir_block_count] = self.filter_fftw_plan(
-                IR_left_blocked[ir_block_count])
-            self.TF_right_blocked[ir_block_count] = self.filter_fftw_plan(
-                IR_right_blocked[ir_block_count])
+        # Filters include the normalization of the inverse transform
+        for ir_block_count in range(0, self.active_blocks):
+            np.multiply(self.fft_plans.forward(IR_left_blocked[ir_block_count]),
+                        self.fft_plans.irfft_scale, out=self.TF_left_blocked[ir_block_count])
+            np.multiply(self.fft_plans.forward(IR_right_blocked[ir_block_count]),
+                        self.fft_plans.irfft_scale, out=self.TF_right_blocked[ir_block_count])
+
+        self.TF_left_blocked[self.active_blocks:] = 0
+        self.TF_right_blocked[self.active_blocks:] = 0
 
     def setIR(self, filter, do_interpolation):
         """
@@ -196,16 +318,58 @@ class ConvolverFFTW(object):
         :param do_interpolation:
         :return: None
         """
-        # Save old filters in case interpolation is needed
-        self.TF_left_blocked_previous = self.TF_left_blocked
-        self.TF_right_blocked_previous = self.TF_right_blocked
+        # Save old filters in case interpolation is needed. The buffers are swapped,
+        # the new filter overwrites the one before the previous filter.
+        self.TF_left_blocked, self.TF_left_blocked_previous = self.TF_left_blocked_previous, self.TF_left_blocked
+        self.TF_right_blocked, self.TF_right_blocked_previous = self.TF_right_blocked_previous, self.TF_right_blocked
+        self.active_blocks_previous = self.active_blocks
 
         # apply new filters
+        trace_slot = self.tracer.begin(tracing.TRANSFORM_FILTER, self.trace_source)
         self.transform_filter(filter)
+        self.tracer.end(trace_slot)
+
+        self.previous_filter = self.current_filter
+        self.current_filter = filter
+        if do_interpolation:
+            self.differing_blocks = self.get_differing_blocks(self.previous_filter, self.current_filter)
 
         # Interpolation means cross fading the output blocks (linear interpolation)
         self.interpolate = do_interpolation
 
+    def get_differing_blocks(self, filter_a, filter_b):
+        """
+        Returns the number of leading partitions which differ between two filters.
+        All later partitions are equal within crossfade_tolerance.
+
+        :param filter_a:
+        :param filter_b:
+        :return: number of differing partitions
+        """
+        if filter_a is None or filter_b is None:
+            return self.IR_blocks
+        if filter_a is filter_b:
+            return 0
+
+        ref_a, ref_b = weakref.ref(filter_a), weakref.ref(filter_b)
+        key = (ref_a, ref_b)
+        if key not in self.differing_blocks_cache:
+            if len(self.differing_blocks_cache) >= self.differing_blocks_cache_size:
+                self.differing_blocks_cache.clear()
+
+            differing = np.zeros(self.IR_blocks, dtype=bool)
+            for IR_a, IR_b in zip(filter_a.getFilter(), filter_b.getFilter()):
+                deviation = np.max(np.abs(IR_a - IR_b), axis=1)
+                differing |= deviation > self.crossfade_tolerance
+
+            differing_indices = np.flatnonzero(differing)
+            differing_blocks = int(differing_indices[-1]) + 1 if differing_indices.size else 0
+
+            self.differing_blocks_cache[key] = differing_blocks
+            self.differing_blocks_cache[(ref_b, ref_a)] = differing_blocks
+
+        return self.differing_blocks_cache[key]
+
     def process_nothing(self):
         """
         Just for testing
@@ -213,6 +377,17 @@ class ConvolverFFTW(object):
         """
         self.processCounter += 1
 
+    def shift_buffers(self):
+        """
+        Move second half of the input buffer to the first half
+        and advance the FDLs by one block
+
+        :return: None
+        """
+        self.buffer[:self.block_size] = self.buffer[self.block_size:]
+
+        self.FDL_position = (self.FDL_position - 1) % self.IR_blocks
+
     def fill_buffer_mono(self, block):
         """
         Copy mono soundblock to input Buffer;
@@ -221,27 +396,16 @@ class ConvolverFFTW(object):
         :return: None
         """
 
-        if block.size < self.block_size:
-            # print('Fill up last block')
-            block = np.concatenate(
-                (block, np.zeros((1, (self.block_size - block.size)), dtype=np.float32)), 1)
+        self.shift_buffers()
 
-        if self.processCounter == 0:
-            # insert first block to buffer
-            self.buffer[self.block_size:] = block
+        # insert new block to buffer, fill up last block with zeros
+        block = block.reshape(-1)
+        self.buffer[self.block_size:self.block_size + block.size] = block
+        self.buffer[self.block_size + block.size:] = 0
 
-        else:
-            # shift buffer
-            self.buffer = np.roll(self.buffer, -self.block_size)
-            # insert new block to buffer
-            self.buffer[self.block_size:self.block_size * 2] = block
-            # shift FDLs
-            self.FDL_left = np.roll(self.FDL_left, self.block_size + 1)
-            self.FDL_right = np.roll(self.FDL_right, self.block_size + 1)
-
-            # transform buffer into freq domain and copy to FDLs
-        self.FDL_left[:self.block_size + 1] = self.FDL_right[:self.block_size + 1] = self.bufferFftPlan(
-            self.buffer)
+        # transform buffer into freq domain and copy to FDLs
+        self.FDL_left[self.FDL_position] = self.fft_plans.forward(self.buffer)
+        self.FDL_right[self.FDL_position] = self.FDL_left[self.FDL_position]
 
     def fill_buffer_stereo(self, block):
         """
@@ -252,45 +416,125 @@ class ConvolverFFTW(object):
         :return: None
         """
 
-        if block.size < self.block_size:
-            # print('Fill up last block')
-            # print(np.shape(block))
-            block = np.concatenate(
-                (block, np.zeros(((self.block_size - block.size), 2), dtype=np.float32)), 0)
+        self.shift_buffers()
+        self.buffer2[:self.block_size] = self.buffer2[self.block_size:]
 
-        if self.processCounter == 0:
-            # insert first block to buffer
-            self.buffer[self.block_size:] = block[:, 0]
-            self.buffer2[self.block_size:] = block[:, 1]
-
-        else:
-            # shift buffer
-            self.buffer = np.roll(self.buffer, -self.block_size)
-            self.buffer2 = np.roll(self.buffer2, -self.block_size)
-            # insert new block to buffer
-            self.buffer[self.block_size:] = block[:, 0]
-            self.buffer2[self.block_size:] = block[:, 1]
-            # shift FDLs
-            self.FDL_left = np.roll(self.FDL_left, self.block_size + 1)
-            self.FDL_right = np.roll(self.FDL_right, self.block_size + 1)
+        # insert new block to buffer, fill up last block with zeros
+        frames = block.shape[0]
+        self.buffer[self.block_size:self.block_size + frames] = block[:, 0]
+        self.buffer[self.block_size + frames:] = 0
+        self.buffer2[self.block_size:self.block_size + frames] = block[:, 1]
+        self.buffer2[self.block_size + frames:] = 0
 
         # transform buffer into freq domain and copy to FDLs
-        self.FDL_left[0:self.block_size + 1] = self.bufferFftPlan(self.buffer)
-        self.FDL_right[0:self.block_size +
-                       1] = self.buffer2FftPlan(self.buffer2)
+        self.FDL_left[self.FDL_position] = self.fft_plans.forward(self.buffer)
+        self.FDL_right[self.FDL_position] = self.fft_plans.forward(self.buffer2)
 
-    def multiply_and_add(self, IR_block_count, result, input1, input2):
+    def multiply_and_add(self, result, TF_blocked, FDL, first_block=0, end_block=None):
+        """
+        Multiply filter blocks with the corresponding FDL entries and accumulate them in result
 
-        # Discard old data on the beginning of a new sound block
-        if IR_block_count == 0:
-            result = np.multiply(input1[IR_block_count], input2[(
-                IR_block_count * (self.block_size + 1)):((IR_block_count + 1) * (self.block_size + 1))])
+        :param result: array for the accumulated spectrum
+        :param TF_blocked: blocked filter spectra
+        :param FDL: frequency-domain delay line
+        :param first_block: first filter block to accumulate
+        :param end_block: filter block after the last one to accumulate, defaults to IR_blocks
+        :return: None
+        """
+        if end_block is None:
+            end_block = self.IR_blocks
+
+        if first_block >= end_block:
+            result.fill(0)
+            return
+
+        # Filter block k belongs to FDL entry FDL_position + k (wrapped)
+        position = self.FDL_position
+        n_wrapped = min(max(self.IR_blocks - position, first_block), end_block)
+        np.multiply(TF_blocked[first_block:n_wrapped],
+                    FDL[position + first_block:position + n_wrapped],
+                    out=self.MAC_products[first_block:n_wrapped])
+        np.multiply(TF_blocked[n_wrapped:end_block],
+                    FDL[position + n_wrapped - self.IR_blocks:position + end_block - self.IR_blocks],
+                    out=self.MAC_products[n_wrapped:end_block])
+
+        np.sum(self.MAC_products[first_block:end_block], axis=0, out=result)
+
+    def multiply_and_add_crossfade(self, result, result_previous, result_shared,
+                                   TF_blocked, TF_blocked_previous, FDL):
+        """
+        Accumulate current and previous filter, sharing the partitions that are equal for both
+
+        :param result: array for the accumulated spectrum of the current filter
+        :param result_previous: array for the accumulated spectrum of the previous filter
+        :param result_shared: scratch array for the accumulated shared partitions
+        :param TF_blocked: blocked spectra of the current filter
+        :param TF_blocked_previous: blocked spectra of the previous filter
+        :param FDL: frequency-domain delay line
+        :return: None
+        """
+        # Partitions after the active ones are silent for both filters
+        end_block = max(self.active_blocks, self.active_blocks_previous)
+        differing_blocks = min(self.differing_blocks, end_block)
 
-        else:
-            result = np.add(np.multiply(input1[IR_block_count], input2[(
-                IR_block_count * (self.block_size + 1)):((IR_block_count + 1) * (self.block_size + 1))]), result)
+        self.multiply_and_add(result, TF_blocked, FDL, 0, min(differing_blocks, self.active_blocks))
+        self.multiply_and_add(result_previous, TF_blocked_previous, FDL,
+                              0, min(differing_blocks, self.active_blocks_previous))
+
+        if differing_blocks < end_block:
+            self.multiply_and_add(result_shared, TF_blocked, FDL, differing_blocks, end_block)
+            np.add(result, result_shared, out=result)
+            np.add(result_previous, result_shared, out=result_previous)
+
+    def is_skipping(self, block):
+        """
+        Track silent input and decide if processing of block can be skipped
+
+        :param block:
+        :return: True if the output is silent without processing block
+        """
+        if self.silence_threshold is None:
+            return False
+
+        if block.max() > self.silence_threshold or block.min() < -self.silence_threshold:
+            self.silent_blocks = 0
+            return False
+
+        self.silent_blocks += 1
+        if self.silent_blocks <= self.IR_blocks + 1:
+            return False
+
+        if self.silent_blocks == self.IR_blocks + 2:
+            # Clear the history, so processing resumes from true silence
+            self.buffer.fill(0)
+            self.buffer2.fill(0)
+            self.FDL_left.fill(0)
+            self.FDL_right.fill(0)
+            self.outputLeft.fill(0)
+            self.outputRight.fill(0)
+
+        return True
+
+    def share_input(self, convolver):
+        """
+        Use the FDLs of convolver, e.g. of the same source for another listener
+
+        Afterwards process_shared() replaces process() and must be called after
+        convolver.process() for each block.
 
-        return result
+        :param convolver: convolver with the same ir_size and block_size, which processes the input
+        :return: None
+        """
+        self.input_source = convolver
+        self.FDL_left = convolver.FDL_left
+        self.FDL_right = convolver.FDL_right
+
+    def skip(self):
+        self.skipped_blocks += 1
+        self.processCounter += 1
+        self.interpolate = False
+
+        return self.outputLeft, self.outputRight
 
     def process(self, block):
         """
@@ -300,7 +544,12 @@ class ConvolverFFTW(object):
         :return: (outputLeft, outputRight)
         """
 
+        self.skipping = self.is_skipping(block)
+        if self.skipping:
+            return self.skip()
+
         # First: Fill buffer and FDLs with current block
+        trace_slot = self.tracer.begin(tracing.FFT, self.trace_source)
         if not self.processStereo:
             # print('Convolver Mono Processing')
             self.fill_buffer_mono(block)
@@ -308,43 +557,89 @@ class ConvolverFFTW(object):
             # print('Convolver Stereo Processing')
             self.fill_buffer_stereo(block)
 
+        self.tracer.end(trace_slot)
+
+        return self.render()
+
+    def process_shared(self):
+        """
+        Process the current block with the input spectra of input_source
+
+        :return: (outputLeft, outputRight)
+        """
+        self.FDL_position = self.input_source.FDL_position
+
+        if self.input_source.skipping:
+            if not self.skipping:
+                self.outputLeft.fill(0)
+                self.outputRight.fill(0)
+            self.skipping = True
+            return self.skip()
+
+        self.skipping = False
+        return self.render()
+
+    def render(self):
+        """
+        Multiply and accumulate the FDLs with the filters and transform the result to time domain
+
+        :return: (outputLeft, outputRight)
+        """
+
         # Second: Multiplikation with IR block und accumulation with previous data
-        for irBlockCount in range(0, self.IR_blocks):
+        trace_slot = self.tracer.begin(tracing.MAC, self.trace_source)
+        if not self.interpolate:
             # Always convolute current filter
-            self.resultLeftFreq[:] = self.multiply_and_add(irBlockCount, self.resultLeftFreq,
-                                                           self.TF_left_blocked, self.FDL_left)
-            self.resultRightFreq[:] = self.multiply_and_add(irBlockCount, self.resultRightFreq,
-                                                            self.TF_right_blocked, self.FDL_right)
-
-            # Also convolute old filter if interpolation needed
-            if self.interpolate:
-                self.resultLeftFreqPrevious[:] = self.multiply_and_add(irBlockCount, self.resultLeftFreqPrevious,
-                                                                       self.TF_left_blocked_previous, self.FDL_left)
-                self.resultRightFreqPrevious[:] = self.multiply_and_add(irBlockCount, self.resultRightFreqPrevious,
-                                                                        self.TF_right_blocked_previous, self.FDL_right)
+            self.multiply_and_add(self.resultLeftFreq, self.TF_left_blocked, self.FDL_left,
+                                  0, self.active_blocks)
+            self.multiply_and_add(self.resultRightFreq, self.TF_right_blocked, self.FDL_right,
+                                  0, self.active_blocks)
+        else:
+            # Also convolute old filter if interpolation needed. Only the differing partitions
+            # are convolved twice, the shared ones are accumulated once and added to both results.
+            self.multiply_and_add_crossfade(self.resultLeftFreq, self.resultLeftFreqPrevious,
+                                            self.resultLeftFreqShared, self.TF_left_blocked,
+                                            self.TF_left_blocked_previous, self.FDL_left)
+            self.multiply_and_add_crossfade(self.resultRightFreq, self.resultRightFreqPrevious,
+                                            self.resultRightFreqShared, self.TF_right_blocked,
+                                            self.TF_right_blocked_previous, self.FDL_right)
+
+        self.tracer.end(trace_slot)
 
         # Third: Transformation back to time domain
-        self.outputLeft = self.resultLeftIFFTPlan(self.resultLeftFreq)[
+        trace_slot = self.tracer.begin(tracing.IFFT, self.trace_source)
+        self.outputLeft[:] = self.fft_plans.inverse(self.resultLeftFreq)[
             self.block_size:self.block_size * 2]
-        self.outputRight = self.resultRightIFFTPlan(self.resultRightFreq)[
+        self.outputRight[:] = self.fft_plans.inverse(self.resultRightFreq)[
             self.block_size:self.block_size * 2]
 
         if self.interpolate:
             # fade over full block size
             # print('do block interpolation')
-            self.outputLeft = np.add(np.multiply(self.outputLeft, self.crossFadeIn),
-                                     np.multiply(self.resultLeftPreviousIFFTPlan(self.resultLeftFreqPrevious)[
-                                         self.block_size:self.block_size * 2], self.crossFadeOut))
+            self.crossfade(self.outputLeft, self.fft_plans.inverse(self.resultLeftFreqPrevious)[
+                self.block_size:self.block_size * 2])
+            self.crossfade(self.outputRight, self.fft_plans.inverse(self.resultRightFreqPrevious)[
+                self.block_size:self.block_size * 2])
 
-            self.outputRight = np.add(np.multiply(self.outputRight, self.crossFadeIn),
-                                      np.multiply(self.resultRightPreviousIFFTPlan(self.resultRightFreqPrevious)[
-                                          self.block_size:self.block_size * 2], self.crossFadeOut))
+        self.tracer.end(trace_slot)
 
         self.processCounter += 1
         self.interpolate = False
 
         return self.outputLeft, self.outputRight
 
+    def crossfade(self, output, output_previous):
+        """
+        Fade in place from output_previous to output
+
+        :param output: output of the current filter, overwritten with the result
+        :param output_previous: output of the previous filter
+        :return: None
+        """
+        np.multiply(output, self.crossFadeIn, out=output)
+        np.multiply(output_previous, self.crossFadeOut, out=self.crossFadeScratch)
+        np.add(output, self.crossFadeScratch, out=output)
+
     def close(self):
         print("Convolver: close")
         # TODO: do something here?
@@ -20,36 +20,153 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import hashlib
 import logging
 import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import soundfile as sf
 
+from pybinsim.asynclog import RATE_LIMITED
 from pybinsim.pose import Pose
-from pybinsim.utility import total_size
+from pybinsim.resampler import resample
+from pybinsim.utility import array_bytes, format_memory_usage
 
 nThreads = multiprocessing.cpu_count()
 
 
+FILTER_PRECISIONS = ('float32', 'float16', 'int16')
+
+
+def get_file_signature(file_path):
+    """ Returns (modification time, size) of file_path, which changes when the file is rewritten """
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def energy_decay_cutoff(ir, threshold_db):
+    """
+    Find the sample where the energy decay curve (backward integrated energy of all
+    channels) falls below threshold_db relative to the total energy.
+
+    :param ir: filter of shape [samples, channels]
+    :param threshold_db: threshold in dB, e.g. -100
+    :return: number of samples before the cutoff
+    """
+    energy = np.sum(np.square(ir, dtype=np.float64), axis=1)
+    decay_curve = np.cumsum(energy[::-1])[::-1]
+
+    if decay_curve[0] == 0:
+        return 0
+
+    threshold = decay_curve[0] * 10 ** (threshold_db / 10.)
+    below_threshold = np.flatnonzero(decay_curve < threshold)
+
+    if below_threshold.size == 0:
+        return ir.shape[0]
+
+    return int(below_threshold[0])
+
+
 class Filter(object):
+    """
+    Blocked stereo filter
 
-    def __init__(self, inputfilter, irBlocks, block_size, filename=None):
+    With precision 'float16' or 'int16' (16 bit integers with one scale factor per block)
+    the filter is stored with reduced precision and widened to float32 by getFilter().
+    """
 
-        self.IR_left_blocked = np.reshape(
+    def __init__(self, inputfilter, irBlocks, block_size, filename=None, precision='float32'):
+
+        if precision not in FILTER_PRECISIONS:
+            raise RuntimeError("Unknown filter precision: {}".format(precision))
+
+        self.precision = precision
+        self.filename = filename
+        self._digest = None
+
+        IR_left_blocked = np.reshape(
             inputfilter[:, 0], (irBlocks, block_size))
-        self.IR_right_blocked = np.reshape(
+        IR_right_blocked = np.reshape(
             inputfilter[:, 1], (irBlocks, block_size))
-        self.filename = filename
+
+        # Number of partitions up to the last one which is not silent
+        nonzero_blocks = np.flatnonzero(np.any(IR_left_blocked != 0, axis=1) |
+                                        np.any(IR_right_blocked != 0, axis=1))
+        self.active_blocks = int(nonzero_blocks[-1]) + 1 if nonzero_blocks.size else 0
+
+        self.IR_left_blocked, self.scale_left = self.compress(IR_left_blocked)
+        self.IR_right_blocked, self.scale_right = self.compress(IR_right_blocked)
+
+        # Maximum deviation caused by reduced precision, relative to the filter peak
+        self.max_deviation_db = None
+        if self.precision != 'float32':
+            self.max_deviation_db = self.compute_deviation_db(IR_left_blocked, IR_right_blocked)
+
+    def compress(self, IR_blocked):
+        """
+        Convert blocked IR to the storage precision
+
+        :param IR_blocked: float32 array [irBlocks, block_size]
+        :return: (stored IR, scale factors per block or None)
+        """
+        if self.precision == 'float16':
+            return IR_blocked.astype(np.float16), None
+
+        if self.precision == 'int16':
+            peak = np.max(np.abs(IR_blocked), axis=1, keepdims=True)
+            scale = np.where(peak > 0, peak / 32767., 1.).astype(np.float32)
+            return np.round(IR_blocked / scale).astype(np.int16), scale
+
+        return IR_blocked.astype(np.float32, copy=False), None
+
+    def widen(self, IR_blocked, scale):
+        if scale is not None:
+            return IR_blocked * scale
+
+        return IR_blocked.astype(np.float32, copy=False)
+
+    def compute_deviation_db(self, IR_left_blocked, IR_right_blocked):
+        left, right = self.getFilter()
+        peak = max(np.max(np.abs(IR_left_blocked)), np.max(np.abs(IR_right_blocked)))
+        deviation = max(np.max(np.abs(left - IR_left_blocked)),
+                        np.max(np.abs(right - IR_right_blocked)))
+
+        if peak == 0 or deviation == 0:
+            return -np.inf
+
+        return 20 * np.log10(deviation / peak)
+
+    @property
+    def nbytes(self):
+        """ Size of the stored filter data in bytes """
+        return array_bytes(self.IR_left_blocked, self.IR_right_blocked, self.scale_left, self.scale_right)
+
+    @property
+    def digest(self):
+        """ Hash of the stored filter data, computed once """
+        if self._digest is None:
+            content_hash = hashlib.sha1(self.precision.encode('ascii'))
+            for data in (self.IR_left_blocked, self.IR_right_blocked, self.scale_left, self.scale_right):
+                if data is not None:
+                    content_hash.update(np.ascontiguousarray(data).data)
+            self._digest = content_hash.hexdigest()
+
+        return self._digest
 
     def getFilter(self):
-        return self.IR_left_blocked, self.IR_right_blocked
+        return (self.widen(self.IR_left_blocked, self.scale_left),
+                self.widen(self.IR_right_blocked, self.scale_right))
 
 
 class FilterStorage(object):
     """ Class for storing all filters mentioned in the filter list """
 
-    def __init__(self, irSize, block_size, filter_list_name):
+    def __init__(self, irSize, block_size, filter_list_name, converter=None, precision='float32',
+                 trim_threshold=None, deduplicate=False):
 
         self.log = logging.getLogger("pybinsim.FilterStorage")
         self.log.info("FilterStorage: init")
@@ -57,17 +174,32 @@ class FilterStorage(object):
         self.ir_size = irSize
         self.ir_blocks = irSize // block_size
         self.block_size = block_size
+        self.converter = converter
+        self.precision = precision
+        self.trim_threshold = trim_threshold
+        self.deduplicate = deduplicate
         self.default_filter = Filter(
             np.zeros((self.ir_size, 2), dtype='float32'), self.ir_blocks, self.block_size)
 
+        # The filter list is opened again on each reload, so a list replaced by a rename is read as well
         self.filter_list_path = filter_list_name
-        self.filter_list = open(self.filter_list_path, 'r')
 
         self.headphone_filter = None
 
         # format: [key,{filter}]
         self.filter_dict = {}
 
+        # Filters by file path. Poses with the same file share one Filter object.
+        self.path_filters = {}
+
+        # Signatures of the loaded files. On reload, only files with another signature are loaded again.
+        self.file_signatures = {}
+        self.reload_lock = threading.Lock()
+
+        # Incremented after each reload. Sessions sharing this storage compare it to pick up a changed
+        # headphone filter.
+        self.reload_generation = 0
+
         # Start to load filters
         self.load_filters()
 
@@ -85,50 +217,213 @@ class FilterStorage(object):
         :return: Iterator of (Pose, filter-path) tuples
         """
 
-        for line in self.filter_list:
+        with open(self.filter_list_path, 'r') as filter_list:
+            for line in filter_list:
 
-            # comment out lines in the list with a '#'
-            if line.startswith('#') or line == "\n":
-                continue
+                # comment out lines in the list with a '#'
+                if line.startswith('#') or line == "\n":
+                    continue
 
-            line_content = line.split()
-            filter_path = line_content[-1]
+                line_content = line.split()
+                filter_path = line_content[-1]
 
-            if line.startswith('HPFILTER'):
-                self.log.info(
-                    "Loading headphone filter: {}".format(filter_path))
-                self.headphone_filter = Filter(self.load_filter(
-                    filter_path), self.ir_blocks, self.block_size)
-                continue
+                if line.startswith('HPFILTER'):
+                    if self.is_loaded(self.headphone_filter, filter_path):
+                        continue
+                    self.log.info(
+                        "Loading headphone filter: {}".format(filter_path))
+                    self.file_signatures[filter_path] = get_file_signature(filter_path)
+                    self.headphone_filter = Filter(self.load_filter(
+                        filter_path), self.ir_blocks, self.block_size, filename=filter_path)
+                    continue
 
-            filter_value_list = tuple(line_content[0:-1])
+                filter_value_list = tuple(line_content[0:-1])
 
-            pose = Pose.from_filterValueList(filter_value_list)
+                pose = Pose.from_filterValueList(filter_value_list)
 
-            yield pose, filter_path
+                yield pose, filter_path
+
+    def is_loaded(self, current_filter, filter_path):
+        """ Returns True if current_filter was loaded from filter_path and the file is unchanged """
+        return (current_filter is not None and current_filter.filename == filter_path and
+                self.file_signatures.get(filter_path) == get_file_signature(filter_path))
+
+    @staticmethod
+    def is_sofa_file(filter_list_path):
+        return filter_list_path.lower().endswith('.sofa')
 
     def load_filters(self):
         """
         Load filters from files
 
-        :return: None
+        :return: number of loaded files
         """
 
         self.log.info("Start loading filters...")
 
-        for i, (pose, filter_path) in enumerate(self.parse_filter_list()):
-            self.log.debug('Loading {}'.format(filter_path))
+        if self.is_sofa_file(self.filter_list_path):
+            n_loaded = self.load_sofa_filters()
+        else:
+            n_loaded = self.load_filter_list_filters()
+
+        self.log.info("Finished loading filters ({} files).".format(n_loaded))
 
-            loaded_filter = self.load_filter(filter_path)
+        if self.precision != 'float32' and self.filter_dict:
+            max_deviation_db = max(current_filter.max_deviation_db
+                                   for current_filter in self.filter_dict.values())
+            self.log.info("Filters stored as {}: max deviation {:.1f} dB".format(
+                self.precision, max_deviation_db))
+
+        if self.filter_dict:
+            n_unique = len({id(current_filter) for current_filter in self.filter_dict.values()})
+            self.log.info("Filters: {} poses, {} unique filters (dedup ratio {:.2f})".format(
+                len(self.filter_dict), n_unique, len(self.filter_dict) / n_unique))
+
+            active_blocks = [current_filter.active_blocks for current_filter in self.filter_dict.values()]
+            self.log.info("Active partitions per filter: mean {:.1f}, max {} of {}".format(
+                np.mean(active_blocks), max(active_blocks), self.ir_blocks))
+        self.log.info("Memory usage: {}".format(format_memory_usage(self.memory_usage())))
+
+        return n_loaded
+
+    def memory_usage(self):
+        """
+        Returns the bytes used by the time domain filters. Filters used for several poses are counted once.
+
+        :return: dict of byte counts
+        """
+        filters = {id(current_filter): current_filter for current_filter in self.filter_dict.values()}
+
+        return {'filters': sum(current_filter.nbytes for current_filter in filters.values()),
+                'headphone_filter': self.headphone_filter.nbytes if self.headphone_filter else 0,
+                'default_filter': self.default_filter.nbytes}
+
+    def deduplicate_filters(self, filters):
+        """
+        Replace filters with identical content by one shared Filter object
+
+        :param filters: dict of filters, modified in place
+        :return: None
+        """
+        unique_filters = {}
+        for key, current_filter in filters.items():
+            filters[key] = unique_filters.setdefault(current_filter.digest, current_filter)
+
+    def reload_filters(self):
+        """
+        Parse the filter list again and load only new or changed files
+
+        Convolvers use the changed filters from their next filter switch on.
+
+        :return: number of loaded files or None if a reload is already running
+        """
+        if not self.reload_lock.acquire(blocking=False):
+            self.log.warning("Reload of filters already running")
+            return None
+
+        try:
+            n_loaded = self.load_filters()
+            self.reload_generation += 1
+            return n_loaded
+        finally:
+            self.reload_lock.release()
+
+    def load_filter_list_filters(self):
+        """
+        Load filters from the files mentioned in the filter list
+
+        Filters of files which are unchanged since the last call are kept. The new
+        filter dict replaces the old one at once, so get_filter() never sees a
+        partially loaded filter list.
+
+        :return: number of loaded files
+        """
+
+        filter_entries = list(self.parse_filter_list())
+
+        # Filters of unchanged files are reused
+        loaded_filters = {}
+        filter_paths = []
+        for filter_path in {filter_path for _, filter_path in filter_entries}:
+            if (filter_path in self.path_filters and
+                    self.file_signatures.get(filter_path) == get_file_signature(filter_path)):
+                loaded_filters[filter_path] = self.path_filters[filter_path]
+            else:
+                filter_paths.append(filter_path)
+
+        # Files are decoded (and resampled, if necessary) in a worker pool
+        file_signatures = dict(self.file_signatures)
+        with ThreadPoolExecutor(max_workers=nThreads) as executor:
+            for filter_path, loaded_filter in zip(filter_paths, executor.map(self.load_filter, filter_paths)):
+                self.log.debug('Loaded {}'.format(filter_path))
+
+                file_signatures[filter_path] = get_file_signature(filter_path)
+                loaded_filters[filter_path] = Filter(
+                    loaded_filter, self.ir_blocks, self.block_size, filename=filter_path,
+                    precision=self.precision)
+
+        # Different files with the same content share one filter
+        if self.deduplicate:
+            self.deduplicate_filters(loaded_filters)
+
+        # create keys and store in dict.
+        filter_dict = {}
+        for pose, filter_path in filter_entries:
+            filter_dict[pose.create_key()] = loaded_filters[filter_path]
+
+        self.file_signatures = file_signatures
+        self.path_filters = loaded_filters
+        self.filter_dict = filter_dict
+
+        return len(filter_paths)
+
+    def load_sofa_filters(self):
+        """
+        Load all filters of a SOFA file. Poses are created from the positions in the file.
+
+        :return: None
+        """
+        # h5py is only needed for SOFA files
+        from pybinsim.sofa import read_sofa
+
+        signature = get_file_signature(self.filter_list_path)
+        if self.filter_dict and self.file_signatures.get(self.filter_list_path) == signature:
+            return 0
+
+        self.log.info("Reading SOFA file {}".format(self.filter_list_path))
+        irs, fs, poses = read_sofa(self.filter_list_path)
+
+        # [M, 2, N] -> [N, M, 2], so that all filters are resampled at once along the first axis
+        irs = np.transpose(irs, (2, 0, 1))
+        if self.converter is not None and fs != self.converter.fs:
+            self.log.info("Converting SOFA filters from {} Hz to {} Hz".format(fs, self.converter.fs))
+            irs = resample(irs, fs, self.converter.fs)
+
+        if irs.shape[0] != self.ir_size:
+            self.log.warning('SOFA filters have {} samples: fit to filterSize {}'.format(
+                irs.shape[0], self.ir_size))
+
+        filter_dict = {}
+        for m, pose in enumerate(poses):
             current_filter = Filter(
-                loaded_filter, self.ir_blocks, self.block_size, filename=filter_path)
+                self.fit_filter(irs[:, m, :]), self.ir_blocks, self.block_size,
+                filename="{}#{}".format(self.filter_list_path, m), precision=self.precision)
 
-            # create key and store in dict.
             key = pose.create_key()
-            self.filter_dict.update({key: current_filter})
+            filter_dict.update({key: current_filter})
+
+        if len(filter_dict) < len(poses):
+            self.log.warning("SOFA file {}: {} of {} measurements have the pose of another measurement "
+                             "and are not used".format(self.filter_list_path, len(poses) - len(filter_dict),
+                                                       len(poses)))
+
+        if self.deduplicate:
+            self.deduplicate_filters(filter_dict)
 
-        self.log.info("Finished loading filters.")
-        #self.log.info("filter_dict size: {}MiB".format(total_size(self.filter_dict) // 1024 // 1024))
+        self.file_signatures = {self.filter_list_path: signature}
+        self.filter_dict = filter_dict
+
+        return 1
 
     def get_filter(self, pose):
         """
@@ -142,10 +437,10 @@ class FilterStorage(object):
         key = pose.create_key()
 
         if key in self.filter_dict:
-            self.log.info("Filter found: key: {}".format(key))
+            self.log.info("Filter found: key: {}".format(key), extra=RATE_LIMITED)
             result_filter = self.filter_dict.get(key)
             if result_filter.filename is not None:
-                self.log.info("   use file:: {}".format(result_filter.filename))
+                self.log.info("   use file:: {}".format(result_filter.filename), extra=RATE_LIMITED)
             return result_filter
         else:
             self.log.warning('Filter not found: key: {}'.format(key))
@@ -163,17 +458,36 @@ class FilterStorage(object):
 
     def load_filter(self, filter_path):
 
-        current_filter, fs = sf.read(filter_path, dtype='float32')
+        if self.converter is not None:
+            current_filter = self.converter.read(filter_path)
+        else:
+            current_filter, fs = sf.read(filter_path, dtype='float32')
 
         filter_size = np.shape(current_filter)
 
         # Fill filter with zeros if to short
         if filter_size[0] < self.ir_size:
             self.log.warning('Filter too short: Fill up with zeros')
-            current_filter = np.concatenate((current_filter, np.zeros(
-                (self.ir_size - filter_size[0], 2), np.float32)), 0)
         if filter_size[0] > self.ir_size:
             self.log.warning('Filter too long: shorten')
-            current_filter = current_filter[:self.ir_size]
+
+        return self.fit_filter(current_filter)
+
+    def fit_filter(self, current_filter):
+        """
+        Zero pad or shorten filter to ir_size and trim its tail
+
+        :param current_filter: array [samples, 2]
+        :return: float32 array [ir_size, 2]
+        """
+        fitted_filter = np.zeros((self.ir_size, 2), dtype=np.float32)
+        n_samples = min(current_filter.shape[0], self.ir_size)
+        fitted_filter[:n_samples] = current_filter[:n_samples]
+        current_filter = fitted_filter
+
+        # Remove the tail below the noise floor, so it does not count as active partition
+        if self.trim_threshold is not None:
+            cutoff = energy_decay_cutoff(current_filter, self.trim_threshold)
+            current_filter[cutoff:] = 0
 
         return current_filter
@@ -0,0 +1,146 @@
+# This file is part of the pyBinSim project.
+#
+# Copyright (c) 2017 A. Neidhardt, F. Klein, N. Knoop, T. Köllmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+""" Module reads a serial head tracker in the background and updates the filters of pyBinSim directly """
+import logging
+import threading
+
+import serial
+
+from pybinsim.spark_fun import get_float_values, get_intact_reading
+
+
+def parse_angle_line(line):
+    """
+    Parse a complete line of the tracker, "!ANG:roll,pitch,yaw" as read by pybinsim.spark_fun
+
+    :param line: bytes without line break
+    :return: (yaw, pitch, roll) as floats or None if the line is not intact
+    """
+    reading = get_intact_reading([line.decode('ascii', errors='replace')])
+    if reading is None:
+        return None
+
+    values = get_float_values(reading)
+    if len(values) != 3:
+        return None
+
+    roll, pitch, yaw = values
+    return yaw, pitch, roll
+
+
+def quantize(angle, resolution):
+    """ Round angle in degree to the filter grid """
+    return int(round(angle / resolution) * resolution)
+
+
+class HeadTracker(object):
+    """
+    Reads yaw, pitch and roll from a serial head tracker in a background thread and
+    hands the orientation of each source relative to the head to the OscReceiver,
+    i.e. to the same filter update path as /pyBinSim messages.
+    """
+
+    def __init__(self, port, baudrate, osc_receiver, source_azimuths, resolution=1):
+        """
+        :param port: serial port, e.g. '/dev/ttyUSB0' or 'COM4'
+        :param baudrate:
+        :param osc_receiver: OscReceiver which stores the filter values of all channels
+        :param source_azimuths: azimuth of each source in degree, one per channel
+        :param resolution: angular resolution of the filter set in degree
+        """
+
+        self.log = logging.getLogger("pybinsim.HeadTracker")
+        self.log.info("HeadTracker: init")
+
+        self.osc_receiver = osc_receiver
+        self.source_azimuths = source_azimuths
+        self.resolution = resolution
+
+        self.orientations = [None] * len(source_azimuths)
+        self.line_count = 0
+        self.error_count = 0
+        self.running = True
+
+        try:
+            self.ser = serial.Serial(port, baudrate, timeout=0.1)
+        except serial.SerialException as e:
+            raise RuntimeError(e)
+
+        tracker_thread = threading.Thread(target=self.read_tracker)
+        tracker_thread.daemon = True
+        tracker_thread.start()
+
+    def read_tracker(self):
+        """ Frame the serial data into lines and update the filters for each complete reading """
+        pending = bytearray()
+
+        while self.running:
+            try:
+                data = self.ser.read(max(1, self.ser.in_waiting))
+            except serial.SerialException as e:
+                self.log.error("Reading head tracker failed: {}".format(e))
+                break
+
+            pending += data
+
+            # Only the newest intact reading of the received lines is used
+            newest = None
+            line_end = pending.find(b'\n')
+            while line_end >= 0:
+                reading = parse_angle_line(bytes(pending[:line_end]))
+                if reading is not None:
+                    newest = reading
+                    self.line_count += 1
+                else:
+                    self.error_count += 1
+                del pending[:line_end + 1]
+                line_end = pending.find(b'\n')
+
+            if newest is not None:
+                self.update_orientation(*newest)
+
+        self.ser.close()
+
+    def update_orientation(self, yaw, pitch, roll):
+        """
+        Update the filter values of all channels for a new head orientation
+
+        :param yaw: head yaw in degree
+        :param pitch: head pitch in degree
+        :param roll: head roll in degree
+        :return: None
+        """
+        for channel, source_azimuth in enumerate(self.source_azimuths):
+            orientation = (quantize(source_azimuth - yaw, self.resolution) % 360,
+                           quantize(-pitch, self.resolution),
+                           quantize(-roll, self.resolution))
+
+            if orientation != self.orientations[channel]:
+                self.orientations[channel] = orientation
+                self.osc_receiver.set_orientation(channel, orientation)
+
+    def close(self):
+        self.log.info('HeadTracker: close()')
+        self.log.info('Readings: {}, broken lines: {}'.format(self.line_count, self.error_count))
+        self.running = False
@@ -26,37 +26,46 @@ import threading
 from pythonosc import dispatcher
 from pythonosc import osc_server
 
+from pybinsim.asynclog import RATE_LIMITED
+
 
 class OscReceiver(object):
     """
     Class for receiving OSC Messages to control pyBinSim
     """
 
-    def __init__(self):
+    def __init__(self, port=10000, listeners=1):
+        """
+        :param port:
+        :param listeners: number of listeners, each has maxChannels channels
+        """
 
         self.log = logging.getLogger("pybinsim.OscReceiver")
         self.log.info("oscReceiver: init")
 
         # Basic settings
         self.ip = '127.0.0.1'
-        self.port = 10000
+        self.port = port
         self.maxChannels = 100
+        self.listeners = listeners
 
-        # Default values; Stores filter keys for all channles/convolvers
-        self.filters_updated = [True] * self.maxChannels
+        # Default values; Stores filter keys for all channles/convolvers of all listeners.
+        # Channel n of listener l is stored at l * maxChannels + n.
+        self.filters_updated = [True] * self.maxChannels * self.listeners
 
         self.defaultValue = (0, 0, 0, 0, 0, 0, 0, 0, 0)
-        self.valueList = [self.defaultValue] * self.maxChannels
+        self.valueList = [self.defaultValue] * self.maxChannels * self.listeners
         # self.valueList = [()] * self.maxChannels
         self.soundFileList = ''
         self.soundFileNew = False
 
-        osc_dispatcher = dispatcher.Dispatcher()
-        osc_dispatcher.map("/pyBinSim", self.handle_filter_input)
-        osc_dispatcher.map("/pyBinSimFile", self.handle_file_input)
+        self.dispatcher = dispatcher.Dispatcher()
+        self.dispatcher.map("/pyBinSim", self.handle_filter_input)
+        self.dispatcher.map("/pyBinSimFile", self.handle_file_input)
+        self.dispatcher.map("/pyBinSimListener", self.handle_listener_filter_input)
 
         self.server = osc_server.ThreadingOSCUDPServer(
-            (self.ip, self.port), osc_dispatcher)
+            (self.ip, self.port), self.dispatcher)
 
     def handle_filter_input(self, identifier, channel, *args):
         """
@@ -76,8 +85,8 @@ class OscReceiver(object):
         #    args=(args+(0,)*6)[:6]
         #    print("filter value list incomplete")
 
-        self.log.info("Channel: {}".format(str(channel)))
-        self.log.info("Args: {}".format(str(args)))
+        self.log.info("Channel: {}".format(str(channel)), extra=RATE_LIMITED)
+        self.log.info("Args: {}".format(str(args)), extra=RATE_LIMITED)
 
         current_channel = channel
 
@@ -86,7 +95,37 @@ class OscReceiver(object):
             self.filters_updated[current_channel] = True
             self.valueList[current_channel] = tuple(args)
         else:
-            self.log.info("same filter as before")
+            self.log.info("same filter as before", extra=RATE_LIMITED)
+
+    def handle_listener_filter_input(self, identifier, listener, channel, *args):
+        """
+        Handler for tracking information of one of several listeners
+
+        :param identifier:
+        :param listener:
+        :param channel:
+        :param args:
+        :return:
+        """
+        self.handle_filter_input("/pyBinSim", self.get_channel_index(listener, channel), *args)
+
+    def get_channel_index(self, listener, channel):
+        """ Returns index of channel of listener in the filter value list """
+        return listener * self.maxChannels + channel
+
+    def set_orientation(self, channel, orientation):
+        """
+        Replace yaw, pitch and roll of the filter values of channel, e.g. from a head tracker
+
+        :param channel:
+        :param orientation: (yaw, pitch, roll)
+        :return: None
+        """
+        values = tuple(orientation) + tuple(self.valueList[channel][3:])
+
+        if values != self.valueList[channel]:
+            self.valueList[channel] = values
+            self.filters_updated[channel] = True
 
     def handle_file_input(self, identifier, soundpath):
         """ Handler for playlist control"""
@@ -97,6 +136,20 @@ class OscReceiver(object):
         self.log.info("soundPath: {}".format(soundpath))
         self.soundFileList = soundpath
 
+    def add_command(self, address, command):
+        """
+        Call command with the message arguments in the OSC thread when a message for address arrives
+
+        :param address: OSC address, e.g. "/pyBinSimTrace"
+        :param command: callable
+        :return: None
+        """
+        def handle_command(identifier, *args):
+            self.log.info("Command: {} {}".format(identifier, args))
+            command(*args)
+
+        self.dispatcher.map(address, handle_command)
+
     def start_listening(self):
         """Start osc receiver in background Thread"""
 
@@ -0,0 +1,149 @@
+# This file is part of the pyBinSim project.
+#
+# Copyright (c) 2017 A. Neidhardt, F. Klein, N. Knoop, T. Köllmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+""" Module pans sources onto a fixed set of virtual loudspeakers """
+import logging
+
+import numpy as np
+
+from pybinsim.utility import array_bytes
+
+
+def vbap_gains(azimuth, speaker_azimuths):
+    """
+    Horizontal vector base amplitude panning (VBAP) of one source
+
+    The source is panned between the two adjacent speakers enclosing it. Gains are
+    normalized to constant energy.
+
+    :param azimuth: source azimuth in degree
+    :param speaker_azimuths: azimuths of the speakers in degree
+    :return: gain for each speaker as float32 array
+    """
+    speaker_azimuths = np.asarray(speaker_azimuths, dtype=np.float64) % 360
+    gains = np.zeros(len(speaker_azimuths), dtype=np.float32)
+
+    if len(speaker_azimuths) == 1:
+        gains[0] = 1
+        return gains
+
+    azimuth = azimuth % 360
+    order = np.argsort(speaker_azimuths)
+    sorted_azimuths = speaker_azimuths[order]
+
+    # Pair of adjacent speakers enclosing the source, wrapping around at 360 degree
+    upper = np.searchsorted(sorted_azimuths, azimuth) % len(order)
+    lower = upper - 1
+    first, second = order[lower], order[upper]
+
+    base = np.radians([[speaker_azimuths[first], speaker_azimuths[second]]])
+    base = np.vstack([np.cos(base), np.sin(base)])
+    direction = np.radians(azimuth)
+
+    pair_gains = np.linalg.solve(base, [np.cos(direction), np.sin(direction)])
+    pair_gains = np.clip(pair_gains, 0, None)
+    pair_gains /= np.linalg.norm(pair_gains)
+
+    gains[first] += pair_gains[0]
+    gains[second] += pair_gains[1]
+
+    return gains
+
+
+class VirtualSpeakerPanner(object):
+    """
+    Mixes all input channels to the signals of the virtual speakers.
+
+    The azimuth of each source relative to the head sets its panning gains, so head
+    rotation only changes the gains while the BRIRs of the speakers stay fixed.
+    Gain changes are faded linearly over one block.
+    """
+
+    def __init__(self, speaker_azimuths, n_channels, block_size):
+        """
+        :param speaker_azimuths: azimuths of the virtual speakers in degree
+        :param n_channels: number of input channels
+        :param block_size:
+        """
+        self.log = logging.getLogger("pybinsim.VirtualSpeakerPanner")
+        self.log.info("VirtualSpeakerPanner: init")
+
+        # VBAP needs adjacent speakers less than 180 degree apart
+        sorted_azimuths = np.sort(np.asarray(speaker_azimuths, dtype=np.float64) % 360)
+        gaps = np.diff(np.append(sorted_azimuths, sorted_azimuths[0] + 360))
+        if len(speaker_azimuths) > 1 and gaps.max() >= 180:
+            raise RuntimeError("Virtual speakers {} leave a gap of 180 degree or more".format(
+                speaker_azimuths))
+
+        self.speaker_azimuths = speaker_azimuths
+        n_speakers = len(speaker_azimuths)
+
+        self.gains = np.zeros((n_speakers, n_channels), dtype=np.float32)
+        self.gains_previous = np.zeros_like(self.gains)
+        self.gains_changed = False
+
+        self.speaker_signals = np.zeros((n_speakers, block_size), dtype=np.float32)
+        self.fade_scratch = np.zeros_like(self.speaker_signals)
+        # Full size ramp: broadcasting in np.multiply would allocate a buffer per block
+        self.fade_in = np.tile(np.linspace(0, 1, block_size, endpoint=False, dtype=np.float32),
+                               (n_speakers, 1))
+
+    def memory_usage(self):
+        """ Returns the bytes used by gains and speaker signals as dict """
+        return {'buffers': array_bytes(self.gains, self.gains_previous, self.speaker_signals,
+                                       self.fade_scratch, self.fade_in)}
+
+    def set_source_azimuth(self, channel, azimuth):
+        """
+        Pan channel to azimuth relative to the head
+
+        :param channel:
+        :param azimuth: in degree
+        :return: None
+        """
+        self.gains[:, channel] = vbap_gains(azimuth, self.speaker_azimuths)
+        self.gains_changed = True
+
+    def process(self, block, fade=True):
+        """
+        Mix block to the speaker signals
+
+        :param block: input signals, shape [channels, block_size]
+        :param fade: fade from previous to new gains over the block
+        :return: speaker signals, shape [speakers, block_size]
+        """
+        n_channels = block.shape[0]
+
+        if not self.gains_changed or not fade:
+            np.matmul(self.gains[:, :n_channels], block, out=self.speaker_signals)
+        else:
+            np.matmul(self.gains_previous[:, :n_channels], block, out=self.speaker_signals)
+            np.subtract(self.gains, self.gains_previous, out=self.gains_previous)
+            np.matmul(self.gains_previous[:, :n_channels], block, out=self.fade_scratch)
+            np.multiply(self.fade_scratch, self.fade_in, out=self.fade_scratch)
+            np.add(self.speaker_signals, self.fade_scratch, out=self.speaker_signals)
+
+        self.gains_previous[:] = self.gains
+        self.gains_changed = False
+
+        return self.speaker_signals
@@ -0,0 +1,131 @@
+# This file is part of the pyBinSim project.
+#
+# Copyright (c) 2017 A. Neidhardt, F. Klein, N. Knoop, T. Köllmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+""" Module for CPU affinity, real-time scheduling and locking of memory pages """
+
+import ctypes
+import ctypes.util
+import logging
+import os
+
+logger = logging.getLogger("pybinsim.realtime")
+
+# mlock/munlock from the C library, loaded on first use
+_libc = None
+
+
+def parse_cpu_list(value):
+    """
+    Parse a list of CPUs like '2,3' or '0-1,4'
+
+    :param value: comma separated CPU numbers and ranges
+    :return: set of CPU numbers, empty if value is empty
+    """
+    cpus = set()
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        first, _, last = item.partition('-')
+        cpus.update(range(int(first), int(last or first) + 1))
+
+    return cpus
+
+
+def describe_current_thread():
+    """ Returns CPU affinity and scheduling policy of the calling thread as string """
+    if not hasattr(os, 'sched_getaffinity'):
+        return 'affinity and scheduling not supported on this platform'
+
+    cpus = ','.join(str(cpu) for cpu in sorted(os.sched_getaffinity(0)))
+    policy = os.sched_getscheduler(0)
+    if policy in (os.SCHED_FIFO, os.SCHED_RR):
+        name = 'SCHED_FIFO' if policy == os.SCHED_FIFO else 'SCHED_RR'
+        return 'CPUs {}, {} priority {}'.format(cpus, name, os.sched_getparam(0).sched_priority)
+
+    return 'CPUs {}, default scheduling'.format(cpus)
+
+
+def configure_current_thread(name, cpus=None, priority=0):
+    """
+    Pin the calling thread to cpus and request real-time scheduling for it
+
+    Threads started by the calling thread afterwards inherit both settings. Failures,
+    e.g. missing permissions for SCHED_FIFO, are logged and the thread keeps running
+    with its previous settings.
+
+    :param name: name of the thread in the log
+    :param cpus: set of CPU numbers, None or empty to keep the affinity
+    :param priority: SCHED_FIFO priority 1..99, 0 to keep the scheduling policy
+    :return: True if all settings were applied
+    """
+    success = True
+
+    if cpus:
+        try:
+            os.sched_setaffinity(0, cpus)
+        except (AttributeError, OSError, ValueError) as e:
+            logger.warning("{}: cannot set CPU affinity to {}: {}".format(name, sorted(cpus), e))
+            success = False
+
+    if priority > 0:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        except (AttributeError, OSError, ValueError) as e:
+            logger.warning("{}: cannot set SCHED_FIFO priority {}: {} "
+                        "(requires CAP_SYS_NICE or an rtprio limit)".format(name, priority, e))
+            success = False
+
+    logger.info("{}: {}".format(name, describe_current_thread()))
+
+    return success
+
+
+def lock_arrays(arrays):
+    """
+    Lock the memory pages of arrays into RAM, so they are never swapped out
+
+    :param arrays: iterable of numpy arrays, None entries are ignored
+    :return: number of locked bytes
+    :raises OSError: if mlock is not available or fails, e.g. because of RLIMIT_MEMLOCK
+    """
+    global _libc
+    if _libc is None:
+        library = ctypes.util.find_library('c')
+        if library is None:
+            raise OSError("C library not found")
+        _libc = ctypes.CDLL(library, use_errno=True)
+        if not hasattr(_libc, 'mlock'):
+            _libc = None
+            raise OSError("mlock not available on this platform")
+
+    locked = 0
+    for array in arrays:
+        if array is None or array.nbytes == 0:
+            continue
+        if _libc.mlock(ctypes.c_void_p(array.ctypes.data), ctypes.c_size_t(array.nbytes)) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, "mlock failed after {} bytes: {}".format(locked, os.strerror(errno)))
+        locked += array.nbytes
+
+    return locked
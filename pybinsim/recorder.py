@@ -0,0 +1,173 @@
+# This file is part of the pyBinSim project.
+#
+# Copyright (c) 2017 A. Neidhardt, F. Klein, N. Knoop, T. Köllmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+""" Module records the output of pyBinSim without blocking the audio callback """
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import soundfile as sf
+
+from pybinsim.utility import array_bytes
+
+
+class Recorder(object):
+    """
+    Records output blocks, optionally the source inputs, and the poses of all channels.
+
+    Blocks are copied to a preallocated ring buffer, which a writer thread drains to
+    sound files. The audio callback is the only writer of the ring buffer and the writer
+    thread the only reader, each advances only its own counter. If the disk falls
+    behind and the ring buffer is full, blocks are dropped and counted.
+    """
+
+    def __init__(self, file_path, block_size, fs, n_sources=0, capacity=64, output_channels=2):
+        """
+        :param file_path: output file, .wav or .flac. Inputs and poses are written next to it
+                          with the suffixes _inputs and _poses.
+        :param block_size:
+        :param fs: sampling rate
+        :param n_sources: number of recorded source inputs, 0 to record the output only
+        :param capacity: number of blocks in the ring buffer
+        :param output_channels: 2 per listener
+        """
+        self.log = logging.getLogger("pybinsim.Recorder")
+        self.log.info("Recorder: init")
+
+        self.file_path = file_path
+        self.fs = fs
+        self.n_sources = n_sources
+        self.capacity = capacity
+
+        self.outputs = np.zeros((capacity, block_size, output_channels), dtype=np.float32)
+        self.inputs = np.zeros((capacity, block_size, n_sources), dtype=np.float32)
+        self.write_count = 0
+        self.read_count = 0
+
+        # Block index of the audio callback, including dropped blocks
+        self.block_count = 0
+        self.dropped_blocks = 0
+
+        # (block index, channel, filter values), appending to a deque is thread safe
+        self.poses = deque()
+
+        self.running = False
+        self.thread = None
+
+    def get_file_path(self, suffix):
+        """ Returns path of the file for suffix, e.g. 'recording_inputs.wav' for '_inputs' """
+        stem, extension = os.path.splitext(self.file_path)
+        return stem + suffix + extension
+
+    def open_sound_file(self, file_path, channels):
+        # FLAC does not support float samples
+        subtype = 'PCM_24' if file_path.lower().endswith('.flac') else 'FLOAT'
+        return sf.SoundFile(file_path, 'w', samplerate=self.fs, channels=channels, subtype=subtype)
+
+    def memory_usage(self):
+        """ Returns the bytes used by the ring buffer as dict """
+        return {'ring_buffer': array_bytes(self.outputs, self.inputs)}
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.write_files)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def record(self, output, inputs=None):
+        """
+        Copy an output block and the source inputs to the ring buffer, without blocking
+
+        :param output: output block, shape [block_size, output_channels]
+        :param inputs: source inputs, shape [sources, block_size]; missing sources are recorded as silence
+        :return: None
+        """
+        self.block_count += 1
+
+        if self.write_count - self.read_count >= self.capacity:
+            self.dropped_blocks += 1
+            return
+
+        slot = self.write_count % self.capacity
+        self.outputs[slot] = output
+        if self.n_sources > 0:
+            n_inputs = 0
+            if inputs is not None:
+                n_inputs = min(inputs.shape[0], self.n_sources)
+                self.inputs[slot, :, :n_inputs] = inputs[:n_inputs].T
+            self.inputs[slot, :, n_inputs:] = 0
+
+        self.write_count += 1
+
+    def record_pose(self, channel, filter_values):
+        """
+        Log the filter values of a channel, starting with the next recorded block
+
+        :param channel:
+        :param filter_values:
+        :return: None
+        """
+        self.poses.append((self.block_count, channel, filter_values))
+
+    def write_files(self):
+        """ Drain the ring buffer and the poses to the files until stopped """
+        output_file = self.open_sound_file(self.file_path, self.outputs.shape[2])
+        input_file = None
+        if self.n_sources > 0:
+            input_file = self.open_sound_file(self.get_file_path('_inputs'), self.n_sources)
+        pose_file = open(os.path.splitext(self.file_path)[0] + '_poses.txt', 'w')
+
+        try:
+            while self.running or self.read_count < self.write_count:
+                while self.poses:
+                    block, channel, filter_values = self.poses.popleft()
+                    pose_file.write("{} {} {}\n".format(
+                        block, channel, ' '.join(str(value) for value in filter_values)))
+
+                if self.read_count == self.write_count:
+                    time.sleep(0.005)
+                    continue
+
+                slot = self.read_count % self.capacity
+                output_file.write(self.outputs[slot])
+                if input_file is not None:
+                    input_file.write(self.inputs[slot])
+                self.read_count += 1
+        finally:
+            output_file.close()
+            if input_file is not None:
+                input_file.close()
+            pose_file.close()
+
+    def close(self):
+        """ Write the remaining blocks and close the files """
+        self.log.info('Recorder: close()')
+        self.log.info('Recorded blocks: {}, dropped blocks: {}'.format(
+            self.block_count - self.dropped_blocks, self.dropped_blocks))
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,129 @@
+# This file is part of the pyBinSim project.
+#
+# Copyright (c) 2017 A. Neidhardt, F. Klein, N. Knoop, T. Köllmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+""" Module renders audio blocks ahead of time in a background thread """
+import logging
+import threading
+import time
+from timeit import default_timer
+
+import numpy as np
+
+from pybinsim.utility import array_bytes
+
+
+class RenderThread(object):
+    """
+    Renders blocks into a ring buffer ahead of the audio callback.
+
+    The render thread is the only writer and the audio callback the only reader. Each
+    side advances only its own index, so no lock is needed between them. The callback
+    never waits: if no block is ready, it gets silence and an underrun is counted. It
+    does not signal the render thread either, the render thread polls for free slots.
+    """
+
+    def __init__(self, render_block, block_size, lookahead, channels=2, setup_thread=None,
+                 poll_interval=0.0005):
+        """
+        :param render_block: function returning the next block, shape [block_size, channels]
+        :param block_size:
+        :param lookahead: number of blocks rendered ahead, i.e. additional latency in blocks
+        :param channels: number of output channels
+        :param setup_thread: called in the render thread before rendering, e.g. to set its priority
+        :param poll_interval: sleep of the render thread in seconds while the ring buffer is full
+        """
+        self.log = logging.getLogger("pybinsim.RenderThread")
+        self.log.info("RenderThread: init")
+
+        self.render_block = render_block
+        self.setup_thread = setup_thread
+        self.lookahead = lookahead
+        self.poll_interval = poll_interval
+
+        self.ring = np.zeros((lookahead, block_size, channels), dtype=np.float32)
+        self.output = np.zeros((block_size, channels), dtype=np.float32)
+        self.write_count = 0
+        self.read_count = 0
+
+        self.underruns = 0
+        self.running = False
+        self.thread = None
+
+    def memory_usage(self):
+        """ Returns the bytes used by the ring buffer as dict """
+        return {'ring_buffer': array_bytes(self.ring, self.output)}
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.render)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def render(self):
+        """ Keep the ring buffer filled """
+        if self.setup_thread is not None:
+            self.setup_thread()
+
+        while self.running:
+            if self.write_count - self.read_count >= self.lookahead:
+                time.sleep(self.poll_interval)
+                continue
+
+            self.ring[self.write_count % self.lookahead] = self.render_block()
+            self.write_count += 1
+
+    def read_block(self):
+        """
+        Return the oldest rendered block
+
+        :return: block of shape [block_size, channels], valid until the next call
+        """
+        if self.read_count == self.write_count:
+            self.underruns += 1
+            self.output.fill(0)
+        else:
+            # Copy before the slot is released to the render thread
+            self.output[:] = self.ring[self.read_count % self.lookahead]
+            self.read_count += 1
+
+        return self.output
+
+    def wait_filled(self, timeout=1.0):
+        """
+        Wait until the ring buffer is full, so that playback starts without underruns
+
+        :param timeout: in seconds
+        :return: True if the ring buffer is full
+        """
+        deadline = default_timer() + timeout
+        while self.write_count - self.read_count < self.lookahead and default_timer() < deadline:
+            time.sleep(0.001)
+
+        return self.write_count - self.read_count >= self.lookahead
+
+    def stop(self):
+        self.log.info('RenderThread: stop, underruns: {}'.format(self.underruns))
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
@@ -0,0 +1,120 @@
+# This file is part of the pyBinSim project.
+#
+# Copyright (c) 2017 A. Neidhardt, F. Klein, N. Knoop, T. Köllmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+""" Module for reading audio files at the sampling rate of pyBinSim """
+
+import hashlib
+import logging
+import os
+import threading
+from fractions import Fraction
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+
+def resample(data, fs_in, fs_out):
+    """
+    Convert audio data from fs_in to fs_out with a polyphase filter
+
+    :param data: audio data, shape (frames,) or (frames, channels)
+    :param fs_in: sampling rate of data
+    :param fs_out: target sampling rate
+    :return: resampled data as float32
+    """
+    if fs_in == fs_out:
+        return data
+
+    # scipy is slow to import and only needed for conversion
+    from scipy.signal import resample_poly
+
+    ratio = Fraction(int(fs_out), int(fs_in))
+    resampled = resample_poly(data, ratio.numerator, ratio.denominator, axis=0)
+
+    return resampled.astype(np.float32)
+
+
+class SampleRateConverter(object):
+    """
+    Reads audio files and converts them to the target sampling rate if necessary.
+
+    Converted files are stored in an on-disk cache, keyed by path, modification
+    time and target rate, so each file is only converted once.
+    """
+
+    def __init__(self, fs, cache_dir=''):
+
+        self.log = logging.getLogger("pybinsim.SampleRateConverter")
+
+        self.fs = fs
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+
+    def cache_path(self, file_path):
+        """
+        Returns path of the cache entry for file_path or None if caching is disabled
+
+        :param file_path:
+        :return: Path of cache entry
+        """
+        if self.cache_dir is None:
+            return None
+
+        abs_path = os.path.abspath(file_path)
+        mtime = os.stat(abs_path).st_mtime_ns
+        key = "{}|{}|{}".format(abs_path, mtime, self.fs)
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+        return self.cache_dir / "{}_{}.npy".format(digest, self.fs)
+
+    def read(self, file_path):
+        """
+        Read file_path and return its data at the target sampling rate
+
+        :param file_path:
+        :return: float32 array of shape (frames, channels) or (frames,)
+        """
+        info = sf.info(file_path)
+
+        if info.samplerate == self.fs:
+            data, _ = sf.read(file_path, dtype='float32')
+            return data
+
+        cache_file = self.cache_path(file_path)
+        if cache_file is not None and cache_file.exists():
+            self.log.debug("Using cached conversion of {}".format(file_path))
+            return np.load(str(cache_file))
+
+        self.log.info("Converting {} from {} Hz to {} Hz".format(
+            file_path, info.samplerate, self.fs))
+        data, fs = sf.read(file_path, dtype='float32')
+        data = resample(data, fs, self.fs)
+
+        if cache_file is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            # write to temporary file first, so concurrent readers never see partial data
+            tmp_file = cache_file.with_suffix('.tmp{}-{}.npy'.format(
+                os.getpid(), threading.get_ident()))
+            np.save(str(tmp_file), data)
+            os.replace(str(tmp_file), str(cache_file))
+
+        return data
@@ -0,0 +1,224 @@
+# This file is part of the pyBinSim project.
+#
+# Copyright (c) 2017 A. Neidhardt, F. Klein, N. Knoop, T. Köllmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+""" Module contains a server hosting several pyBinSim listener sessions """
+import logging
+import multiprocessing
+import time
+from contextlib import ExitStack
+
+from pybinsim import init_logging
+from pybinsim.application import BinSim, BinSimConfig, get_trim_threshold
+from pybinsim.filterstorage import FilterStorage
+from pybinsim.resampler import SampleRateConverter
+
+# These settings define the content of a FilterStorage and have to be equal for all sessions
+SHARED_SETTINGS = ('filterSize', 'blockSize', 'filterList', 'filterPrecision',
+                   'trimFilters', 'trimThreshold', 'deduplicateFilters', 'samplingRate')
+
+# Interval of the callback load log in seconds
+LOAD_LOG_INTERVAL = 10
+
+
+def wait_for_streams(sessions, names, log):
+    """
+    Wait until the audio streams of all sessions are finished and log their callback load
+
+    The load is the share of the block duration spent in the audio callback, as measured
+    by PortAudio.
+
+    :param sessions: BinSim instances with open streams
+    :param names: name of each session for the log, e.g. its config file
+    :param log: logger
+    :return: None
+    """
+    last_log = time.time()
+    while any(session.stream.is_active() for session in sessions):
+        time.sleep(1)
+
+        if time.time() - last_log >= LOAD_LOG_INTERVAL:
+            last_log = time.time()
+            log.info("Callback load: {}".format(', '.join(
+                "{} {:.1f}%".format(name, session.stream.get_cpu_load() * 100)
+                for name, session in zip(names, sessions))))
+
+
+def run_session(config_file, filter_storage, loglevel):
+    """
+    Run one session in a forked process of the server until its stream is finished
+
+    :param config_file:
+    :param filter_storage: FilterStorage loaded by the server before the fork
+    :param loglevel:
+    :return: None
+    """
+    # The queue listener of the server does not exist in the forked process
+    logging.getLogger("pybinsim").handlers = []
+    log = init_logging(loglevel)
+
+    with BinSim(config_file, filter_storage) as session:
+        session.stream_open()
+        wait_for_streams([session], [config_file], log)
+
+
+class BinSimServer(object):
+    """
+    Hosts several listener sessions
+
+    Each session is a BinSim instance with its own configuration file, i.e. its own
+    OSC port (oscPort), audio device (audioDevice), sound files and poses. All sessions
+    share a single read-only FilterStorage, so memory use does not grow with the
+    number of listeners.
+
+    By default, the sessions run as threads of one process and share its interpreter
+    lock: a pause in one session, e.g. while loading a sound file, can delay the audio
+    callbacks of all others. With processes, each session runs in its own process,
+    forked after the FilterStorage is loaded, so the filter data is still shared
+    (copy-on-write).
+    """
+
+    def __init__(self, config_files, processes=False):
+        """
+        :param config_files: one configuration file per session
+        :param processes: run each session in a forked process
+        """
+
+        self.log = logging.getLogger("pybinsim.BinSimServer")
+        self.log.info("BinSimServer: init")
+
+        if not config_files:
+            raise RuntimeError("BinSimServer needs at least one session config")
+
+        configs = []
+        for config_file in config_files:
+            config = BinSimConfig()
+            config.read_from_file(config_file)
+            configs.append(config)
+
+        self.check_configs(configs, config_files)
+
+        if processes and 'fork' not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("Session processes need the fork start method, which is not available here")
+
+        config = configs[0]
+        converter = SampleRateConverter(config.get('samplingRate'),
+                                        config.get('resampleCacheDir'))
+        self.filterStorage = FilterStorage(config.get('filterSize'),
+                                           config.get('blockSize'),
+                                           config.get('filterList'),
+                                           converter,
+                                           config.get('filterPrecision'),
+                                           get_trim_threshold(config),
+                                           config.get('deduplicateFilters'))
+
+        self.config_files = config_files
+        self.processes = processes
+        self.session_processes = []
+
+        # Sessions are closed in reverse order by the exit stack. Session processes create
+        # their BinSim after the fork, in stream_start().
+        self.exit_stack = ExitStack()
+        self.sessions = []
+        if not processes:
+            for config_file in config_files:
+                self.log.info("Creating session for {}".format(config_file))
+                self.sessions.append(self.exit_stack.enter_context(
+                    BinSim(config_file, self.filterStorage)))
+
+    @staticmethod
+    def check_configs(configs, config_files):
+        """
+        Make sure that all sessions can share one FilterStorage and use distinct OSC ports
+
+        :param configs: list of BinSimConfig
+        :param config_files: list of config file names, used for error messages
+        :return: None
+        """
+        reference = configs[0]
+
+        for config, config_file in zip(configs[1:], config_files[1:]):
+            for setting in SHARED_SETTINGS:
+                if config.get(setting) != reference.get(setting):
+                    raise RuntimeError("Setting {} of {} differs from {}: {} != {}".format(
+                        setting, config_file, config_files[0], config.get(setting),
+                        reference.get(setting)))
+
+        osc_ports = [config.get('oscPort') for config in configs]
+        if len(set(osc_ports)) != len(osc_ports):
+            raise RuntimeError("Sessions need distinct oscPort values: {}".format(osc_ports))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def stream_start(self):
+        """
+        Start the audio streams of all sessions and wait until all of them are finished
+
+        The callback load of each session is logged every LOAD_LOG_INTERVAL seconds.
+
+        :return: None
+        """
+        if self.processes:
+            self.start_session_processes()
+            for process in self.session_processes:
+                process.join()
+                if process.exitcode != 0:
+                    self.log.error("{} exited with code {}".format(process.name, process.exitcode))
+            return
+
+        for session in self.sessions:
+            session.stream_open()
+
+        wait_for_streams(self.sessions, self.config_files, self.log)
+
+    def start_session_processes(self):
+        """
+        Fork one process per session
+
+        :return: None
+        """
+        context = multiprocessing.get_context('fork')
+        loglevel = logging.getLogger("pybinsim").getEffectiveLevel()
+
+        for config_file in self.config_files:
+            self.log.info("Starting session process for {}".format(config_file))
+            process = context.Process(target=run_session, args=(config_file, self.filterStorage, loglevel),
+                                      name="pybinsim session {}".format(config_file))
+            process.daemon = True
+            process.start()
+            self.session_processes.append(process)
+
+    def close(self):
+        self.log.info("BinSimServer: close")
+
+        for process in self.session_processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        self.session_processes = []
+
+        self.exit_stack.close()
+        self.filterStorage.close()
@@ -0,0 +1,155 @@
+# This file is part of the pyBinSim project.
+#
+# Copyright (c) 2017 A. Neidhardt, F. Klein, N. Knoop, T. Köllmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+""" Module for reading filters from SOFA (HDF5) files """
+
+import h5py
+import numpy as np
+
+from pybinsim.pose import Custom, Orientation, Pose, Position
+
+
+def read_attribute(variable, name, default):
+    """ Read string attribute of a SOFA variable """
+    value = variable.attrs.get(name, default)
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+
+    return str(value).lower()
+
+
+def to_spherical(values):
+    """
+    Convert cartesian coordinates to azimuth and elevation in degree and radius
+
+    :param values: array [M, 3] of x, y, z
+    :return: array [M, 3] of azimuth, elevation, radius
+    """
+    x, y, z = values[:, 0], values[:, 1], values[:, 2]
+    azimuth = np.degrees(np.arctan2(y, x))
+    elevation = np.degrees(np.arctan2(z, np.hypot(x, y)))
+    radius = np.sqrt(x ** 2 + y ** 2 + z ** 2)
+
+    return np.stack((azimuth, elevation, radius), axis=1)
+
+
+def to_cartesian(values):
+    """
+    Convert azimuth and elevation in degree and radius to cartesian coordinates
+
+    :param values: array [M, 3] of azimuth, elevation, radius
+    :return: array [M, 3] of x, y, z
+    """
+    azimuth, elevation, radius = np.radians(values[:, 0]), np.radians(values[:, 1]), values[:, 2]
+    x = radius * np.cos(elevation) * np.cos(azimuth)
+    y = radius * np.cos(elevation) * np.sin(azimuth)
+    z = radius * np.sin(elevation)
+
+    return np.stack((x, y, z), axis=1)
+
+
+def read_coordinates(sofa_file, name, n_measurements, coordinate_type):
+    """
+    Read a position variable of a SOFA file
+
+    :param sofa_file: open h5py file
+    :param name: variable name, e.g. 'SourcePosition'
+    :param n_measurements: number of measurements M
+    :param coordinate_type: 'spherical' or 'cartesian', type of the result
+    :return: array [M, 3], zeros if the variable does not exist
+    """
+    if name not in sofa_file:
+        return np.zeros((n_measurements, 3))
+
+    variable = sofa_file[name]
+    values = np.asarray(variable[()], dtype=np.float64).reshape(-1, 3)
+    values = np.broadcast_to(values, (n_measurements, 3))
+
+    stored_type = read_attribute(variable, 'Type', 'cartesian')
+    if stored_type == coordinate_type:
+        return values
+    if coordinate_type == 'spherical':
+        return to_spherical(values)
+
+    return to_cartesian(values)
+
+
+def create_poses(source_position, listener_view, listener_position):
+    """
+    Map SOFA positions onto poses
+
+    Orientation (yaw, pitch) is the listener view if it differs between measurements
+    (e.g. BRIRs measured for several head orientations). Otherwise it is the source
+    direction (e.g. HRIR sets). If both differ (e.g. BRIRs of several sources), the
+    source direction is given by the custom values (azimuth, elevation, 0). Angles are
+    rounded to degrees, listener positions are given in cm, so the poses match the
+    integer values of OSC messages.
+
+    :param source_position: array [M, 3] of azimuth, elevation, radius
+    :param listener_view: array [M, 3] of azimuth, elevation, radius
+    :param listener_position: array [M, 3] of x, y, z in m
+    :return: list of M poses
+    """
+    source_angles = np.round(source_position[:, :2]).astype(int)
+    source_angles[:, 0] %= 360
+    view_angles = np.round(listener_view[:, :2]).astype(int)
+    view_angles[:, 0] %= 360
+
+    views_differ = np.any(np.ptp(view_angles, axis=0) > 0)
+    sources_differ = np.any(np.ptp(source_angles, axis=0) > 0)
+
+    angles = view_angles if views_differ else source_angles
+    if views_differ and sources_differ:
+        custom = np.column_stack((source_angles, np.zeros(len(source_angles), dtype=int)))
+    else:
+        custom = np.zeros((len(angles), 3), dtype=int)
+    position = np.round(listener_position * 100).astype(int)
+
+    return [Pose(Orientation(int(angles[m, 0]), int(angles[m, 1]), 0),
+                 Position(int(position[m, 0]), int(position[m, 1]), int(position[m, 2])),
+                 Custom(int(custom[m, 0]), int(custom[m, 1]), int(custom[m, 2])))
+            for m in range(len(angles))]
+
+
+def read_sofa(file_path):
+    """
+    Read all impulse responses of a SOFA file with one contiguous read
+
+    :param file_path:
+    :return: (impulse responses [M, 2, N] as float32, sampling rate, list of M poses)
+    """
+    with h5py.File(file_path, 'r') as sofa_file:
+        irs = np.asarray(sofa_file['Data.IR'][()], dtype=np.float32)
+        fs = int(np.ravel(sofa_file['Data.SamplingRate'][()])[0])
+
+        n_measurements = irs.shape[0]
+        source_position = read_coordinates(sofa_file, 'SourcePosition', n_measurements, 'spherical')
+        listener_view = read_coordinates(sofa_file, 'ListenerView', n_measurements, 'spherical')
+        listener_position = read_coordinates(sofa_file, 'ListenerPosition', n_measurements, 'cartesian')
+
+    if irs.shape[1] != 2:
+        raise RuntimeError("SOFA file {} has {} receivers, expected 2".format(file_path, irs.shape[1]))
+
+    poses = create_poses(source_position, listener_view, listener_position)
+
+    return irs, fs, poses
@@ -21,26 +21,31 @@
 # SOFTWARE.
 
 import logging
+import socket
 import threading
 import time
 
 import numpy as np
 import soundfile as sf
 
+from pybinsim.utility import array_bytes
+
 
 class SoundHandler(object):
     """ Class to read audio from files and serve it to pyBinSim """
 
-    def __init__(self, block_size, n_channels, fs, loopSound):
+    def __init__(self, block_size, n_channels, fs, loopSound, converter=None):
 
         self.log = logging.getLogger("pybinsim.SoundHandler")
 
         self.fs = fs
+        self.converter = converter
         self.n_channels = n_channels
         self.chunk_size = block_size
         self.bufferSize = block_size * 2
+        # buffer[0] is served to pyBinSim, buffer[1] holds the next block
         self.buffer = np.zeros(
-            [self.n_channels, self.bufferSize], dtype=np.float32)
+            [2, self.n_channels, self.chunk_size], dtype=np.float32)
         self.sound = np.empty((0, 0))
         self.sound_file = np.empty((0, 0))
         self.frame_count = 0
@@ -52,19 +57,22 @@ class SoundHandler(object):
         self.currentSoundFile = 1
         self.soundFileList = []
 
+        # Called by the reader thread with the channel count of a new file, before the file is served
+        self.channels_callback = None
+
         self._run_file_reader()
 
+    def buffer_shift(self):
+        self.buffer[0, :self.active_channels] = self.buffer[1, :self.active_channels]
+
     def buffer_add_silence(self):
-        self.buffer[:self.active_channels, :-
-                    self.chunk_size] = self.buffer[:self.active_channels, self.chunk_size:]
-        self.buffer[:self.active_channels, -self.chunk_size:] = np.zeros([self.active_channels, self.chunk_size],
-                                                                         dtype=np.float32)
+        self.buffer_shift()
+        self.buffer[1, :self.active_channels] = 0
 
     def buffer_add_sound(self):
         if (self.frame_count + 1) * self.chunk_size < self.sound.shape[1]:
-            self.buffer[:self.active_channels, :-
-                        self.chunk_size] = self.buffer[:self.active_channels, self.chunk_size:]
-            self.buffer[:self.active_channels, -self.chunk_size:] = self.sound[
+            self.buffer_shift()
+            self.buffer[1, :self.active_channels] = self.sound[
                 :self.active_channels,
                 self.frame_count * self.chunk_size: (
                     self.frame_count + 1) * self.chunk_size
@@ -80,8 +88,7 @@ class SoundHandler(object):
             self.buffer_add_silence()
 
     def buffer_flush(self):
-        self.buffer = np.zeros(
-            [self.n_channels, self.bufferSize], dtype=np.float32)
+        self.buffer.fill(0)
 
     def buffer_read(self):
         if self.new_sound_file_loaded:
@@ -90,9 +97,8 @@ class SoundHandler(object):
             self.frame_count = 0
             self.new_sound_file_loaded = False
 
-        buffer_content = self.buffer[:self.active_channels, :-self.chunk_size]
         self.buffer_add_sound()
-        return buffer_content
+        return self.buffer[0, :self.active_channels]
 
     def _run_file_reader(self):
         file_read_thread = threading.Thread(target=self.read_sound_file)
@@ -104,8 +110,11 @@ class SoundHandler(object):
         while True:
             if self.new_sound_file_request:
                 self.log.info('Loading new sound file')
-                audio_file_data, fs = sf.read(self.soundPath, dtype='float32', )
-                assert fs == self.fs
+                if self.converter is not None:
+                    audio_file_data = self.converter.read(self.soundPath)
+                else:
+                    audio_file_data, fs = sf.read(self.soundPath, dtype='float32', )
+                    assert fs == self.fs
 
                 self.log.debug("audio_file_data: {} MB".format(
                     audio_file_data.nbytes // 1024 // 1024))
@@ -117,8 +126,6 @@ class SoundHandler(object):
                 if self.sound_file.shape[0] > self.sound_file.shape[1]:
                     self.sound_file = self.sound_file.transpose()
 
-                self.active_channels = self.sound_file.shape[0]
-
                 if self.sound_file.shape[1] % self.chunk_size != 0:
                     length_diff = self.chunk_size - \
                         (self.sound_file.shape[1] % self.chunk_size)
@@ -141,6 +148,10 @@ class SoundHandler(object):
                     self.log.debug(
                         "Soundfile shape after concat: {} ({})".format(self.sound_file.shape, self.sound_file.dtype))
                     self.log.info('Loaded new sound file\n')
+
+                if self.channels_callback is not None:
+                    self.channels_callback(self.sound_file.shape[0])
+                self.active_channels = self.sound_file.shape[0]
                 self.new_sound_file_request = False
                 self.new_sound_file_loaded = True
             time.sleep(0.05)
@@ -161,3 +172,172 @@ class SoundHandler(object):
 
     def get_sound_channels(self):
         return self.active_channels
+
+    def memory_usage(self):
+        """
+        Returns the bytes used by the output buffer and the loaded sound files
+
+        :return: dict of byte counts
+        """
+        sound_files = array_bytes(self.sound)
+        if self.sound_file is not self.sound:
+            sound_files += array_bytes(self.sound_file)
+
+        return {'buffer': array_bytes(self.buffer), 'sound_files': sound_files}
+
+    def close(self):
+        self.log.info('SoundHandler: close()')
+
+
+class LiveInputHandler(object):
+    """
+    Class to serve live audio input to pyBinSim
+
+    Samples are float32, interleaved with n_channels channels. They are either pushed
+    by the audio callback of a full-duplex stream (source '') or received from a named
+    pipe (source is a path) or a UDP socket (source 'udp:<port>') in a background thread.
+    Samples are collected in a FIFO of fifo_size frames, which is read block by block.
+    If the FIFO overflows, the oldest samples are dropped, so the latency stays bounded.
+    """
+
+    def __init__(self, block_size, n_channels, source='', fifo_size=None):
+        """
+        :param block_size:
+        :param n_channels:
+        :param source: '' for pushed input, path of a named pipe or 'udp:<port>'
+        :param fifo_size: in frames, defaults to block_size (only the newest block is kept)
+        """
+
+        self.log = logging.getLogger("pybinsim.LiveInputHandler")
+
+        self.chunk_size = block_size
+        self.n_channels = n_channels
+        self.active_channels = n_channels
+        self.source = source
+
+        # block handed to the convolvers and ring buffer of the received frames
+        self.block = np.zeros([self.n_channels, self.chunk_size], dtype=np.float32)
+        self.fifo_size = max(fifo_size or self.chunk_size, self.chunk_size)
+        self.pending = np.zeros([self.fifo_size, self.n_channels], dtype=np.float32)
+        self.pending_position = 0
+        self.pending_frames = 0
+        self.lock = threading.Lock()
+
+        self.underruns = 0
+        self.overruns = 0
+        self.running = True
+
+        if self.source:
+            self._run_input_reader()
+
+    def push_input(self, in_data, channels=None):
+        """
+        Append interleaved float32 samples to the FIFO
+
+        :param in_data: bytes-like object with any number of frames of channels samples
+        :param channels: number of interleaved channels, defaults to n_channels. Only the
+                         first n_channels are used.
+        :return: None
+        """
+        channels = channels or self.n_channels
+        samples = np.frombuffer(in_data, dtype=np.float32)
+        frames = samples.size // channels
+        samples = samples[:frames * channels].reshape(frames, channels)[:, :self.n_channels]
+
+        # More frames than fit into the FIFO: only the newest are kept
+        if frames > self.fifo_size:
+            samples = samples[frames - self.fifo_size:]
+            frames = self.fifo_size
+
+        with self.lock:
+            overflow = self.pending_frames + frames - self.fifo_size
+            if overflow > 0:
+                self.overruns += 1
+                self.pending_position = (self.pending_position + overflow) % self.fifo_size
+                self.pending_frames -= overflow
+
+            # write in up to two segments of the ring buffer
+            start = (self.pending_position + self.pending_frames) % self.fifo_size
+            first = min(frames, self.fifo_size - start)
+            self.pending[start:start + first] = samples[:first]
+            self.pending[:frames - first] = samples[first:]
+            self.pending_frames += frames
+
+    def buffer_read(self):
+        with self.lock:
+            if self.pending_frames >= self.chunk_size:
+                # read in up to two segments of the ring buffer
+                start = self.pending_position
+                first = min(self.chunk_size, self.fifo_size - start)
+                self.block[:, :first] = self.pending[start:start + first].T
+                self.block[:, first:] = self.pending[:self.chunk_size - first].T
+                self.pending_position = (start + self.chunk_size) % self.fifo_size
+                self.pending_frames -= self.chunk_size
+            else:
+                self.block.fill(0)
+                self.underruns += 1
+
+        return self.block
+
+    def _run_input_reader(self):
+        if self.source.startswith('udp:'):
+            target = self.read_socket
+        else:
+            target = self.read_pipe
+
+        input_read_thread = threading.Thread(target=target)
+        input_read_thread.daemon = True
+        input_read_thread.start()
+
+    def read_pipe(self):
+        block_bytes = self.chunk_size * self.n_channels * 4
+        staging = bytearray(block_bytes)
+        view = memoryview(staging)
+
+        while self.running:
+            self.log.info('Waiting for writer on {}'.format(self.source))
+            with open(self.source, 'rb', buffering=0) as pipe:
+                received = 0
+                while self.running:
+                    count = pipe.readinto(view[received:])
+                    if not count:
+                        # writer closed the pipe
+                        break
+                    received += count
+                    if received == block_bytes:
+                        self.push_input(staging)
+                        received = 0
+
+    def read_socket(self):
+        block_bytes = self.chunk_size * self.n_channels * 4
+        staging = bytearray(block_bytes)
+
+        port = int(self.source[len('udp:'):])
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', port))
+        sock.settimeout(0.5)
+        self.log.info('Receiving live input on udp port {}'.format(port))
+
+        while self.running:
+            try:
+                count = sock.recv_into(staging)
+            except socket.timeout:
+                continue
+            self.push_input(memoryview(staging)[:count])
+
+        sock.close()
+
+    def request_new_sound_file(self, sound_file_list):
+        self.log.warning('Live input active: ignoring sound file {}'.format(sound_file_list))
+
+    def get_sound_channels(self):
+        return self.active_channels
+
+    def memory_usage(self):
+        """ Returns the bytes used by the input buffers as dict """
+        return {'buffer': array_bytes(self.block, self.pending)}
+
+    def close(self):
+        self.log.info('LiveInputHandler: close()')
+        self.log.info('Underruns: {}, overruns: {}'.format(self.underruns, self.overruns))
+        self.running = False
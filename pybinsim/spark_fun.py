@@ -30,6 +30,24 @@ import re
 
 import serial
 
+DIGIT_REGEX = r"(([-]?\d*\.\d+)|[-]?\d+)?"
+
+# Compiled reading regexes per prefix
+_reading_regexes = {}
+
+
+def get_reading_regex(prefix):
+    """
+    Return compiled regex for sensor readings with prefix
+    :param prefix: Prefix of sensor reading, e.g. "!ANG:"
+    :return: compiled regex
+    """
+    if prefix not in _reading_regexes:
+        _reading_regexes[prefix] = re.compile(r"{}{},{},{}".format(
+            re.escape(prefix), DIGIT_REGEX, DIGIT_REGEX, DIGIT_REGEX))
+
+    return _reading_regexes[prefix]
+
 
 def get_intact_reading(sensor_reading, prefix='!ANG:'):
     """
@@ -38,13 +56,11 @@ def get_intact_reading(sensor_reading, prefix='!ANG:'):
     :param prefix: Prefix of sensor reading, e.g. "!ANG"
     :return: CSV string without prefix. None if parsing failed.
     """
-    digit_regex = r"(([-]?\d*\.\d+)|[-]?\d+)?"
-    reading_regex = r"{}{},{},{}".format(
-        prefix, digit_regex, digit_regex, digit_regex)
+    reading_regex = get_reading_regex(prefix)
 
     for item in reversed(sensor_reading):
         item = item.strip()
-        if re.match(reading_regex, item):
+        if reading_regex.match(item):
             return item[len(prefix):]
     return None
 
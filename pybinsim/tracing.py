@@ -0,0 +1,147 @@
+# This file is part of the pyBinSim project.
+#
+# Copyright (c) 2017 A. Neidhardt, F. Klein, N. Knoop, T. Köllmer
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+""" Module for tracing the processing stages of the audio callback """
+import json
+import logging
+import os
+from timeit import default_timer
+
+import numpy as np
+
+# Stages which are traced; the index is stored in the ring buffer
+STAGES = ('block', 'buffer_read', 'get_filter', 'transform_filter', 'fft', 'mac', 'ifft', 'headphone')
+BLOCK, BUFFER_READ, GET_FILTER, TRANSFORM_FILTER, FFT, MAC, IFFT, HEADPHONE = range(len(STAGES))
+
+# Source of stages that are not specific to one source
+NO_SOURCE = -1
+
+
+class Tracer(object):
+    """
+    Records begin and end timestamps of processing stages into a preallocated ring buffer.
+
+    With capacity 0 tracing is disabled and begin()/end() return immediately.
+    The recorded events can be exported in the Chrome trace format (chrome://tracing, Perfetto).
+    """
+
+    def __init__(self, capacity=0):
+
+        self.log = logging.getLogger("pybinsim.Tracer")
+
+        self.capacity = capacity
+        self.enabled = capacity > 0
+
+        self.stages = np.zeros(capacity, dtype=np.int16)
+        self.sources = np.zeros(capacity, dtype=np.int16)
+        self.begin_times = np.zeros(capacity, dtype=np.float64)
+        self.end_times = np.zeros(capacity, dtype=np.float64)
+        self.count = 0
+
+        self.start_time = default_timer()
+
+    def begin(self, stage_id, source=NO_SOURCE):
+        """
+        Record the begin of a stage
+
+        :param stage_id: index in STAGES
+        :param source: index of the source or NO_SOURCE
+        :return: slot which has to be passed to end(), -1 if tracing is disabled
+        """
+        if not self.enabled:
+            return -1
+
+        slot = self.count % self.capacity
+        self.stages[slot] = stage_id
+        self.sources[slot] = source
+        self.end_times[slot] = np.nan
+        self.begin_times[slot] = default_timer()
+        self.count += 1
+
+        return slot
+
+    def end(self, slot):
+        """
+        Record the end of a stage
+
+        :param slot: return value of begin()
+        :return: None
+        """
+        if slot >= 0:
+            self.end_times[slot] = default_timer()
+
+    def get_events(self):
+        """
+        Returns recorded events in the Chrome trace format, oldest first.
+        Events which have not ended yet are skipped.
+
+        :return: list of dicts
+        """
+        n_events = min(self.count, self.capacity)
+        first = self.count - n_events
+        pid = os.getpid()
+
+        events = []
+        for n in range(first, first + n_events):
+            slot = n % self.capacity
+            if np.isnan(self.end_times[slot]):
+                continue
+
+            source = int(self.sources[slot])
+            events.append({'name': STAGES[self.stages[slot]],
+                           'cat': 'pybinsim',
+                           'ph': 'X',
+                           'ts': (self.begin_times[slot] - self.start_time) * 1e6,
+                           'dur': (self.end_times[slot] - self.begin_times[slot]) * 1e6,
+                           'pid': pid,
+                           'tid': source + 1,
+                           'args': {'source': source}})
+
+        return events
+
+    def export_chrome_trace(self, filepath):
+        """
+        Write recorded events to a Chrome trace JSON file
+
+        :param filepath:
+        :return: None
+        """
+        if not self.enabled:
+            self.log.warning("Tracing is disabled, nothing to export")
+            return
+
+        events = self.get_events()
+        # Name the tracks: tid 0 for the whole block, tid n + 1 for source n
+        thread_names = sorted({event['tid'] for event in events})
+        metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid,
+                     'args': {'name': 'source {}'.format(tid - 1) if tid > 0 else 'block'}}
+                    for tid in thread_names]
+
+        with open(filepath, 'w') as trace_file:
+            json.dump({'traceEvents': metadata + events, 'displayTimeUnit': 'ms'}, trace_file)
+
+        self.log.info("Exported {} trace events to {}".format(len(events), filepath))
+
+
+# Used by default, if no tracer is configured
+disabled_tracer = Tracer()
@@ -171,3 +171,37 @@ def total_size(o, handlers={}, verbose=False):
         return s
 
     return sizeof(o)
+
+
+def array_bytes(*arrays):
+    """ Returns the summed size of the data of numpy arrays, None entries are skipped """
+    return sum(array.nbytes for array in arrays if array is not None)
+
+
+def add_memory_usage(total, usage):
+    """ Add the byte counts of the memory usage dict usage to total, key by key """
+    for key, value in usage.items():
+        if isinstance(value, dict):
+            add_memory_usage(total.setdefault(key, {}), value)
+        else:
+            total[key] = total.get(key, 0) + value
+
+    return total
+
+
+def format_memory_usage(usage, prefix=''):
+    """
+    Format a (nested) memory usage dict as one line, e.g. 'filters: 12.0 MiB, fdl: 1.5 MiB'
+
+    :param usage: dict of byte counts or further dicts
+    :param prefix: prepended to the keys of nested dicts
+    :return: string
+    """
+    entries = []
+    for key, value in usage.items():
+        if isinstance(value, dict):
+            entries.append(format_memory_usage(value, prefix + key + '.'))
+        else:
+            entries.append("{}{}: {:.1f} MiB".format(prefix, key, value / 1024. / 1024.))
+
+    return ', '.join(entry for entry in entries if entry)
@@ -32,6 +32,7 @@ setup(
     cmdclass={'test': PyTest},
     install_requires=[
         "future == 0.16.0",
+        "h5py == 2.7.1",
         "numpy == 1.12.1",
         "ovr == 1.10.101",
         "pyaudio == 0.2.10",
@@ -39,6 +40,7 @@ setup(
         "pyserial == 3.2.1",
         "pytest == 3.0.5",
         "python-osc == 1.6.3",
+        "scipy == 0.19.1",
         "six == 1.10.0",
         "Soundfile == 0.9.0",
     ],
@@ -46,7 +48,12 @@ setup(
     description='Real-time dynamic binaural synthesis with head tracking.',
     long_description=open('README.rst').read(),
     packages=['pybinsim'],
+    entry_points={
+        'console_scripts': ['pybinsim-autotune = pybinsim.autotune:main',
+                            'pybinsim-batch = pybinsim.batch:main'],
+    },
     include_package_data=True,
+    python_requires='>=3.4',
     platforms='any',
     data_files=[],
     classifiers=[
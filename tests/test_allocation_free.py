@@ -0,0 +1,180 @@
+import gc
+import logging
+import tracemalloc
+from unittest import TestCase
+
+import numpy as np
+
+from pybinsim.application import BinSim, BinSimConfig
+from pybinsim.convolver import ConvolverFFTW
+from pybinsim.filterstorage import Filter
+from pybinsim.soundhandler import SoundHandler
+from pybinsim.tracing import Tracer
+
+BLOCK_SIZE = 2048
+FILTER_SIZE = 8192
+N_CHANNELS = 2
+
+
+class NoOscInput(object):
+    """ Stands in for the OscReceiver: no new sound files, no filter updates """
+
+    def get_sound_file_list(self):
+        return ''
+
+    def is_filter_update_necessary(self, channel):
+        return False
+
+
+class MovingOscInput(NoOscInput):
+    """ Stands in for the OscReceiver: every block has a new pose on every channel """
+
+    def __init__(self):
+        self.values = [[0, 0, 0, 0, 0, 0], [90, 0, 0, 0, 0, 0]]
+        self.blocks = 0
+
+    def get_sound_file_list(self):
+        # called once per block
+        self.blocks += 1
+        return ''
+
+    def is_filter_update_necessary(self, channel):
+        return True
+
+    def get_current_values(self, channel):
+        return self.values[self.blocks % 2]
+
+
+class TwoFilterStorage(object):
+    """ Stands in for the FilterStorage: one filter per yaw and a headphone filter """
+
+    def __init__(self, filters, headphone_filter):
+        self.filters = filters
+        self.headphone_filter = headphone_filter
+        self.reload_generation = 0
+
+    def get_filter(self, pose):
+        return self.filters[pose.orientation.yaw == 90]
+
+    def get_headphone_filter(self):
+        return self.headphone_filter
+
+
+def measure_allocations(process, n_warmup=500, n_blocks=100):
+    """
+    Return (net bytes, peak bytes) allocated while processing n_blocks blocks
+
+    The warm up runs traced as well, so that numpy's internal caches for small
+    allocations are filled before the measurement starts. After the traces are
+    cleared, a few more blocks run before the start is taken: objects that are
+    replaced per block were allocated before the clear and their release is not
+    seen by tracemalloc.
+    """
+    # objects of earlier tests must not be freed during the measurement
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for _ in range(n_warmup):
+            process()
+
+        # also resets the peak, tracemalloc.reset_peak needs Python 3.9
+        tracemalloc.clear_traces()
+        for _ in range(10):
+            process()
+        start = tracemalloc.get_traced_memory()[0]
+        for _ in range(n_blocks):
+            process()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return current - start, peak - start
+
+
+class TestAllocationFree(TestCase):
+    def setUp(self):
+        filter_data = np.random.randn(FILTER_SIZE, 2).astype(np.float32) * 0.01
+        self.filter = Filter(filter_data, FILTER_SIZE // BLOCK_SIZE, BLOCK_SIZE)
+        other_filter_data = np.random.randn(FILTER_SIZE, 2).astype(np.float32) * 0.01
+        self.other_filter = Filter(other_filter_data, FILTER_SIZE // BLOCK_SIZE, BLOCK_SIZE)
+        headphone_filter_data = np.random.randn(FILTER_SIZE, 2).astype(np.float32) * 0.01
+        self.headphone_filter = Filter(headphone_filter_data, FILTER_SIZE // BLOCK_SIZE, BLOCK_SIZE)
+
+    def create_binsim(self):
+        binsim = BinSim.__new__(BinSim)
+        binsim.log = logging.getLogger("pybinsim.BinSim")
+        binsim.config = BinSimConfig()
+        binsim.config.configurationDict.update({'blockSize': BLOCK_SIZE,
+                                                'filterSize': FILTER_SIZE,
+                                                'maxChannels': N_CHANNELS})
+        binsim.block = np.zeros([N_CHANNELS, BLOCK_SIZE], dtype=np.float32)
+        binsim.result = np.zeros([BLOCK_SIZE, 2], dtype=np.float32)
+        binsim.oscReceiver = NoOscInput()
+        binsim.tracer = Tracer()
+        binsim.panner = None
+        binsim.recorder = None
+        binsim.listenerConvolvers = []
+        binsim.headphoneConvolvers = []
+        binsim.filterGeneration = 0
+        binsim.filterStorage = TwoFilterStorage([self.filter, self.other_filter],
+                                                self.headphone_filter)
+
+        binsim.soundHandler = SoundHandler(BLOCK_SIZE, N_CHANNELS, 44100, False)
+        binsim.soundHandler.sound = np.random.randn(
+            N_CHANNELS, BLOCK_SIZE * 1000).astype(np.float32) * 0.01
+        binsim.soundHandler.active_channels = N_CHANNELS
+
+        binsim.convolvers = [ConvolverFFTW(FILTER_SIZE, BLOCK_SIZE, False)
+                             for _ in range(N_CHANNELS)]
+        for convolver in binsim.convolvers:
+            convolver.setIR(self.filter, False)
+
+        return binsim
+
+    def assertAllocationFree(self, process):
+        net, peak = measure_allocations(process)
+
+        self.assertEqual(net, 0)
+        # a quarter of a float32 block, so that no block sized temporary can be created
+        self.assertLess(peak, BLOCK_SIZE)
+
+    def test_process_block(self):
+        binsim = self.create_binsim()
+
+        self.assertAllocationFree(binsim.process_block)
+
+    def test_process_block_crossfade(self):
+        binsim = self.create_binsim()
+        binsim.config.configurationDict['enableCrossfading'] = True
+        binsim.oscReceiver = MovingOscInput()
+
+        def process_and_check():
+            binsim.process_block()
+            for convolver in binsim.convolvers:
+                assert convolver.differing_blocks == convolver.IR_blocks
+
+        self.assertAllocationFree(process_and_check)
+
+    def test_process_block_headphone_filter(self):
+        binsim = self.create_binsim()
+        binsim.config.configurationDict['useHeadphoneFilter'] = True
+        binsim.headphoneConvolvers = [ConvolverFFTW(FILTER_SIZE, BLOCK_SIZE, True)]
+        binsim.headphoneConvolvers[0].setIR(self.headphone_filter, False)
+
+        self.assertAllocationFree(binsim.process_block)
+
+    def test_convolver_crossfade(self):
+        convolver = ConvolverFFTW(FILTER_SIZE, BLOCK_SIZE, False)
+        block = np.random.randn(BLOCK_SIZE).astype(np.float32)
+
+        filters = [self.filter, self.other_filter]
+        switches = [0]
+
+        # Alternate between two filters, so every block is cross faded over all partitions
+        def switch_and_process():
+            switches[0] += 1
+            convolver.setIR(filters[switches[0] % 2], True)
+            convolver.process(block)
+            assert convolver.differing_blocks == convolver.IR_blocks
+
+        self.assertAllocationFree(switch_and_process)
@@ -0,0 +1,63 @@
+import atexit
+import logging
+from unittest import TestCase
+
+from pybinsim.asynclog import RATE_LIMITED, RateLimitFilter, start_queue_logging
+
+
+def create_record(created, lineno=10, msg='Clipping occurred', rate_limited=True):
+    record = logging.LogRecord('pybinsim.BinSim', logging.WARNING, 'application.py', lineno,
+                               msg, None, None)
+    record.created = created
+    if rate_limited:
+        record.__dict__.update(RATE_LIMITED)
+    return record
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super(ListHandler, self).__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestRateLimitFilter(TestCase):
+    def test_repeated_records_are_aggregated(self):
+        rate_limit = RateLimitFilter(1.0)
+
+        self.assertTrue(rate_limit.filter(create_record(0.0)))
+        for n in range(1, 11):
+            self.assertFalse(rate_limit.filter(create_record(n * 0.05)))
+
+        # other call sites are not affected
+        self.assertTrue(rate_limit.filter(create_record(0.5, lineno=20)))
+
+        record = create_record(1.25)
+        self.assertTrue(rate_limit.filter(record))
+        self.assertEqual(record.getMessage(),
+                         'Clipping occurred (repeated 10 times in the last 1.2s)')
+
+    def test_other_records_always_pass(self):
+        rate_limit = RateLimitFilter(1.0)
+
+        for n in range(5):
+            self.assertTrue(rate_limit.filter(create_record(n * 0.05, msg='Filter not found: key: {}'.format(n),
+                                                            rate_limited=False)))
+
+
+class TestQueueLogging(TestCase):
+    def test_records_reach_handler(self):
+        logger = logging.getLogger('pybinsim.test_asynclog')
+        logger.propagate = False
+        handler = ListHandler()
+
+        listener = start_queue_logging(logger, handler)
+        for n in range(5):
+            logger.warning('Block %d', n, extra=RATE_LIMITED)
+        logger.warning('Filter not found')
+        listener.stop()
+        atexit.unregister(listener.stop)
+
+        self.assertEqual(handler.messages, ['Block 0', 'Filter not found'])
@@ -0,0 +1,39 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from pybinsim.application import BinSimConfig
+from pybinsim.autotune import autotune, write_profile
+
+
+class TestAutotune(TestCase):
+    def test_autotune_skips_invalid_block_sizes(self):
+        best, results = autotune(1024, 44100, 1, [128, 384], [1], ['FFTW_ESTIMATE'],
+                                 headroom=100, n_blocks=5)
+
+        self.assertEqual([result['blockSize'] for result in results], [128])
+        self.assertEqual(best['blockSize'], 128)
+
+    def test_autotune_prefers_smallest_block_size(self):
+        best, results = autotune(1024, 44100, 1, [512, 128, 256], [1], ['FFTW_ESTIMATE'],
+                                 headroom=100, n_blocks=5)
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual(best['blockSize'], 128)
+
+    def test_profile_is_loaded_by_config(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profile_path = os.path.join(tmp_dir, 'profile.cfg')
+            config_path = os.path.join(tmp_dir, 'settings.cfg')
+
+            write_profile(profile_path, {'blockSize': 128, 'fftThreads': 2,
+                                         'fftPlannerEffort': 'FFTW_ESTIMATE'})
+            with open(config_path, 'w') as config_file:
+                config_file.write("blockSize 512\nconfigProfile {}\n".format(profile_path))
+
+            config = BinSimConfig()
+            config.read_from_file(config_path)
+
+            self.assertEqual(config.get('blockSize'), 128)
+            self.assertEqual(config.get('fftThreads'), 2)
+            self.assertEqual(config.get('fftPlannerEffort'), 'FFTW_ESTIMATE')
@@ -0,0 +1,91 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+import soundfile as sf
+
+from pybinsim.application import BinSimConfig
+from pybinsim.batch import read_manifest, run_batch
+
+BLOCK_SIZE = 64
+FILTER_SIZE = 128
+FS = 44100
+
+
+class TestBatch(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+        # unit impulses with gain 1 (left) and 0.5 (right) for yaw 0, swapped for yaw 90
+        filter_lines = []
+        for yaw, gains in ((0, (1., .5)), (90, (.5, 1.))):
+            ir = np.zeros((FILTER_SIZE, 2), dtype=np.float32)
+            ir[0] = gains
+            path = self.path('ir_{}.wav'.format(yaw))
+            sf.write(path, ir, FS, subtype='FLOAT')
+            filter_lines.append('{} 0 0 0 0 0 {}'.format(yaw, path))
+        self.write('filters.txt', filter_lines)
+
+        self.write('settings.cfg', ['blockSize {}'.format(BLOCK_SIZE),
+                                    'filterSize {}'.format(FILTER_SIZE),
+                                    'filterList {}'.format(self.path('filters.txt')),
+                                    'samplingRate {}'.format(FS),
+                                    'fftPlannerEffort FFTW_ESTIMATE',
+                                    'loudnessFactor 2'])
+        self.config = BinSimConfig()
+        self.config.read_from_file(self.path('settings.cfg'))
+
+        self.sound = np.random.randn(BLOCK_SIZE * 10).astype(np.float32) * 0.1
+        sf.write(self.path('sound.wav'), self.sound, FS, subtype='FLOAT')
+
+        # turn to yaw 90 at block 4
+        self.write('trajectory.txt', ['4 0 90 0 0 0 0 0 0 0 0'])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def write(self, name, lines):
+        with open(self.path(name), 'w') as output:
+            output.write('\n'.join(lines) + '\n')
+
+    def test_render_and_resume(self):
+        self.write('manifest.txt', ['# output sound trajectory',
+                                    '{} {} {}'.format(self.path('out/static.wav'), self.path('sound.wav'), '-'),
+                                    '{} {} {}'.format(self.path('out/turn.wav'), self.path('sound.wav'),
+                                                      self.path('trajectory.txt'))])
+        jobs = read_manifest(self.path('manifest.txt'), self.config.get('filterList'))
+
+        rendered_jobs, failed, rendered_seconds, _ = run_batch(self.config, jobs, processes=2)
+
+        self.assertEqual(rendered_jobs, 2)
+        self.assertEqual(failed, [])
+        self.assertAlmostEqual(rendered_seconds, 2 * BLOCK_SIZE * 12 / float(FS))
+
+        static, _ = sf.read(self.path('out/static.wav'), dtype='float32')
+        self.assertEqual(static.shape, (BLOCK_SIZE * 12, 2))
+        np.testing.assert_allclose(static[:self.sound.shape[0], 0], self.sound, atol=1e-5)
+        np.testing.assert_allclose(static[:self.sound.shape[0], 1], self.sound * .5, atol=1e-5)
+
+        turn, _ = sf.read(self.path('out/turn.wav'), dtype='float32')
+        switch = BLOCK_SIZE * 4
+        np.testing.assert_allclose(turn[:switch, 0], self.sound[:switch], atol=1e-5)
+        np.testing.assert_allclose(turn[switch:self.sound.shape[0], 0], self.sound[switch:] * .5, atol=1e-5)
+
+        # existing outputs are not rendered again
+        rendered_jobs, failed, _, _ = run_batch(self.config, jobs, processes=2)
+        self.assertEqual(rendered_jobs, 0)
+        self.assertEqual(failed, [])
+
+    def test_failed_jobs_are_reported(self):
+        self.write('manifest.txt', ['{} {} -'.format(self.path('missing.wav'), self.path('no_such_sound.wav'))])
+        jobs = read_manifest(self.path('manifest.txt'), self.config.get('filterList'))
+
+        rendered_jobs, failed, _, _ = run_batch(self.config, jobs, processes=1)
+
+        self.assertEqual(rendered_jobs, 0)
+        self.assertEqual(failed, jobs)
+        self.assertFalse(os.path.exists(self.path('missing.wav')))
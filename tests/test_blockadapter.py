@@ -0,0 +1,43 @@
+import itertools
+from unittest import TestCase
+
+import numpy as np
+
+from pybinsim.blockadapter import BlockAdapter
+
+
+class RampRenderer(object):
+    """ Renders consecutive sample indices, so that the order of all frames can be checked """
+
+    def __init__(self, block_size):
+        self.block_size = block_size
+        self.counter = itertools.count()
+        self.rendered_blocks = 0
+
+    def __call__(self):
+        start = next(self.counter) * self.block_size
+        self.rendered_blocks += 1
+        frames = np.arange(start, start + self.block_size, dtype=np.float32)
+        return np.stack([frames, -frames], axis=1)
+
+
+class TestBlockAdapter(TestCase):
+    def check_adapter(self, block_size, device_buffer_size, n_buffers):
+        renderer = RampRenderer(block_size)
+        adapter = BlockAdapter(renderer, block_size, device_buffer_size)
+
+        output = np.concatenate([adapter.read_block().copy() for _ in range(n_buffers)])
+
+        expected = np.arange(device_buffer_size * n_buffers, dtype=np.float32)
+        np.testing.assert_array_equal(output[:, 0], expected)
+        np.testing.assert_array_equal(output[:, 1], -expected)
+        return renderer.rendered_blocks
+
+    def test_smaller_device_buffer(self):
+        self.assertEqual(self.check_adapter(256, 64, 8), 2)
+
+    def test_larger_device_buffer(self):
+        self.assertEqual(self.check_adapter(64, 256, 2), 8)
+
+    def test_uneven_sizes(self):
+        self.assertEqual(self.check_adapter(96, 64, 6), 4)
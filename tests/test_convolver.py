@@ -0,0 +1,173 @@
+import gc
+import weakref
+from unittest import TestCase
+
+import numpy as np
+
+from pybinsim.convolver import ConvolverFFTW, FFTPlans
+from pybinsim.filterstorage import Filter
+
+BLOCK_SIZE = 64
+IR_BLOCKS = 8
+
+
+def create_filter(data):
+    return Filter(data, IR_BLOCKS, BLOCK_SIZE)
+
+
+class TestConvolverCrossfade(TestCase):
+    def setUp(self):
+        self.data = np.random.randn(BLOCK_SIZE * IR_BLOCKS, 2).astype(np.float32)
+
+    def test_differing_blocks(self):
+        convolver = ConvolverFFTW(BLOCK_SIZE * IR_BLOCKS, BLOCK_SIZE, False)
+        changed = self.data.copy()
+        changed[BLOCK_SIZE * 2 + 5, 1] += 0.5
+
+        filter_a = create_filter(self.data)
+        filter_b = create_filter(changed)
+
+        self.assertEqual(convolver.get_differing_blocks(filter_a, filter_b), 3)
+        self.assertEqual(convolver.get_differing_blocks(filter_a, filter_a), 0)
+        self.assertEqual(convolver.get_differing_blocks(None, filter_a), IR_BLOCKS)
+
+    def test_differing_blocks_cache_does_not_keep_filters(self):
+        convolver = ConvolverFFTW(BLOCK_SIZE * IR_BLOCKS, BLOCK_SIZE, False)
+        filter_a = create_filter(self.data)
+        filter_b = create_filter(self.data * 2)
+        convolver.get_differing_blocks(filter_a, filter_b)
+        replaced = weakref.ref(filter_b)
+
+        del filter_b
+        gc.collect()
+
+        self.assertIsNone(replaced())
+
+    def test_differing_blocks_tolerance(self):
+        convolver = ConvolverFFTW(BLOCK_SIZE * IR_BLOCKS, BLOCK_SIZE, False, crossfade_tolerance=0.01)
+        changed = self.data.copy()
+        changed[BLOCK_SIZE * 5:] += 0.001
+
+        self.assertEqual(convolver.get_differing_blocks(
+            create_filter(self.data), create_filter(changed)), 0)
+
+    def test_shared_partitions_match_full_crossfade(self):
+        changed = self.data.copy()
+        changed[:BLOCK_SIZE * 2] = np.random.randn(BLOCK_SIZE * 2, 2)
+        filter_a = create_filter(self.data)
+        filter_b = create_filter(changed)
+
+        shared = ConvolverFFTW(BLOCK_SIZE * IR_BLOCKS, BLOCK_SIZE, False)
+        full = ConvolverFFTW(BLOCK_SIZE * IR_BLOCKS, BLOCK_SIZE, False)
+
+        for n in range(20):
+            new_filter = filter_b if n % 2 else filter_a
+            shared.setIR(new_filter, True)
+            full.setIR(new_filter, True)
+            # disable sharing for the reference
+            full.differing_blocks = IR_BLOCKS
+
+            block = np.random.randn(BLOCK_SIZE).astype(np.float32)
+            left_shared, right_shared = shared.process(block)
+            left_full, right_full = full.process(block)
+
+            np.testing.assert_allclose(left_shared, left_full, atol=1e-4)
+            np.testing.assert_allclose(right_shared, right_full, atol=1e-4)
+
+
+class TestConvolverActiveBlocks(TestCase):
+    def test_short_filter_matches_direct_convolution(self):
+        data = np.zeros((BLOCK_SIZE * IR_BLOCKS, 2), dtype=np.float32)
+        data[:BLOCK_SIZE * 2 - 7] = np.random.randn(BLOCK_SIZE * 2 - 7, 2)
+        short_filter = create_filter(data)
+
+        convolver = ConvolverFFTW(BLOCK_SIZE * IR_BLOCKS, BLOCK_SIZE, False)
+        convolver.setIR(short_filter, False)
+        self.assertEqual(convolver.active_blocks, 2)
+
+        signal = np.random.randn(BLOCK_SIZE * 12).astype(np.float32)
+        output = np.concatenate([convolver.process(block)[0].copy()
+                                 for block in signal.reshape(-1, BLOCK_SIZE)])
+
+        expected = np.convolve(signal, data[:, 0])[:signal.size]
+        np.testing.assert_allclose(output, expected, atol=1e-3)
+
+
+class TestConvolverSilence(TestCase):
+    def test_skipping_matches_full_processing(self):
+        data = np.random.randn(BLOCK_SIZE * IR_BLOCKS, 2).astype(np.float32)
+        full = ConvolverFFTW(BLOCK_SIZE * IR_BLOCKS, BLOCK_SIZE, False)
+        skipping = ConvolverFFTW(BLOCK_SIZE * IR_BLOCKS, BLOCK_SIZE, False, silence_threshold=0.0)
+        full.setIR(create_filter(data), False)
+        skipping.setIR(create_filter(data), False)
+
+        # sound, a pause longer than the filter, sound again
+        blocks = [np.random.randn(BLOCK_SIZE).astype(np.float32) for _ in range(3)]
+        blocks += [np.zeros(BLOCK_SIZE, dtype=np.float32)] * (IR_BLOCKS * 3)
+        blocks += [np.random.randn(BLOCK_SIZE).astype(np.float32) for _ in range(IR_BLOCKS + 2)]
+
+        for block in blocks:
+            expected = [output.copy() for output in full.process(block)]
+            result = skipping.process(block)
+            np.testing.assert_allclose(result, expected, atol=1e-4)
+
+        self.assertEqual(skipping.skipped_blocks, IR_BLOCKS * 3 - IR_BLOCKS - 1)
+
+
+class TestSharedPlans(TestCase):
+    def test_shared_plans_match_own_plans(self):
+        filters = [create_filter(np.random.randn(BLOCK_SIZE * IR_BLOCKS, 2).astype(np.float32))
+                   for _ in range(2)]
+        plans = FFTPlans(BLOCK_SIZE, planner_effort='FFTW_ESTIMATE')
+        own = [ConvolverFFTW(BLOCK_SIZE * IR_BLOCKS, BLOCK_SIZE, False) for _ in filters]
+        shared = [ConvolverFFTW(BLOCK_SIZE * IR_BLOCKS, BLOCK_SIZE, False, fft_plans=plans)
+                  for _ in filters]
+
+        for convolvers in (own, shared):
+            for convolver, filter in zip(convolvers, filters):
+                convolver.setIR(filter, False)
+
+        for _ in range(IR_BLOCKS * 2):
+            block = np.random.randn(BLOCK_SIZE).astype(np.float32)
+            for convolver_own, convolver_shared in zip(own, shared):
+                expected = [output.copy() for output in convolver_own.process(block)]
+                np.testing.assert_allclose(convolver_shared.process(block), expected, atol=1e-4)
+
+
+class TestSharedInput(TestCase):
+    def test_shared_input_matches_own_input(self):
+        filters = [create_filter(np.random.randn(BLOCK_SIZE * IR_BLOCKS, 2).astype(np.float32))
+                   for _ in range(2)]
+        plans = FFTPlans(BLOCK_SIZE, planner_effort='FFTW_ESTIMATE')
+        leader = ConvolverFFTW(BLOCK_SIZE * IR_BLOCKS, BLOCK_SIZE, False, fft_plans=plans)
+        follower = ConvolverFFTW(BLOCK_SIZE * IR_BLOCKS, BLOCK_SIZE, False, fft_plans=plans)
+        follower.share_input(leader)
+        own = ConvolverFFTW(BLOCK_SIZE * IR_BLOCKS, BLOCK_SIZE, False, fft_plans=plans)
+
+        leader.setIR(filters[0], False)
+        follower.setIR(filters[1], False)
+        own.setIR(filters[1], False)
+
+        for n in range(IR_BLOCKS * 2):
+            if n == IR_BLOCKS:
+                # filter switch of the follower only
+                follower.setIR(filters[0], True)
+                own.setIR(filters[0], True)
+            block = np.random.randn(BLOCK_SIZE).astype(np.float32)
+            expected = [output.copy() for output in own.process(block)]
+            leader.process(block)
+            np.testing.assert_allclose(follower.process_shared(), expected, atol=1e-4)
+
+        self.assertEqual(follower.memory_usage()['fdl'], 0)
+
+
+class TestConvolverMemoryUsage(TestCase):
+    def test_memory_usage(self):
+        convolver = ConvolverFFTW(BLOCK_SIZE * IR_BLOCKS, BLOCK_SIZE, False)
+
+        usage = convolver.memory_usage()
+
+        # two complex64 FDLs
+        self.assertEqual(usage['fdl'], 2 * IR_BLOCKS * (BLOCK_SIZE + 1) * 8)
+        self.assertGreater(usage['spectra'], 4 * IR_BLOCKS * (BLOCK_SIZE + 1) * 8)
+        self.assertGreater(usage['buffers'], 0)
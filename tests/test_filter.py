@@ -0,0 +1,203 @@
+import logging
+import os
+import tempfile
+from unittest import TestCase, mock
+
+import numpy as np
+import soundfile as sf
+
+from pybinsim.application import BinSim, BinSimConfig
+from pybinsim.convolver import ConvolverFFTW
+from pybinsim.filterstorage import Filter, FilterStorage, energy_decay_cutoff
+from pybinsim.pose import Orientation, Pose, Position
+
+BLOCK_SIZE = 64
+IR_BLOCKS = 4
+
+
+class TestFilterPrecision(TestCase):
+    def setUp(self):
+        decay = np.exp(-np.arange(BLOCK_SIZE * IR_BLOCKS) / 50.)[:, np.newaxis]
+        self.data = (np.random.randn(BLOCK_SIZE * IR_BLOCKS, 2) * decay).astype(np.float32)
+
+    def test_float32_is_exact(self):
+        left, right = Filter(self.data, IR_BLOCKS, BLOCK_SIZE).getFilter()
+
+        np.testing.assert_array_equal(left.reshape(-1), self.data[:, 0])
+        np.testing.assert_array_equal(right.reshape(-1), self.data[:, 1])
+
+    def test_reduced_precision(self):
+        for precision in ('float16', 'int16'):
+            current_filter = Filter(self.data, IR_BLOCKS, BLOCK_SIZE, precision=precision)
+            left, right = current_filter.getFilter()
+
+            self.assertEqual(current_filter.IR_left_blocked.itemsize, 2)
+            self.assertEqual(left.dtype, np.float32)
+            np.testing.assert_allclose(right.reshape(-1), self.data[:, 1], atol=1e-3)
+            self.assertLess(current_filter.max_deviation_db, -60)
+
+    def test_unknown_precision(self):
+        with self.assertRaises(RuntimeError):
+            Filter(self.data, IR_BLOCKS, BLOCK_SIZE, precision='int8')
+
+
+class TestActivePartitions(TestCase):
+    def test_active_blocks(self):
+        data = np.zeros((BLOCK_SIZE * IR_BLOCKS, 2), dtype=np.float32)
+        data[BLOCK_SIZE + 3, 1] = 1
+
+        self.assertEqual(Filter(data, IR_BLOCKS, BLOCK_SIZE).active_blocks, 2)
+
+    def test_silent_filter_has_no_active_blocks(self):
+        data = np.zeros((BLOCK_SIZE * IR_BLOCKS, 2), dtype=np.float32)
+
+        self.assertEqual(Filter(data, IR_BLOCKS, BLOCK_SIZE).active_blocks, 0)
+
+    def test_energy_decay_cutoff(self):
+        data = np.zeros((1000, 2), dtype=np.float32)
+        data[:100] = 1
+        data[100:200] = 1e-2
+
+        self.assertEqual(energy_decay_cutoff(data, -30), 100)
+        self.assertEqual(energy_decay_cutoff(data, -120), 200)
+        self.assertEqual(energy_decay_cutoff(np.zeros((10, 2)), -60), 0)
+
+
+class TestFilterReload(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filter_list = os.path.join(self.directory.name, 'filters.txt')
+        self.writes = 0
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_filter(self, name, value):
+        path = os.path.join(self.directory.name, name)
+        sf.write(path, np.full((BLOCK_SIZE * 2, 2), value, dtype=np.float32), 44100, subtype='FLOAT')
+        # make sure the signature changes, even on coarse file system timestamps
+        self.writes += 1
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + self.writes * 10 ** 9))
+        return path
+
+    def write_filter_list(self, lines):
+        with open(self.filter_list, 'w') as filter_list:
+            filter_list.write('\n'.join(lines) + '\n')
+
+    def test_reload_only_changed_files(self):
+        path_a = self.write_filter('a.wav', 0.1)
+        path_b = self.write_filter('b.wav', 0.2)
+        self.write_filter_list(['0 0 0 0 0 0 ' + path_a, '90 0 0 0 0 0 ' + path_b])
+        storage = FilterStorage(BLOCK_SIZE * 2, BLOCK_SIZE, self.filter_list)
+        filter_a = storage.get_filter(Pose(Orientation(0, 0, 0), Position(0, 0, 0)))
+
+        self.write_filter('b.wav', 0.3)
+        path_c = self.write_filter('c.wav', 0.4)
+        self.write_filter_list(['0 0 0 0 0 0 ' + path_a, '90 0 0 0 0 0 ' + path_b,
+                                '180 0 0 0 0 0 ' + path_c])
+
+        self.assertEqual(storage.reload_filters(), 2)
+        self.assertIs(storage.get_filter(Pose(Orientation(0, 0, 0), Position(0, 0, 0))), filter_a)
+        filter_b = storage.get_filter(Pose(Orientation(90, 0, 0), Position(0, 0, 0)))
+        self.assertAlmostEqual(float(filter_b.getFilter()[0][0, 0]), 0.3, places=5)
+        self.assertIsNot(storage.get_filter(Pose(Orientation(180, 0, 0), Position(0, 0, 0))),
+                         storage.default_filter)
+
+        self.assertEqual(storage.reload_filters(), 0)
+
+    def test_memory_usage(self):
+        path_a = self.write_filter('a.wav', 0.1)
+        self.write_filter_list(['0 0 0 0 0 0 ' + path_a, '90 0 0 0 0 0 ' + path_a])
+        storage = FilterStorage(BLOCK_SIZE * 2, BLOCK_SIZE, self.filter_list, precision='float16')
+
+        usage = storage.memory_usage()
+
+        # the filter is shared by both poses and counted once
+        self.assertEqual(usage['filters'], BLOCK_SIZE * 2 * 2 * 2)
+        self.assertEqual(usage['headphone_filter'], 0)
+
+    def test_deduplicate_identical_files(self):
+        path_a = self.write_filter('a.wav', 0.1)
+        path_b = self.write_filter('b.wav', 0.1)
+        path_c = self.write_filter('c.wav', 0.2)
+        self.write_filter_list(['0 0 0 0 0 0 ' + path_a, '90 0 0 0 0 0 ' + path_b,
+                                '180 0 0 0 0 0 ' + path_c])
+        storage = FilterStorage(BLOCK_SIZE * 2, BLOCK_SIZE, self.filter_list, deduplicate=True)
+
+        filter_a = storage.get_filter(Pose(Orientation(0, 0, 0), Position(0, 0, 0)))
+        self.assertIs(storage.get_filter(Pose(Orientation(90, 0, 0), Position(0, 0, 0))), filter_a)
+        self.assertIsNot(storage.get_filter(Pose(Orientation(180, 0, 0), Position(0, 0, 0))), filter_a)
+
+        # files of shared filters are not loaded again
+        self.assertEqual(storage.reload_filters(), 0)
+        self.assertIs(storage.get_filter(Pose(Orientation(90, 0, 0), Position(0, 0, 0))), filter_a)
+
+    def test_reload_filter_list_replaced_by_rename(self):
+        path_a = self.write_filter('a.wav', 0.1)
+        path_b = self.write_filter('b.wav', 0.2)
+        self.write_filter_list(['0 0 0 0 0 0 ' + path_a])
+        storage = FilterStorage(BLOCK_SIZE * 2, BLOCK_SIZE, self.filter_list)
+
+        new_filter_list = self.filter_list + '.new'
+        with open(new_filter_list, 'w') as filter_list:
+            filter_list.write('0 0 0 0 0 0 {}\n90 0 0 0 0 0 {}\n'.format(path_a, path_b))
+        os.replace(new_filter_list, self.filter_list)
+
+        self.assertEqual(storage.reload_filters(), 1)
+        self.assertIsNot(storage.get_filter(Pose(Orientation(90, 0, 0), Position(0, 0, 0))),
+                         storage.default_filter)
+
+    def test_reload_headphone_filter(self):
+        path_a = self.write_filter('a.wav', 0.1)
+        path_hp = self.write_filter('hp.wav', 0.5)
+        self.write_filter_list(['0 0 0 0 0 0 ' + path_a, 'HPFILTER ' + path_hp])
+        storage = FilterStorage(BLOCK_SIZE * 2, BLOCK_SIZE, self.filter_list)
+        headphone_filter = storage.get_headphone_filter()
+
+        storage.reload_filters()
+        self.assertIs(storage.get_headphone_filter(), headphone_filter)
+
+        self.write_filter('hp.wav', 0.25)
+        storage.reload_filters()
+        self.assertAlmostEqual(float(storage.get_headphone_filter().getFilter()[0][0, 0]), 0.25, places=5)
+
+    def create_session(self, storage):
+        """ BinSim with only the headphone convolver, as a session of a server sharing storage """
+        binsim = BinSim.__new__(BinSim)
+        binsim.log = logging.getLogger("pybinsim.BinSim")
+        binsim.config = BinSimConfig()
+        binsim.config.configurationDict['useHeadphoneFilter'] = True
+        binsim.filterStorage = storage
+        binsim.filterGeneration = storage.reload_generation
+        binsim.headphoneConvolvers = [ConvolverFFTW(BLOCK_SIZE * 2, BLOCK_SIZE, True)]
+        binsim.headphoneConvolvers[0].setIR(storage.get_headphone_filter(), False)
+
+        return binsim
+
+    def test_reload_headphone_filter_of_all_sessions(self):
+        path_a = self.write_filter('a.wav', 0.1)
+        path_hp = self.write_filter('hp.wav', 0.5)
+        self.write_filter_list(['0 0 0 0 0 0 ' + path_a, 'HPFILTER ' + path_hp])
+        storage = FilterStorage(BLOCK_SIZE * 2, BLOCK_SIZE, self.filter_list)
+        sessions = [self.create_session(storage) for _ in range(2)]
+
+        self.write_filter('hp.wav', 0.25)
+        storage.reload_filters()
+
+        for binsim in sessions:
+            self.assertNotEqual(binsim.filterGeneration, storage.reload_generation)
+            binsim.update_reloaded_filters()
+            self.assertEqual(binsim.filterGeneration, storage.reload_generation)
+            self.assertIs(binsim.headphoneConvolvers[0].current_filter, storage.get_headphone_filter())
+
+    def test_memory_usage_is_logged_after_reload(self):
+        binsim = BinSim.__new__(BinSim)
+        binsim.log = logging.getLogger("pybinsim.BinSim")
+        binsim.filterStorage = mock.Mock()
+        binsim.log_memory_usage = mock.Mock()
+
+        binsim.reload_filters().join()
+
+        binsim.filterStorage.reload_filters.assert_called_once_with()
+        binsim.log_memory_usage.assert_called_once_with()
@@ -0,0 +1,46 @@
+import os
+import time
+from unittest import TestCase
+
+from pybinsim.headtracker import HeadTracker, parse_angle_line
+
+
+class OrientationReceiver(object):
+    """ Stands in for the OscReceiver """
+
+    def __init__(self):
+        self.orientations = {}
+
+    def set_orientation(self, channel, orientation):
+        self.orientations[channel] = orientation
+
+
+class TestHeadTracker(TestCase):
+    def test_parse_angle_line(self):
+        self.assertEqual(parse_angle_line(b'!ANG:1.5,-2.25,90.0'), (90.0, -2.25, 1.5))
+        self.assertEqual(parse_angle_line(b'!ANG:1.5,-2.25,90.0\r'), (90.0, -2.25, 1.5))
+        # empty values are 0, as in pybinsim.spark_fun
+        self.assertEqual(parse_angle_line(b'!ANG:1.5,,90.0'), (90.0, 0, 1.5))
+        self.assertIsNone(parse_angle_line(b'ANG:1.5,-2.25'))
+        self.assertIsNone(parse_angle_line(b'#YPR'))
+
+    def test_pseudo_terminal(self):
+        master, slave = os.openpty()
+        receiver = OrientationReceiver()
+
+        tracker = HeadTracker(os.ttyname(slave), 57600, receiver, [0, 90], resolution=5)
+
+        # broken and split lines must not confuse the reader
+        os.write(master, b'garbage\r\n!ANG:0.0,0.0,1')
+        time.sleep(0.05)
+        os.write(master, b'2.0\r\n')
+        time.sleep(0.3)
+        tracker.close()
+        time.sleep(0.2)
+        os.close(master)
+        os.close(slave)
+
+        self.assertEqual(receiver.orientations[0], (350, 0, 0))
+        self.assertEqual(receiver.orientations[1], (80, 0, 0))
+        self.assertEqual(tracker.line_count, 1)
+        self.assertEqual(tracker.error_count, 1)
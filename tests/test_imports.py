@@ -1,3 +1,6 @@
+import logging
+import subprocess
+import sys
 from unittest import TestCase
 
 
@@ -11,4 +14,31 @@ class TestImports(TestCase):
         import pybinsim.soundhandler
         import pybinsim.utility
 
+    def test_lightweight_import(self):
+        # a fresh interpreter, modules of other tests are already loaded here
+        code = ("import sys, pybinsim.pose; "
+                "print(','.join(m for m in ('pyaudio', 'pyfftw', 'pythonosc', 'soundfile', 'scipy') "
+                "if m in sys.modules))")
+        loaded = subprocess.check_output([sys.executable, '-c', code]).decode().strip()
 
+        self.assertEqual(loaded, '')
+
+    def test_lazy_constructors(self):
+        # a fresh interpreter, the constructors import the application on the first call
+        code = ("import sys, pybinsim; "
+                "print('pybinsim.application' in sys.modules)")
+        loaded = subprocess.check_output([sys.executable, '-c', code]).decode().strip()
+
+        self.assertEqual(loaded, 'False')
+        import pybinsim
+        self.assertTrue(callable(pybinsim.BinSim))
+        self.assertTrue(callable(pybinsim.BinSimServer))
+
+    def test_logger_level_is_kept(self):
+        code = ("import logging, pybinsim; "
+                "pybinsim.logger.setLevel(logging.WARNING); "
+                "pybinsim._start_logging(); "
+                "print(pybinsim.logger.level, len(pybinsim.logger.handlers))")
+        output = subprocess.check_output([sys.executable, '-c', code]).decode().split()
+
+        self.assertEqual(output, [str(logging.WARNING), '1'])
@@ -0,0 +1,74 @@
+import socket
+import time
+from unittest import TestCase
+
+import numpy as np
+
+from pybinsim.soundhandler import LiveInputHandler
+
+
+class TestLiveInputHandler(TestCase):
+    def test_push_input(self):
+        handler = LiveInputHandler(4, 2)
+        frames = np.arange(8, dtype=np.float32)
+
+        handler.push_input(frames.tobytes())
+        block = handler.buffer_read()
+
+        np.testing.assert_array_equal(block, [[0, 2, 4, 6], [1, 3, 5, 7]])
+
+    def test_underrun_returns_silence(self):
+        handler = LiveInputHandler(4, 2)
+        handler.push_input(np.ones(8, dtype=np.float32).tobytes())
+        handler.buffer_read()
+
+        block = handler.buffer_read()
+
+        np.testing.assert_array_equal(block, np.zeros((2, 4)))
+        self.assertEqual(handler.underruns, 1)
+
+    def test_only_newest_block_is_kept(self):
+        handler = LiveInputHandler(4, 1)
+        handler.push_input(np.ones(4, dtype=np.float32).tobytes())
+        handler.push_input(np.full(4, 2, dtype=np.float32).tobytes())
+
+        block = handler.buffer_read()
+
+        np.testing.assert_array_equal(block, [[2, 2, 2, 2]])
+        self.assertEqual(handler.overruns, 1)
+
+    def test_udp_source(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+
+        handler = LiveInputHandler(4, 1, 'udp:{}'.format(port))
+        time.sleep(0.1)
+
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sender.sendto(np.full(4, 0.5, dtype=np.float32).tobytes(), ('127.0.0.1', port))
+        sender.close()
+        time.sleep(0.1)
+
+        block = handler.buffer_read()
+        handler.close()
+
+        np.testing.assert_array_equal(block, [[0.5, 0.5, 0.5, 0.5]])
+
+    def test_device_buffers_are_collected(self):
+        handler = LiveInputHandler(4, 1, fifo_size=6)
+
+        handler.push_input(np.arange(2, dtype=np.float32).tobytes())
+        np.testing.assert_array_equal(handler.buffer_read(), [[0, 0, 0, 0]])
+
+        handler.push_input(np.arange(2, 4, dtype=np.float32).tobytes())
+        handler.push_input(np.arange(4, 6, dtype=np.float32).tobytes())
+
+        np.testing.assert_array_equal(handler.buffer_read(), [[0, 1, 2, 3]])
+        self.assertEqual(handler.underruns, 1)
+
+        # wraps around the end of the FIFO
+        handler.push_input(np.arange(6, 10, dtype=np.float32).tobytes())
+        np.testing.assert_array_equal(handler.buffer_read(), [[4, 5, 6, 7]])
+        self.assertEqual(handler.overruns, 0)
@@ -0,0 +1,89 @@
+from unittest import TestCase
+
+import numpy as np
+
+from pybinsim.application import BinSim, BinSimConfig
+from pybinsim.panning import VirtualSpeakerPanner, vbap_gains
+
+SPEAKERS = [0, 90, 180, 270]
+
+
+class TestVbapGains(TestCase):
+    def test_source_on_speaker(self):
+        np.testing.assert_allclose(vbap_gains(90, SPEAKERS), [0, 1, 0, 0], atol=1e-6)
+
+    def test_source_between_speakers(self):
+        gains = vbap_gains(-45, SPEAKERS)
+
+        np.testing.assert_allclose(gains, [np.sqrt(0.5), 0, 0, np.sqrt(0.5)], atol=1e-6)
+
+    def test_constant_energy(self):
+        for azimuth in range(0, 360, 7):
+            self.assertAlmostEqual(float(np.sum(vbap_gains(azimuth, SPEAKERS) ** 2)), 1, places=5)
+
+
+class TestVirtualSpeakerPanner(TestCase):
+    def test_gap_too_large(self):
+        with self.assertRaises(RuntimeError):
+            VirtualSpeakerPanner([0, 180], 1, 4)
+
+    def test_gains_are_faded(self):
+        panner = VirtualSpeakerPanner(SPEAKERS, 2, 4)
+        block = np.ones((2, 4), dtype=np.float32)
+
+        panner.set_source_azimuth(0, 0)
+        panner.set_source_azimuth(1, 90)
+        signals = panner.process(block)
+
+        np.testing.assert_allclose(signals[0], [0, 0.25, 0.5, 0.75])
+        np.testing.assert_allclose(signals[1], [0, 0.25, 0.5, 0.75])
+
+        signals = panner.process(block)
+
+        np.testing.assert_allclose(signals, [[1] * 4, [1] * 4, [0] * 4, [0] * 4], atol=1e-6)
+
+    def test_without_fade(self):
+        panner = VirtualSpeakerPanner(SPEAKERS, 1, 4)
+
+        panner.set_source_azimuth(0, 180)
+        signals = panner.process(np.ones((1, 4), dtype=np.float32), fade=False)
+
+        np.testing.assert_allclose(signals[2], [1] * 4, atol=1e-6)
+
+
+class PassThroughConvolver(object):
+    """ Stands in for the ConvolverFFTW: the speaker signal is the left output """
+
+    def process(self, block):
+        return block, np.zeros_like(block)
+
+
+class MovingSource(object):
+    """ Stands in for the OscReceiver: the source has moved to azimuth 90 """
+
+    def is_filter_update_necessary(self, channel):
+        return True
+
+    def get_current_values(self, channel):
+        return [90, 0, 0, 0, 0, 0]
+
+
+class TestVirtualSpeakerRendering(TestCase):
+    def test_gains_are_faded_without_crossfading(self):
+        binsim = BinSim.__new__(BinSim)
+        binsim.config = BinSimConfig()
+        binsim.config.configurationDict['enableCrossfading'] = False
+        binsim.oscReceiver = MovingSource()
+        binsim.recorder = None
+        binsim.panner = VirtualSpeakerPanner([0, 90, 180, 270], 1, 4)
+        binsim.panner.set_source_azimuth(0, 0)
+        binsim.panner.process(np.ones((1, 4), dtype=np.float32))
+        binsim.convolvers = [PassThroughConvolver() for _ in range(4)]
+        binsim.block = np.ones((1, 4), dtype=np.float32)
+        binsim.result = np.zeros((4, 2), dtype=np.float32)
+
+        binsim.process_virtual_speakers(1)
+
+        # the speaker at 0 degree fades out, the one at 90 degree fades in
+        np.testing.assert_allclose(binsim.panner.speaker_signals[0], [1, 0.75, 0.5, 0.25], atol=1e-6)
+        np.testing.assert_allclose(binsim.panner.speaker_signals[1], [0, 0.25, 0.5, 0.75], atol=1e-6)
@@ -0,0 +1,78 @@
+import logging
+import os
+import threading
+import unittest
+from unittest import TestCase
+
+import numpy as np
+
+from pybinsim.application import BinSim, BinSimConfig
+from pybinsim.realtime import configure_current_thread, lock_arrays, parse_cpu_list
+
+
+class TestParseCpuList(TestCase):
+    def test_lists_and_ranges(self):
+        self.assertEqual(parse_cpu_list('0-2,5'), {0, 1, 2, 5})
+        self.assertEqual(parse_cpu_list(' 3 '), {3})
+        self.assertEqual(parse_cpu_list(''), set())
+
+
+@unittest.skipUnless(hasattr(os, 'sched_setaffinity'), 'requires Linux scheduling functions')
+class TestConfigureThread(TestCase):
+    def test_affinity_is_applied_to_calling_thread_only(self):
+        main_cpus = os.sched_getaffinity(0)
+        cpu = min(main_cpus)
+        results = {}
+
+        def run():
+            results['success'] = configure_current_thread('test', {cpu})
+            results['cpus'] = os.sched_getaffinity(0)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+
+        self.assertTrue(results['success'])
+        self.assertEqual(results['cpus'], {cpu})
+        self.assertEqual(os.sched_getaffinity(0), main_cpus)
+
+    def test_failures_are_reported(self):
+        results = {}
+
+        def run():
+            # no such CPU
+            results['success'] = configure_current_thread('test', {4096})
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+
+        self.assertFalse(results['success'])
+
+
+class TestLockArrays(TestCase):
+    def test_lock_arrays(self):
+        arrays = [np.zeros(1024, dtype=np.float32), None, np.zeros(0)]
+        try:
+            locked = lock_arrays(arrays)
+        except OSError as e:
+            self.skipTest('mlock not permitted: {}'.format(e))
+
+        self.assertEqual(locked, 4096)
+
+
+class TestFftThreads(TestCase):
+    def create_binsim(self, **settings):
+        binsim = BinSim.__new__(BinSim)
+        binsim.log = logging.getLogger("pybinsim.BinSim")
+        binsim.config = BinSimConfig()
+        binsim.config.configurationDict.update(settings)
+        binsim.renderCpus = parse_cpu_list(binsim.config.get('renderCpus'))
+        return binsim
+
+    def test_fft_threads_without_real_time_settings(self):
+        self.assertEqual(self.create_binsim(fftThreads=4).get_fft_threads(), 4)
+
+    def test_single_threaded_with_real_time_settings(self):
+        self.assertEqual(self.create_binsim(fftThreads=4, renderCpus='1').get_fft_threads(), 1)
+        self.assertEqual(self.create_binsim(fftThreads=0, realtimePriority=50).get_fft_threads(), 1)
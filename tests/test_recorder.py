@@ -0,0 +1,55 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+import soundfile as sf
+
+from pybinsim.recorder import Recorder
+
+BLOCK_SIZE = 16
+
+
+class TestRecorder(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'recording.wav')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_record_output_inputs_and_poses(self):
+        recorder = Recorder(self.file_path, BLOCK_SIZE, 44100, n_sources=2)
+        recorder.start()
+
+        outputs = np.random.randn(5, BLOCK_SIZE, 2).astype(np.float32)
+        inputs = np.random.randn(5, 1, BLOCK_SIZE).astype(np.float32)
+        for n in range(5):
+            if n == 2:
+                recorder.record_pose(0, (90, 0, 0, 0, 0, 0))
+            recorder.record(outputs[n], inputs[n])
+        recorder.close()
+
+        recorded_output, fs = sf.read(self.file_path, dtype='float32')
+        np.testing.assert_array_equal(recorded_output, outputs.reshape(-1, 2))
+        self.assertEqual(fs, 44100)
+
+        recorded_inputs, _ = sf.read(os.path.join(self.directory.name, 'recording_inputs.wav'),
+                                     dtype='float32')
+        np.testing.assert_array_equal(recorded_inputs[:, 0], inputs.reshape(-1))
+        np.testing.assert_array_equal(recorded_inputs[:, 1], 0)
+
+        with open(os.path.join(self.directory.name, 'recording_poses.txt')) as pose_file:
+            self.assertEqual(pose_file.read(), "2 0 90 0 0 0 0 0\n")
+
+    def test_full_queue_drops_blocks(self):
+        recorder = Recorder(self.file_path, BLOCK_SIZE, 44100, capacity=2)
+
+        for _ in range(5):
+            recorder.record(np.ones((BLOCK_SIZE, 2), dtype=np.float32))
+
+        self.assertEqual(recorder.dropped_blocks, 3)
+
+        recorder.start()
+        recorder.close()
+        self.assertEqual(sf.info(self.file_path).frames, 2 * BLOCK_SIZE)
@@ -0,0 +1,48 @@
+import itertools
+from unittest import TestCase
+
+import numpy as np
+
+from pybinsim.renderthread import RenderThread
+
+BLOCK_SIZE = 16
+
+
+class CountingRenderer(object):
+    """ Renders blocks filled with consecutive numbers """
+
+    def __init__(self):
+        self.counter = itertools.count()
+        self.block = np.zeros((BLOCK_SIZE, 2), dtype=np.float32)
+
+    def __call__(self):
+        self.block.fill(next(self.counter))
+        return self.block
+
+
+class TestRenderThread(TestCase):
+    def test_blocks_in_order(self):
+        render_thread = RenderThread(CountingRenderer(), BLOCK_SIZE, 3)
+        render_thread.start()
+
+        self.assertTrue(render_thread.wait_filled())
+        for n in range(20):
+            render_thread.wait_filled()
+            np.testing.assert_array_equal(render_thread.read_block(), n)
+
+        render_thread.stop()
+        self.assertEqual(render_thread.underruns, 0)
+
+    def test_underrun_returns_silence(self):
+        render_thread = RenderThread(CountingRenderer(), BLOCK_SIZE, 2)
+
+        np.testing.assert_array_equal(render_thread.read_block(), 0)
+        self.assertEqual(render_thread.underruns, 1)
+
+    def test_renders_only_lookahead_blocks(self):
+        render_thread = RenderThread(CountingRenderer(), BLOCK_SIZE, 4)
+        render_thread.start()
+        render_thread.wait_filled()
+        render_thread.stop()
+
+        self.assertEqual(render_thread.write_count, 4)
@@ -0,0 +1,39 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+import numpy as np
+import soundfile as sf
+
+from pybinsim.resampler import SampleRateConverter, resample
+
+
+class TestResampler(TestCase):
+    def test_resample_length(self):
+        data = np.random.randn(44100, 2).astype(np.float32)
+
+        resampled = resample(data, 44100, 48000)
+
+        self.assertEqual(resampled.shape, (48000, 2))
+        self.assertEqual(resampled.dtype, np.float32)
+
+    def test_resample_same_rate(self):
+        data = np.zeros((100, 2), dtype=np.float32)
+
+        self.assertIs(resample(data, 48000, 48000), data)
+
+    def test_converter_uses_cache(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            wav_path = str(Path(tmp_dir) / "sine.wav")
+            cache_dir = Path(tmp_dir) / "cache"
+            t = np.arange(4410) / 44100.
+            sf.write(wav_path, np.sin(2 * np.pi * 1000 * t), 44100)
+
+            converter = SampleRateConverter(48000, str(cache_dir))
+            first = converter.read(wav_path)
+            cache_files = list(cache_dir.glob("*.npy"))
+            second = converter.read(wav_path)
+
+            self.assertEqual(len(cache_files), 1)
+            self.assertEqual(first.shape, (4800,))
+            np.testing.assert_array_equal(first, second)
@@ -0,0 +1,74 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+from unittest import TestCase, mock
+
+from pybinsim.application import BinSimConfig
+from pybinsim.server import BinSimServer
+
+
+def create_config(**settings):
+    config = BinSimConfig()
+    config.configurationDict.update(settings)
+    return config
+
+
+class TestBinSimServer(TestCase):
+    def test_check_configs_accepts_compatible_sessions(self):
+        configs = [create_config(oscPort=10000), create_config(oscPort=10001)]
+
+        BinSimServer.check_configs(configs, ['a.cfg', 'b.cfg'])
+
+    def test_check_configs_rejects_different_filter_list(self):
+        configs = [create_config(oscPort=10000),
+                   create_config(oscPort=10001, filterList='other.txt')]
+
+        with self.assertRaises(RuntimeError):
+            BinSimServer.check_configs(configs, ['a.cfg', 'b.cfg'])
+
+    def test_check_configs_rejects_different_deduplication(self):
+        configs = [create_config(oscPort=10000),
+                   create_config(oscPort=10001, deduplicateFilters=True)]
+
+        with self.assertRaises(RuntimeError):
+            BinSimServer.check_configs(configs, ['a.cfg', 'b.cfg'])
+
+    def test_shared_storage_uses_deduplication(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_path = os.path.join(tmp_dir, 'settings.cfg')
+            with open(config_path, 'w') as config_file:
+                config_file.write("deduplicateFilters True\n")
+
+            with mock.patch('pybinsim.server.FilterStorage') as filter_storage, \
+                    mock.patch('pybinsim.server.BinSim'):
+                BinSimServer([config_path]).close()
+
+        self.assertIs(filter_storage.call_args[0][6], True)
+
+    def test_check_configs_rejects_same_osc_port(self):
+        configs = [create_config(), create_config()]
+
+        with self.assertRaises(RuntimeError):
+            BinSimServer.check_configs(configs, ['a.cfg', 'b.cfg'])
+
+    @unittest.skipUnless('fork' in multiprocessing.get_all_start_methods(), 'requires the fork start method')
+    def test_session_processes(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_paths = []
+            for port in (10000, 10001):
+                config_paths.append(os.path.join(tmp_dir, '{}.cfg'.format(port)))
+                with open(config_paths[-1], 'w') as config_file:
+                    config_file.write("oscPort {}\n".format(port))
+
+            # The mocks are inherited by the forked processes
+            with mock.patch('pybinsim.server.FilterStorage'), mock.patch('pybinsim.server.BinSim') as binsim:
+                session = binsim.return_value.__enter__.return_value
+                session.stream.is_active.return_value = False
+
+                with BinSimServer(config_paths, processes=True) as server:
+                    # sessions are only created in the session processes
+                    self.assertEqual(binsim.call_count, 0)
+                    server.stream_start()
+
+                    self.assertEqual([process.exitcode for process in server.session_processes], [0, 0])
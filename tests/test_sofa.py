@@ -0,0 +1,84 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import h5py
+import numpy as np
+
+from pybinsim.filterstorage import FilterStorage
+from pybinsim.pose import Custom, Orientation, Pose, Position
+
+BLOCK_SIZE = 64
+FILTER_SIZE = 256
+
+
+def write_sofa(file_path, irs, source_position, listener_view):
+    with h5py.File(file_path, 'w') as sofa_file:
+        sofa_file['Data.IR'] = irs
+        sofa_file['Data.SamplingRate'] = np.array([44100.])
+        sofa_file['SourcePosition'] = source_position
+        sofa_file['SourcePosition'].attrs['Type'] = np.bytes_('spherical')
+        sofa_file['ListenerView'] = listener_view
+        sofa_file['ListenerView'].attrs['Type'] = np.bytes_('cartesian')
+        sofa_file['ListenerPosition'] = np.array([[0., 0., 0.]])
+        sofa_file['ListenerPosition'].attrs['Type'] = np.bytes_('cartesian')
+
+
+class TestSofaFilterStorage(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.sofa_path = os.path.join(self.tmp_dir.name, 'hrirs.sofa')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_hrir_set(self):
+        azimuths = [0., 90., 270.]
+        irs = np.random.randn(3, 2, 200).astype(np.float32)
+        source_position = np.array([[azimuth, 0., 1.5] for azimuth in azimuths])
+        write_sofa(self.sofa_path, irs, source_position, np.array([[1., 0., 0.]]))
+
+        storage = FilterStorage(FILTER_SIZE, BLOCK_SIZE, self.sofa_path)
+
+        self.assertEqual(len(storage.filter_dict), 3)
+        pose = Pose(Orientation(90, 0, 0), Position(0, 0, 0))
+        left, right = storage.get_filter(pose).getFilter()
+        np.testing.assert_array_equal(left.reshape(-1)[:200], irs[1, 0])
+        np.testing.assert_array_equal(right.reshape(-1)[200:], 0)
+
+    def test_brir_set_uses_listener_view(self):
+        irs = np.random.randn(2, 2, FILTER_SIZE).astype(np.float32)
+        source_position = np.array([[0., 0., 2.]])
+        listener_view = np.array([[1., 0., 0.], [0., -1., 0.]])
+        write_sofa(self.sofa_path, irs, source_position, listener_view)
+
+        storage = FilterStorage(FILTER_SIZE, BLOCK_SIZE, self.sofa_path)
+
+        self.assertEqual(sorted(storage.filter_dict.keys()),
+                         ["0,0,0,0,0,0,0,0,0", "270,0,0,0,0,0,0,0,0"])
+
+    def test_brir_set_with_several_sources(self):
+        irs = np.random.randn(4, 2, FILTER_SIZE).astype(np.float32)
+        source_position = np.array([[0., 0., 2.], [0., 0., 2.], [30., 0., 2.], [30., 0., 2.]])
+        listener_view = np.array([[1., 0., 0.], [0., -1., 0.], [1., 0., 0.], [0., -1., 0.]])
+        write_sofa(self.sofa_path, irs, source_position, listener_view)
+
+        storage = FilterStorage(FILTER_SIZE, BLOCK_SIZE, self.sofa_path)
+
+        self.assertEqual(sorted(storage.filter_dict.keys()),
+                         ["0,0,0,0,0,0,0,0,0", "0,0,0,0,0,0,30,0,0",
+                          "270,0,0,0,0,0,0,0,0", "270,0,0,0,0,0,30,0,0"])
+        pose = Pose(Orientation(270, 0, 0), Position(0, 0, 0), Custom(30, 0, 0))
+        left, right = storage.get_filter(pose).getFilter()
+        np.testing.assert_array_equal(left.reshape(-1), irs[3, 0])
+
+    def test_duplicate_poses_are_reported(self):
+        irs = np.random.randn(3, 2, FILTER_SIZE).astype(np.float32)
+        source_position = np.array([[0., 0., 2.], [0.2, 0., 2.], [90., 0., 2.]])
+        write_sofa(self.sofa_path, irs, source_position, np.array([[1., 0., 0.]]))
+
+        with self.assertLogs('pybinsim.FilterStorage', level='WARNING') as logs:
+            storage = FilterStorage(FILTER_SIZE, BLOCK_SIZE, self.sofa_path)
+
+        self.assertEqual(len(storage.filter_dict), 2)
+        self.assertIn('1 of 3 measurements', logs.output[0])
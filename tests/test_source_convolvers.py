@@ -0,0 +1,60 @@
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+import numpy as np
+import soundfile as sf
+
+from pybinsim.application import BinSim
+
+BLOCK_SIZE = 512
+
+
+def wait_for_channels(binsim, channels, timeout=5.0):
+    deadline = time.time() + timeout
+    while binsim.soundHandler.get_sound_channels() != channels and time.time() < deadline:
+        time.sleep(0.01)
+    return binsim.soundHandler.get_sound_channels()
+
+
+class TestSourceConvolvers(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_convolvers_are_created_before_channels_are_served(self):
+        config_path = os.path.join(self.directory.name, 'settings.cfg')
+        with open(config_path, 'w') as config_file:
+            config_file.write('\n'.join(['soundfile example/noise_pulses.wav',
+                                         'blockSize {}'.format(BLOCK_SIZE),
+                                         'filterSize 48128',
+                                         'filterList example/filters.txt',
+                                         'maxChannels 4',
+                                         'samplingRate 48000',
+                                         'fftPlannerEffort FFTW_ESTIMATE',
+                                         'oscPort 10793']) + '\n')
+
+        with BinSim(config_path) as binsim:
+            self.assertEqual(wait_for_channels(binsim, 1), 1)
+            self.assertEqual(len(binsim.convolvers), 1)
+
+            def fail(source):
+                raise AssertionError("convolver created in the render path")
+
+            # the render path only reads the convolvers
+            create_convolver = binsim.create_convolver
+            binsim.create_convolver = fail
+            binsim.process_block()
+            binsim.create_convolver = create_convolver
+
+            sound_path = os.path.join(self.directory.name, 'three_channels.wav')
+            sf.write(sound_path, np.zeros((BLOCK_SIZE * 4, 3), dtype=np.float32), 48000, subtype='FLOAT')
+            binsim.soundHandler.request_new_sound_file(sound_path)
+
+            self.assertEqual(wait_for_channels(binsim, 3), 3)
+            self.assertEqual(len(binsim.convolvers), 3)
+            binsim.create_convolver = fail
+            binsim.process_block()
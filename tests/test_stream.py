@@ -0,0 +1,99 @@
+import os
+import sys
+import tempfile
+import types
+from unittest import TestCase, mock
+
+import numpy as np
+
+from pybinsim.application import BinSim
+
+BLOCK_SIZE = 512
+
+
+class StubStream(object):
+    """ Accepts the arguments of pyaudio.Stream only """
+
+    def __init__(self, rate, channels, format, input=False, output=False, input_device_index=None,
+                 output_device_index=None, frames_per_buffer=1024, start=True,
+                 input_host_api_specific_stream_info=None, output_host_api_specific_stream_info=None,
+                 stream_callback=None):
+        self.channels = channels
+        self.input = input
+        self.frames_per_buffer = frames_per_buffer
+        self.stream_callback = stream_callback
+
+    def start_stream(self):
+        pass
+
+    def stop_stream(self):
+        pass
+
+    def close(self):
+        pass
+
+    def is_active(self):
+        return False
+
+
+class StubPyAudio(object):
+    def open(self, *args, **kwargs):
+        return StubStream(*args, **kwargs)
+
+    def terminate(self):
+        pass
+
+
+def create_pyaudio_module():
+    pyaudio = types.ModuleType('pyaudio')
+    pyaudio.paFloat32 = 1
+    pyaudio.paContinue = 0
+    pyaudio.PyAudio = StubPyAudio
+    return pyaudio
+
+
+class TestStreamOpen(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.pyaudio = mock.patch.dict(sys.modules, {'pyaudio': create_pyaudio_module()})
+        self.pyaudio.start()
+
+    def tearDown(self):
+        self.pyaudio.stop()
+        self.directory.cleanup()
+
+    def create_binsim(self, port, settings):
+        path = os.path.join(self.directory.name, 'settings.cfg')
+        with open(path, 'w') as config_file:
+            config_file.write('\n'.join(['soundfile example/noise_pulses.wav',
+                                         'blockSize {}'.format(BLOCK_SIZE),
+                                         'filterSize 48128',
+                                         'filterList example/filters.txt',
+                                         'samplingRate 48000',
+                                         'fftPlannerEffort FFTW_ESTIMATE',
+                                         'oscPort {}'.format(port)] + settings) + '\n')
+        return BinSim(path)
+
+    def test_playback(self):
+        with self.create_binsim(10791, ['maxChannels 1']) as binsim:
+            binsim.stream_open()
+
+            self.assertEqual(binsim.stream.channels, 2)
+            self.assertFalse(binsim.stream.input)
+            output, _ = binsim.stream.stream_callback(None, BLOCK_SIZE, None, 0)
+            self.assertEqual(len(output), BLOCK_SIZE * 2 * 4)
+
+    def test_full_duplex_live_input(self):
+        with self.create_binsim(10792, ['maxChannels 3', 'liveInput True', 'liveInputChannels 3']) as binsim:
+            binsim.stream_open()
+
+            # input and output share the channel count of the stream
+            self.assertEqual(binsim.stream.channels, 3)
+            self.assertTrue(binsim.stream.input)
+
+            in_data = np.tile(np.array([1, 2, 3], dtype=np.float32), (BLOCK_SIZE, 1))
+            output, _ = binsim.stream.stream_callback(in_data.tobytes(), BLOCK_SIZE, None, 0)
+
+            np.testing.assert_array_equal(binsim.block[:3, 0], [1, 2, 3])
+            output = np.frombuffer(output, dtype=np.float32).reshape(BLOCK_SIZE, 3)
+            np.testing.assert_array_equal(output[:, 2], 0)
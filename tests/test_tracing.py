@@ -0,0 +1,51 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from pybinsim import tracing
+from pybinsim.tracing import Tracer
+
+
+class TestTracer(TestCase):
+    def test_disabled_tracer(self):
+        tracer = Tracer()
+
+        slot = tracer.begin(tracing.MAC, 0)
+        tracer.end(slot)
+
+        self.assertEqual(slot, -1)
+        self.assertEqual(tracer.get_events(), [])
+
+    def test_ring_buffer_keeps_newest_events(self):
+        tracer = Tracer(4)
+
+        for source in range(6):
+            tracer.end(tracer.begin(tracing.FFT, source))
+
+        events = tracer.get_events()
+
+        self.assertEqual([event['args']['source'] for event in events], [2, 3, 4, 5])
+        self.assertTrue(all(event['name'] == 'fft' and event['dur'] >= 0 for event in events))
+
+    def test_unfinished_events_are_skipped(self):
+        tracer = Tracer(4)
+        tracer.end(tracer.begin(tracing.BLOCK))
+        tracer.begin(tracing.IFFT, 1)
+
+        self.assertEqual([event['name'] for event in tracer.get_events()], ['block'])
+
+    def test_export_chrome_trace(self):
+        tracer = Tracer(8)
+        tracer.end(tracer.begin(tracing.MAC, 3))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            trace_path = os.path.join(tmp_dir, 'trace.json')
+            tracer.export_chrome_trace(trace_path)
+
+            with open(trace_path) as trace_file:
+                trace = json.load(trace_file)
+
+        complete_events = [event for event in trace['traceEvents'] if event['ph'] == 'X']
+        self.assertEqual(len(complete_events), 1)
+        self.assertEqual(complete_events[0]['tid'], 4)